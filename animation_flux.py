@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Animation de l'historique des états d'une station.
+
+Chaque mise à jour de l'historique devient une image du diagramme de flux.
+Les images sont exportées en GIF animé, en vidéo MP4 (ffmpeg requis) ou en
+planche PNG de vignettes.
+
+Le rendu est incrémental : une seule figure est construite (GabaritDiagramme)
+et tout ce qui ne change jamais (flèches, titres des filières, repères,
+légende) est dessiné une fois puis mémorisé. Le bloc d'un ouvrage n'est
+dessiné qu'une fois par état rencontré, puis recopié ; seul le titre (la date)
+est redessiné à chaque image. Les images sont identiques, au pixel près, à un
+rendu complet de la figure.
+
+Exemple :
+    python animation_flux.py "STEP 2" --sortie step2.gif --fps 4
+    python animation_flux.py "STEP 2" --sortie step2.png --debut 2024-01-01 --fin 2024-06-30
+"""
+
+import os
+
+# Aucun affichage : le backend doit être choisi avant l'import de diagramme_flux
+os.environ['MPLBACKEND'] = 'Agg'
+
+import shutil
+import logging
+import subprocess
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from matplotlib.transforms import Bbox
+from PIL import Image
+
+from utils import get_station_by_id, get_station_by_nom
+from diagramme_flux import (
+    DiagrammeFlux,
+    get_toutes_les_mises_a_jour,
+    preparer_ouvrages_station,
+    formater_titre_diagramme,
+)
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+FORMATS_ANIMATION = ('gif', 'mp4', 'png')
+DPI_ANIMATION = 60
+IMAGES_PAR_SECONDE = 2
+COLONNES_PLANCHE = 4
+LARGEUR_VIGNETTE = 480
+
+
+def selectionner_periode(mises_a_jour: List[Dict[str, Any]], debut: Optional[str] = None,
+                         fin: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Retourne les mises à jour d'une période, de la plus ancienne à la plus récente.
+
+    Args:
+        mises_a_jour: Historique des états d'une station
+        debut: Première date incluse ('YYYY-MM-DD[ HH:MM:SS]'), sans limite si None
+        fin: Dernière date incluse ; une date seule couvre toute la journée
+
+    Returns:
+        Les mises à jour retenues, triées par date croissante
+    """
+    if fin and len(fin) == 10:
+        fin = f"{fin} 23:59:59"
+    retenues = []
+    for mise_a_jour in mises_a_jour:
+        date_maj = mise_a_jour.get('date_maj', mise_a_jour.get('date', ''))
+        if (debut and date_maj < debut) or (fin and date_maj > fin):
+            continue
+        retenues.append(mise_a_jour)
+    retenues.sort(key=lambda m: m.get('date_maj', m.get('date', '')))
+    return retenues
+
+
+def _etendue(artiste, renderer, marge: float = 3.0):
+    """Zone occupée par un artiste à l'écran (cadre du texte compris), élargie pour l'anticrénelage."""
+    etendue = artiste.get_window_extent(renderer)
+    cadre = artiste.get_bbox_patch() if hasattr(artiste, 'get_bbox_patch') else None
+    if cadre is not None:
+        etendue = Bbox.union([etendue, cadre.get_window_extent(renderer)])
+    return etendue.expanded(1, 1).padded(marge)
+
+
+def _artistes_blocs(gabarit) -> list:
+    """Blocs et libellés des ouvrages d'un gabarit."""
+    return [*gabarit.blocs, *gabarit.textes_blocs]
+
+
+class RenduIncremental:
+    """
+    Compose les images successives d'un gabarit sans redessiner la figure.
+
+    Le fond (tout sauf les blocs, leurs libellés et le titre) est rendu une
+    fois. Chaque bloc occupe une zone de l'image dont le contenu ne dépend que
+    de l'état de l'ouvrage : cette vignette est dessinée au premier usage de
+    l'état puis recopiée. Seul le titre est redessiné à chaque image.
+
+    Si les zones des blocs se chevauchent, chaque image est redessinée en
+    entier par-dessus le fond (plus lent, même résultat).
+    """
+
+    def __init__(self, gabarit, dpi: int):
+        self.gabarit = gabarit
+        self.fig, self.ax = gabarit.fig, gabarit.ax
+        self.fig.set_dpi(dpi)
+        self.canvas = self.fig.canvas
+        self._pret = False
+
+    def _preparer(self) -> None:
+        """Premier rendu complet : mise en page, fond et zones des blocs."""
+        gabarit, ax, canvas = self.gabarit, self.ax, self.canvas
+        canvas.draw()
+        renderer = canvas.get_renderer()
+        self.hauteur = int(self.fig.bbox.height)
+        largeur = int(self.fig.bbox.width)
+
+        # Artistes des axes qui recouvrent un bloc : redessinés par-dessus, dans l'ordre du rendu complet
+        blocs = list(zip(gabarit.blocs, gabarit.textes_blocs))
+        zones = [Bbox.union([_etendue(bloc, renderer), _etendue(texte, renderer)]) for bloc, texte in blocs]
+        animes = {id(a) for a in _artistes_blocs(gabarit)}
+        zorder_min = min(bloc.get_zorder() for bloc in gabarit.blocs)
+        enfants = ax.get_children()
+        self.ordre = {id(a): i for i, a in enumerate(enfants)}
+        self.dessus_par_bloc = [[] for _ in zones]
+        dessus = []
+        for artiste in enfants:
+            if id(artiste) in animes or not artiste.get_visible() or artiste.get_zorder() < zorder_min:
+                continue
+            etendue = artiste.get_window_extent(renderer)
+            for indice, zone in enumerate(zones):
+                if etendue.overlaps(zone):
+                    self.dessus_par_bloc[indice].append(artiste)
+                    if not dessus or dessus[-1] is not artiste:
+                        dessus.append(artiste)
+        self.dessus = dessus
+
+        # Fond sans les blocs ni les artistes qui les recouvrent (base des vignettes)
+        for artiste in (*_artistes_blocs(gabarit), *dessus, gabarit.titre):
+            artiste.set_animated(True)
+        canvas.draw()
+        self.fond_base = canvas.copy_from_bbox(self.fig.bbox)
+        # Fond complet : les artistes qui recouvrent les blocs dessinés hors des zones
+        for artiste in self._trier(dessus):
+            ax.draw_artist(artiste)
+        self.fond = canvas.copy_from_bbox(self.fig.bbox)
+        self.image_fond = self._tampon()
+
+        self.zones = [self._pixels(zone, largeur) for zone in zones]
+        self.vignettes = {}
+        self.par_vignettes = not any(
+            zones[i].overlaps(zones[j]) for i in range(len(zones)) for j in range(i + 1, len(zones))
+        )
+        self._zones_bbox = zones
+        self._pret = True
+
+    def _trier(self, artistes):
+        return sorted(artistes, key=lambda a: (a.get_zorder(), self.ordre.get(id(a), 0)))
+
+    def _tampon(self) -> np.ndarray:
+        return np.array(self.canvas.buffer_rgba())[..., :3]
+
+    def _pixels(self, zone, largeur: int) -> Tuple[slice, slice]:
+        """Lignes et colonnes du tableau d'image couvertes par une zone (origine en bas à gauche)."""
+        x0, x1 = max(0, int(np.floor(zone.x0))), min(largeur, int(np.ceil(zone.x1)))
+        y0, y1 = max(0, int(np.floor(zone.y0))), min(self.hauteur, int(np.ceil(zone.y1)))
+        return slice(self.hauteur - y1, self.hauteur - y0), slice(x0, x1)
+
+    def _dessiner(self, artistes) -> None:
+        """Rétablit le fond de base puis dessine les artistes dans l'ordre du rendu complet."""
+        self.canvas.restore_region(self.fond_base)
+        for artiste in self._trier(artistes):
+            self.ax.draw_artist(artiste)
+
+    def _vignette(self, indice: int, couleur) -> np.ndarray:
+        cle = (indice, couleur)
+        vignette = self.vignettes.get(cle)
+        if vignette is None:
+            bloc, texte = self.gabarit.blocs[indice], self.gabarit.textes_blocs[indice]
+            self._dessiner([bloc, texte, *self.dessus_par_bloc[indice]])
+            lignes, colonnes = self.zones[indice]
+            vignette = np.array(self.canvas.buffer_rgba())[lignes, colonnes, :3]
+            self.vignettes[cle] = vignette
+        return vignette
+
+    def image(self, liste_ouvrages: list, titre: str) -> np.ndarray:
+        """
+        Image RGB (hauteur x largeur x 3) du diagramme pour ces ouvrages et ce titre.
+
+        Returns:
+            Un tableau neuf, que l'appelant peut conserver
+        """
+        self.gabarit.appliquer(liste_ouvrages, titre)
+        if not self._pret:
+            self._preparer()
+        renderer = self.canvas.get_renderer()
+        zone_titre = _etendue(self.gabarit.titre, renderer)
+
+        if not self.par_vignettes or any(zone_titre.overlaps(zone) for zone in self._zones_bbox):
+            self._dessiner([*_artistes_blocs(self.gabarit), *self.dessus])
+            self.fig.draw_artist(self.gabarit.titre)
+            return self._tampon()
+
+        image = self.image_fond.copy()
+        for indice, bloc in enumerate(self.gabarit.blocs):
+            lignes, colonnes = self.zones[indice]
+            image[lignes, colonnes] = self._vignette(indice, bloc.get_facecolor())
+
+        # Le titre, au-dessus de tout, sur le fond complet
+        self.canvas.restore_region(self.fond)
+        self.fig.draw_artist(self.gabarit.titre)
+        lignes, colonnes = self._pixels(zone_titre, image.shape[1])
+        image[lignes, colonnes] = np.asarray(self.canvas.buffer_rgba())[lignes, colonnes, :3]
+        return image
+
+
+class AnimationHistorique:
+    """Images successives du diagramme d'une station, une par mise à jour."""
+
+    def __init__(self, station: Dict[str, Any], mises_a_jour: List[Dict[str, Any]],
+                 dpi: int = DPI_ANIMATION):
+        """
+        Args:
+            station: Station (dictionnaire de stations.json)
+            mises_a_jour: Mises à jour à animer, dans l'ordre des images
+            dpi: Résolution des images
+        """
+        self.type_procede = station.get('type_procede')
+        if not self.type_procede:
+            raise ValueError("Le type de procédé n'est pas défini pour cette station")
+        if not mises_a_jour:
+            raise ValueError("Aucune mise à jour à animer")
+        self.nom_station = station.get('nom', 'Station inconnue')
+        self.destination = station.get('destination', 'Rejet')
+        self.mises_a_jour = mises_a_jour
+        self.dpi = dpi
+
+    def __len__(self) -> int:
+        return len(self.mises_a_jour)
+
+    def _image(self, mise_a_jour: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
+        """Ouvrages et titre d'une mise à jour."""
+        ouvrages = preparer_ouvrages_station(self.type_procede, mise_a_jour.get('etat_ouvrages', {}))
+        titre = formater_titre_diagramme(self.nom_station, self.type_procede,
+                                         mise_a_jour.get('date_maj', mise_a_jour.get('date')))
+        return ouvrages, titre
+
+    def images(self) -> Iterator[np.ndarray]:
+        """Génère les images RGB (hauteur x largeur x 3) dans l'ordre des mises à jour."""
+        ouvrages, _ = self._image(self.mises_a_jour[0])
+        gabarit = DiagrammeFlux(type_station=self.type_procede).creer_gabarit(ouvrages, self.destination)
+        try:
+            rendu = RenduIncremental(gabarit, self.dpi)
+            for mise_a_jour in self.mises_a_jour:
+                yield rendu.image(*self._image(mise_a_jour))
+        finally:
+            gabarit.fermer()
+
+
+def _exporter_gif(images: Iterator[np.ndarray], chemin: str, fps: float) -> None:
+    premiere = Image.fromarray(next(images))
+    # Palette commune calculée sur la première image (la légende contient toutes les couleurs
+    # des états) : la conversion des images suivantes n'est qu'une recherche de couleur
+    palette = premiere.quantize(255, method=Image.Quantize.MEDIANCUT)
+    # Pillow n'encode que la zone modifiée d'une image à l'autre et fusionne les images identiques
+    palette.save(chemin, format='GIF', save_all=True,
+                 append_images=(Image.fromarray(image).quantize(palette=palette, dither=Image.Dither.NONE)
+                                for image in images),
+                 duration=int(1000 / fps), loop=0)
+
+
+def _exporter_mp4(images: Iterator[np.ndarray], chemin: str, fps: float) -> None:
+    ffmpeg = shutil.which(matplotlib.rcParams['animation.ffmpeg_path'])
+    if ffmpeg is None:
+        raise ValueError("ffmpeg est introuvable : l'export MP4 n'est pas disponible (utilisez .gif ou .png)")
+    premiere = next(images)
+    hauteur, largeur = premiere.shape[:2]
+    commande = [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{largeur}x{hauteur}', '-r', str(fps), '-i', '-',
+        # H.264 exige des dimensions paires
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2:color=white',
+        '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', chemin,
+    ]
+    processus = subprocess.Popen(commande, stdin=subprocess.PIPE)
+    try:
+        processus.stdin.write(premiere.tobytes())
+        for image in images:
+            processus.stdin.write(image.tobytes())
+    finally:
+        processus.stdin.close()
+        code = processus.wait()
+    if code:
+        raise RuntimeError(f"ffmpeg a échoué (code {code})")
+
+
+def _exporter_planche(images: Iterator[np.ndarray], chemin: str, nombre: int,
+                      colonnes: int = COLONNES_PLANCHE, largeur_vignette: int = LARGEUR_VIGNETTE) -> None:
+    planche = None
+    colonnes = max(1, min(colonnes, nombre))
+    for indice, image in enumerate(images):
+        vignette = Image.fromarray(image)
+        if vignette.width > largeur_vignette:
+            hauteur = round(vignette.height * largeur_vignette / vignette.width)
+            vignette = vignette.resize((largeur_vignette, hauteur), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if planche is None:
+            lignes = (nombre + colonnes - 1) // colonnes
+            planche = Image.new('RGB', (colonnes * vignette.width, lignes * vignette.height), 'white')
+        ligne, colonne = divmod(indice, colonnes)
+        planche.paste(vignette, (colonne * vignette.width, ligne * vignette.height))
+    planche.save(chemin, format='PNG')
+
+
+def exporter_historique(station: Dict[str, Any], chemin: str, debut: Optional[str] = None,
+                        fin: Optional[str] = None, fps: float = IMAGES_PAR_SECONDE,
+                        dpi: int = DPI_ANIMATION, colonnes: int = COLONNES_PLANCHE) -> int:
+    """
+    Exporte l'historique d'une station en animation ou en planche de vignettes.
+
+    Le format est déduit de l'extension du fichier : .gif, .mp4 ou .png (planche).
+
+    Args:
+        station: Station (dictionnaire de stations.json)
+        chemin: Fichier de sortie
+        debut: Première date incluse, sans limite si None
+        fin: Dernière date incluse, sans limite si None
+        fps: Images par seconde (GIF et MP4)
+        dpi: Résolution des images
+        colonnes: Nombre de vignettes par ligne de la planche
+
+    Returns:
+        Nombre d'images exportées
+
+    Raises:
+        ValueError: Format inconnu, station sans type de procédé ou sans mise à jour sur la période
+    """
+    extension = os.path.splitext(chemin)[1].lower().lstrip('.')
+    if extension not in FORMATS_ANIMATION:
+        raise ValueError(f"Format non supporté: .{extension} (formats: {', '.join(FORMATS_ANIMATION)})")
+
+    mises_a_jour = selectionner_periode(get_toutes_les_mises_a_jour(station.get('id')), debut, fin)
+    animation = AnimationHistorique(station, mises_a_jour, dpi)
+    images = animation.images()
+    try:
+        if extension == 'gif':
+            _exporter_gif(images, chemin, fps)
+        elif extension == 'mp4':
+            _exporter_mp4(images, chemin, fps)
+        else:
+            _exporter_planche(images, chemin, len(animation), colonnes)
+    finally:
+        # Libère la figure même si l'export s'est interrompu
+        images.close()
+    return len(animation)
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande de l'export de l'historique."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Animation de l'historique des états d'une station")
+    parser.add_argument('station', help="ID ou nom de la station")
+    parser.add_argument('--sortie', required=True,
+                        help="Fichier de sortie : .gif, .mp4 (ffmpeg requis) ou .png (planche de vignettes)")
+    parser.add_argument('--debut', default=None, help="Première date incluse (YYYY-MM-DD[ HH:MM:SS])")
+    parser.add_argument('--fin', default=None, help="Dernière date incluse (YYYY-MM-DD[ HH:MM:SS])")
+    parser.add_argument('--fps', type=float, default=IMAGES_PAR_SECONDE, help="Images par seconde")
+    parser.add_argument('--dpi', type=int, default=DPI_ANIMATION, help="Résolution des images")
+    parser.add_argument('--colonnes', type=int, default=COLONNES_PLANCHE,
+                        help="Vignettes par ligne de la planche PNG")
+    args = parser.parse_args(argv)
+
+    station = get_station_by_id(args.station) or get_station_by_nom(args.station)
+    if station is None:
+        print(f"❌ Station introuvable: {args.station}")
+        return 1
+    try:
+        nombre = exporter_historique(station, args.sortie, args.debut, args.fin,
+                                     args.fps, args.dpi, args.colonnes)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {nombre} mise(s) à jour exportée(s): {args.sortie}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache disque des diagrammes rendus, adressé par leur contenu.
+
+Un diagramme ne dépend que du type de procédé (et de sa configuration dans
+types.json), des états des ouvrages, de la destination, du titre, du format
+et des constantes de style du moteur de rendu. La clé du cache est une
+empreinte SHA-256 de ces entrées : un diagramme inchangé depuis le dernier
+rendu est relu sur disque au lieu d'être redessiné par matplotlib.
+
+La taille du cache est bornée : les fichiers les moins récemment utilisés
+sont supprimés au-delà de la limite (STEP_CACHE_RENDU_MAX_MO, 256 Mo par défaut).
+Le dossier est choisi via STEP_CACHE_RENDU (data/cache_rendu par défaut).
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from stockage import DOSSIER_DONNEES
+from catalogue import get_catalogue
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+DOSSIER_CACHE_RENDU = os.path.join(DOSSIER_DONNEES, 'cache_rendu')
+TAILLE_MAX_DEFAUT = 256 * 1024 * 1024
+
+
+def cle_rendu(type_procede: str, etat_ouvrages: Dict[str, Any], destination: Optional[str],
+              titre: Optional[str], extension: str, style: Dict[str, Any]) -> str:
+    """
+    Calcule l'empreinte stable des entrées d'un diagramme.
+
+    Args:
+        type_procede: Type de procédé de la station
+        etat_ouvrages: États des ouvrages {nom: etat}
+        destination: Destination des eaux épurées
+        titre: Titre du diagramme
+        extension: Format de sortie ('png', 'svg', ...)
+        style: Constantes de style du moteur de rendu (DiagrammeFlux.empreinte_style)
+
+    Returns:
+        Empreinte hexadécimale SHA-256
+    """
+    procede = get_catalogue().trouver(type_procede)
+    entrees = {
+        'type_procede': type_procede,
+        'config_procede': procede.copie_config() if procede else None,
+        'etat_ouvrages': etat_ouvrages or {},
+        'destination': destination,
+        'titre': titre,
+        'extension': extension,
+        'style': style,
+    }
+    contenu = json.dumps(entrees, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+class CacheRendu:
+    """Cache de diagrammes sur disque, avec éviction LRU bornée en taille."""
+
+    def __init__(self, dossier: Optional[str] = None, taille_max: Optional[int] = None):
+        self.dossier = dossier or os.environ.get('STEP_CACHE_RENDU', DOSSIER_CACHE_RENDU)
+        if taille_max is None:
+            taille_max = int(float(os.environ.get('STEP_CACHE_RENDU_MAX_MO', 0)) * 1024 * 1024) or TAILLE_MAX_DEFAUT
+        self.taille_max = taille_max
+        self._taille = None  # Estimation de la taille totale, calculée au premier besoin
+        self._verrou = threading.Lock()
+
+    def chemin(self, cle: str, extension: str) -> str:
+        # Un sous-dossier par préfixe pour éviter les répertoires trop volumineux
+        return os.path.join(self.dossier, cle[:2], f"{cle}.{extension}")
+
+    def lire(self, cle: str, extension: str) -> Optional[bytes]:
+        """Retourne le diagramme en cache, ou None s'il est absent."""
+        chemin = self.chemin(cle, extension)
+        try:
+            with open(chemin, 'rb') as f:
+                donnees = f.read()
+        except OSError:
+            return None
+        try:
+            # La date de modification sert d'horodatage du dernier accès pour l'éviction
+            os.utime(chemin)
+        except OSError:
+            pass
+        return donnees
+
+    def ecrire(self, cle: str, extension: str, donnees: bytes) -> None:
+        """Enregistre un diagramme puis applique la limite de taille."""
+        chemin = self.chemin(cle, extension)
+        try:
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+            temporaire = f"{chemin}.{os.getpid()}.tmp"
+            with open(temporaire, 'wb') as f:
+                f.write(donnees)
+            os.replace(temporaire, chemin)
+        except OSError as e:
+            log.warning(f"Impossible d'écrire le diagramme {cle} dans le cache: {e}")
+            return
+
+        with self._verrou:
+            if self._taille is None:
+                self._taille = self._calculer_taille()
+            else:
+                self._taille += len(donnees)
+            if self._taille > self.taille_max:
+                self._evincer()
+
+    def _fichiers(self):
+        """(date d'accès, taille, chemin) de chaque fichier du cache."""
+        fichiers = []
+        for racine, _, noms in os.walk(self.dossier):
+            for nom in noms:
+                if nom.endswith('.tmp'):
+                    continue
+                chemin = os.path.join(racine, nom)
+                try:
+                    stat = os.stat(chemin)
+                except OSError:
+                    continue
+                fichiers.append((stat.st_mtime, stat.st_size, chemin))
+        return fichiers
+
+    def _calculer_taille(self) -> int:
+        return sum(taille for _, taille, _ in self._fichiers())
+
+    def _evincer(self) -> None:
+        """Supprime les diagrammes les moins récemment utilisés jusqu'à 90 % de la limite."""
+        fichiers = sorted(self._fichiers())
+        total = sum(taille for _, taille, _ in fichiers)
+        cible = int(self.taille_max * 0.9)
+        supprimes = 0
+        for _, taille, chemin in fichiers:
+            if total <= cible:
+                break
+            try:
+                os.remove(chemin)
+                total -= taille
+                supprimes += 1
+            except OSError:
+                continue
+        self._taille = total
+        if supprimes:
+            log.info(f"Cache de rendu: {supprimes} diagramme(s) évincé(s)")
+
+    def taille(self) -> int:
+        """Taille totale actuelle du cache en octets."""
+        with self._verrou:
+            self._taille = self._calculer_taille()
+            return self._taille
+
+    def vider(self) -> int:
+        """Supprime tous les diagrammes du cache et retourne leur nombre."""
+        with self._verrou:
+            fichiers = self._fichiers()
+            for _, _, chemin in fichiers:
+                try:
+                    os.remove(chemin)
+                except OSError:
+                    pass
+            self._taille = 0
+            return len(fichiers)
+
+
+_CACHE_RENDU: Optional[CacheRendu] = None
+
+
+def get_cache_rendu() -> CacheRendu:
+    """Retourne le cache de rendu partagé, créé au premier appel."""
+    global _CACHE_RENDU
+    if _CACHE_RENDU is None:
+        _CACHE_RENDU = CacheRendu()
+    return _CACHE_RENDU
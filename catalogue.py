@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catalogue des types de procédés, compilé à partir de data/types.json.
+
+Le fichier n'est lu et analysé qu'une fois par version (mtime + taille) :
+les clés normalisées (sans casse ni accents), la liste ordonnée des
+ouvrages et le graphe des flux de chaque procédé sont précalculés, une
+recherche se résume donc à une lecture de dictionnaire.
+"""
+
+import os
+import json
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from stockage import DOSSIER_DONNEES, signature_fichier
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+FICHIER_TYPES = os.path.join(DOSSIER_DONNEES, 'types.json')
+
+# Sections de la filière eau, dans l'ordre logique de traitement
+SECTIONS_FILIERE_EAU = (
+    'pretraitement',
+    'traitement_primaire',
+    'traitement_secondaire',
+    'traitement_tertiaire',
+)
+
+# Liaisons de la filière eau vers la filière boue, avec leur étiquette par défaut
+LIAISONS_BOUES = (
+    ('boues_primaires', 'Boues primaires'),
+    ('boues_secondaires', 'Boues biologiques'),
+)
+
+# Nature des arcs du graphe d'un procédé
+ARC_EAU = 'eau'                        # Ouvrages successifs d'une même section de la filière eau
+ARC_INTER_SECTIONS = 'inter_sections'  # D'une section de la filière eau à la suivante
+ARC_BOUES = 'boues'                    # Extraction des boues vers la filière boue
+ARC_FILIERE_BOUE = 'filiere_boue'      # Ouvrages successifs de la filière boue
+
+
+def normaliser_cle(nom: Any) -> str:
+    """Normalise un nom de procédé pour une comparaison insensible à la casse et aux accents."""
+    return ''.join(c for c in unicodedata.normalize('NFD', str(nom).strip().lower())
+                   if not unicodedata.combining(c))
+
+
+def _figer(valeur: Any) -> Any:
+    """Copie en lecture seule d'une valeur JSON (dictionnaires en MappingProxyType, listes en tuples)."""
+    if isinstance(valeur, Mapping):
+        return MappingProxyType(OrderedDict((cle, _figer(v)) for cle, v in valeur.items()))
+    if isinstance(valeur, (list, tuple)):
+        return tuple(_figer(v) for v in valeur)
+    return valeur
+
+
+def _degeler(valeur: Any) -> Any:
+    """Copie modifiable d'une valeur figée par _figer (dictionnaires et listes)."""
+    if isinstance(valeur, Mapping):
+        return OrderedDict((cle, _degeler(v)) for cle, v in valeur.items())
+    if isinstance(valeur, tuple):
+        return [_degeler(v) for v in valeur]
+    return valeur
+
+
+def _noms_ouvrages(source: Any) -> Tuple[str, ...]:
+    """Extrait les noms d'ouvrages valides d'une section de types.json."""
+    if isinstance(source, str):
+        source = [source]
+    if not isinstance(source, (list, tuple)):
+        return ()
+    return tuple(nom.strip() for nom in source if isinstance(nom, str) and nom.strip())
+
+
+class GrapheProcede:
+    """
+    Graphe orienté des flux d'un procédé (eau et boues).
+
+    Les successeurs et les prédécesseurs sont stockés en listes d'adjacence
+    compactes : les voisins du nœud i sont successeurs[debut_successeurs[i]:debut_successeurs[i + 1]].
+
+    Attributes:
+        noeuds: Noms des ouvrages, dans l'ordre logique du procédé
+        indices: {nom: indice du nœud}
+        arcs: Arcs (source, destination, nature, étiquette) en indices de nœuds
+        debut_successeurs, successeurs: Listes d'adjacence des successeurs
+        debut_predecesseurs, predecesseurs: Listes d'adjacence des prédécesseurs
+        ordre_topologique: Indices des nœuds, chaque nœud après ses prédécesseurs
+        cycle: Nœuds pris dans un cycle (vide pour un graphe acyclique)
+        anomalies: Liaisons de types.json ignorées (ouvrage inconnu, etc.)
+    """
+
+    __slots__ = ('noeuds', 'indices', 'arcs', 'debut_successeurs', 'successeurs',
+                 'debut_predecesseurs', 'predecesseurs', 'ordre_topologique', 'cycle', 'anomalies')
+
+    def __init__(self, noeuds: Tuple[str, ...], arcs: List[Tuple[int, int, str, Optional[str]]],
+                 anomalies: Tuple[str, ...] = ()):
+        self.noeuds = noeuds
+        self.indices = MappingProxyType({nom: i for i, nom in enumerate(noeuds)})
+        self.arcs = tuple(arcs)
+        self.anomalies = anomalies
+        self.debut_successeurs, self.successeurs = self._adjacence(0, 1)
+        self.debut_predecesseurs, self.predecesseurs = self._adjacence(1, 0)
+
+        # Algorithme de Kahn, les nœuds prêts étant pris dans l'ordre logique du procédé
+        degres = [self.debut_predecesseurs[i + 1] - self.debut_predecesseurs[i] for i in range(len(noeuds))]
+        prets = deque(i for i, degre in enumerate(degres) if degre == 0)
+        ordre = []
+        while prets:
+            i = prets.popleft()
+            ordre.append(i)
+            for j in self.successeurs[self.debut_successeurs[i]:self.debut_successeurs[i + 1]]:
+                degres[j] -= 1
+                if degres[j] == 0:
+                    prets.append(j)
+        restants = tuple(i for i, degre in enumerate(degres) if degre > 0)
+        self.cycle = tuple(noeuds[i] for i in restants)
+        self.ordre_topologique = tuple(ordre) + restants
+
+    def _adjacence(self, depart: int, arrivee: int) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        """Listes d'adjacence compactes (débuts, voisins) des arcs orientés depart -> arrivee."""
+        voisins = [[] for _ in self.noeuds]
+        for arc in self.arcs:
+            voisins[arc[depart]].append(arc[arrivee])
+        debuts = [0]
+        for liste in voisins:
+            debuts.append(debuts[-1] + len(liste))
+        return tuple(debuts), tuple(j for liste in voisins for j in liste)
+
+    @classmethod
+    def compiler(cls, noeuds: Tuple[str, ...], sections_eau: List[Tuple[str, ...]],
+                 filiere_boue: Tuple[str, ...], filiere_eau: Dict[str, Any]) -> 'GrapheProcede':
+        """
+        Construit le graphe d'un procédé à partir des sections de types.json.
+
+        Args:
+            noeuds: Ouvrages du procédé (Procede.ouvrages)
+            sections_eau: Ouvrages de chaque section de la filière eau, dans l'ordre de traitement
+            filiere_boue: Ouvrages de la filière boue, dans l'ordre
+            filiere_eau: Configuration de la filière eau (liaisons des boues et du tertiaire)
+        """
+        indices = {nom: i for i, nom in enumerate(noeuds)}
+        arcs = OrderedDict()
+        anomalies = []
+
+        def ajouter(source, destination, nature, etiquette=None):
+            if source != destination:
+                arcs.setdefault((indices[source], indices[destination]), (nature, etiquette))
+
+        precedente = None
+        liaison_tertiaire = filiere_eau.get('liaison_traitement_tertiaire')
+        for numero, section in enumerate(sections_eau):
+            if not section:
+                continue
+            for source, destination in zip(section, section[1:]):
+                ajouter(source, destination, ARC_EAU)
+            if precedente:
+                source = precedente[-1]
+                # Le traitement tertiaire est alimenté par l'ouvrage désigné dans types.json
+                if numero == len(sections_eau) - 1 and liaison_tertiaire:
+                    if liaison_tertiaire in indices:
+                        source = liaison_tertiaire
+                    else:
+                        anomalies.append(f"liaison_traitement_tertiaire: ouvrage '{liaison_tertiaire}' inconnu")
+                ajouter(source, section[0], ARC_INTER_SECTIONS)
+            precedente = section
+
+        for cle, etiquette_defaut in LIAISONS_BOUES:
+            liaison = filiere_eau.get(cle)
+            if not isinstance(liaison, Mapping):
+                continue
+            source = liaison.get('source')
+            destination = liaison.get('destination')
+            if source not in indices:
+                anomalies.append(f"{cle}: ouvrage source '{source}' inconnu")
+                continue
+            if destination not in indices:
+                # Sans destination connue, les boues rejoignent la tête de la filière boue
+                if destination:
+                    anomalies.append(f"{cle}: ouvrage destination '{destination}' inconnu")
+                if not filiere_boue:
+                    continue
+                destination = filiere_boue[0]
+            ajouter(source, destination, ARC_BOUES, liaison.get('etiquette') or etiquette_defaut)
+
+        for source, destination in zip(filiere_boue, filiere_boue[1:]):
+            ajouter(source, destination, ARC_FILIERE_BOUE)
+
+        return cls(noeuds, [(i, j, nature, etiquette) for (i, j), (nature, etiquette) in arcs.items()],
+                   tuple(anomalies))
+
+    def successeurs_de(self, nom: str) -> Tuple[str, ...]:
+        """Ouvrages directement en aval (tuple vide pour un ouvrage inconnu)."""
+        i = self.indices.get(nom)
+        if i is None:
+            return ()
+        return tuple(self.noeuds[j] for j in self.successeurs[self.debut_successeurs[i]:self.debut_successeurs[i + 1]])
+
+    def predecesseurs_de(self, nom: str) -> Tuple[str, ...]:
+        """Ouvrages directement en amont (tuple vide pour un ouvrage inconnu)."""
+        i = self.indices.get(nom)
+        if i is None:
+            return ()
+        return tuple(self.noeuds[j]
+                     for j in self.predecesseurs[self.debut_predecesseurs[i]:self.debut_predecesseurs[i + 1]])
+
+    def descendants(self, nom: str) -> Tuple[str, ...]:
+        """Tous les ouvrages en aval, dans l'ordre topologique."""
+        i = self.indices.get(nom)
+        if i is None:
+            return ()
+        vus = {i}
+        a_visiter = [i]
+        while a_visiter:
+            k = a_visiter.pop()
+            for j in self.successeurs[self.debut_successeurs[k]:self.debut_successeurs[k + 1]]:
+                if j not in vus:
+                    vus.add(j)
+                    a_visiter.append(j)
+        vus.discard(i)
+        return tuple(self.noeuds[j] for j in self.ordre_topologique if j in vus)
+
+    def arcs_nommes(self) -> List[Tuple[str, str, str, Optional[str]]]:
+        """Arcs (source, destination, nature, étiquette) avec les noms des ouvrages."""
+        return [(self.noeuds[i], self.noeuds[j], nature, etiquette) for i, j, nature, etiquette in self.arcs]
+
+    def __len__(self):
+        return len(self.noeuds)
+
+    def __repr__(self):
+        return f"GrapheProcede({len(self.noeuds)} ouvrages, {len(self.arcs)} arcs)"
+
+
+class Procede:
+    """
+    Type de procédé compilé.
+
+    Attributes:
+        cle: Clé du procédé dans types.json
+        config: Configuration du procédé, figée (MappingProxyType, listes en tuples) ;
+            copie_config() en donne une copie modifiable
+        filiere_eau: Configuration de la filière eau (figée)
+        filiere_boue: Ouvrages de la filière boue, dans l'ordre
+        ouvrages: Tous les ouvrages du procédé dans l'ordre logique de traitement
+            (prétraitement, primaire, secondaire, tertiaire puis filière boue)
+        graphe: Graphe orienté des flux entre les ouvrages
+    """
+
+    __slots__ = ('cle', 'config', 'filiere_eau', 'filiere_boue', 'ouvrages', 'graphe')
+
+    def __init__(self, cle: str, config: Dict[str, Any]):
+        self.cle = cle
+        # Figée : le catalogue est partagé par tout le processus et sert aux clés du cache de rendu
+        self.config = config = _figer(config)
+        filiere_eau = config.get('filiere_eau', {})
+        self.filiere_eau = filiere_eau if isinstance(filiere_eau, Mapping) else MappingProxyType({})
+        self.filiere_boue = _noms_ouvrages(config.get('filiere_boue', []))
+
+        sections = [_noms_ouvrages(self.filiere_eau.get(section, [])) for section in SECTIONS_FILIERE_EAU]
+        # Certains procédés déclarent le traitement tertiaire hors de la filière eau
+        sections[-1] = tuple(OrderedDict.fromkeys(sections[-1] + _noms_ouvrages(config.get('traitement_tertiaire', []))))
+        ordre = []
+        for section in sections:
+            ordre.extend(section)
+        ordre.extend(self.filiere_boue)
+        self.ouvrages = tuple(OrderedDict.fromkeys(ordre))
+
+        # Un ouvrage présent dans plusieurs sections n'y figure qu'à sa première place
+        vus = set()
+        sections_eau = []
+        for section in sections:
+            sections_eau.append(tuple(nom for nom in section if nom not in vus))
+            vus.update(section)
+        self.graphe = GrapheProcede.compiler(self.ouvrages, sections_eau,
+                                             tuple(nom for nom in self.filiere_boue if nom not in vus),
+                                             self.filiere_eau)
+        if self.graphe.anomalies:
+            log.debug(f"Procédé '{cle}': {'; '.join(self.graphe.anomalies)}")
+
+    def copie_config(self) -> 'OrderedDict[str, Any]':
+        """Retourne une copie profonde et modifiable de la configuration (dictionnaires et listes)."""
+        return _degeler(self.config)
+
+    def etats_initiaux(self, etat_par_defaut: str = 'en_service') -> 'OrderedDict[str, str]':
+        """Retourne un nouvel OrderedDict {ouvrage: etat_par_defaut} modifiable par l'appelant."""
+        return OrderedDict.fromkeys(self.ouvrages, etat_par_defaut)
+
+    def __repr__(self):
+        return f"Procede({self.cle!r}, {len(self.ouvrages)} ouvrages)"
+
+
+class CatalogueProcedes:
+    """Ensemble des procédés de types.json, indexés par clé exacte et par clé normalisée."""
+
+    def __init__(self, types_data: Dict[str, Any], signature: Any = None):
+        self.signature = signature
+        procedes = {}
+        par_cle_normalisee = {}
+        if isinstance(types_data, dict):
+            for cle, config in types_data.items():
+                if not isinstance(config, dict):
+                    log.warning(f"Configuration du procédé '{cle}' invalide, ignorée")
+                    continue
+                procede = Procede(cle, config)
+                procedes[cle] = procede
+                # En cas de collision, la première clé du fichier l'emporte
+                par_cle_normalisee.setdefault(normaliser_cle(cle), procede)
+        self._procedes = procedes
+        self._par_cle_normalisee = par_cle_normalisee
+
+    def trouver(self, type_procede: Any) -> Optional[Procede]:
+        """
+        Retourne le procédé correspondant, sans tenir compte de la casse ni des accents.
+
+        Args:
+            type_procede: Nom du type de procédé (ex: 'boues_activées', 'MBR')
+
+        Returns:
+            Le procédé compilé, ou None s'il n'existe pas
+        """
+        if not type_procede:
+            return None
+        procede = self._procedes.get(type_procede)
+        if procede is None:
+            procede = self._par_cle_normalisee.get(normaliser_cle(type_procede))
+        return procede
+
+    def ouvrages(self, type_procede: Any) -> Tuple[str, ...]:
+        """Retourne les ouvrages ordonnés d'un procédé (tuple vide s'il est inconnu)."""
+        procede = self.trouver(type_procede)
+        return procede.ouvrages if procede else ()
+
+    def etats_initiaux(self, type_procede: Any,
+                       etat_par_defaut: str = 'en_service') -> Optional['OrderedDict[str, str]']:
+        """Retourne les états initiaux des ouvrages d'un procédé, ou None s'il est inconnu."""
+        procede = self.trouver(type_procede)
+        return procede.etats_initiaux(etat_par_defaut) if procede else None
+
+    def cles(self) -> Tuple[str, ...]:
+        """Clés des procédés dans l'ordre de types.json."""
+        return tuple(self._procedes)
+
+    def __contains__(self, type_procede) -> bool:
+        return self.trouver(type_procede) is not None
+
+    def __getitem__(self, type_procede) -> Procede:
+        procede = self.trouver(type_procede)
+        if procede is None:
+            raise KeyError(type_procede)
+        return procede
+
+    def __iter__(self) -> Iterator[Procede]:
+        return iter(self._procedes.values())
+
+    def __len__(self) -> int:
+        return len(self._procedes)
+
+    def __repr__(self):
+        return f"CatalogueProcedes({len(self)} procédés)"
+
+
+_CATALOGUE: Optional[CatalogueProcedes] = None
+_CATALOGUE_VERROU = threading.Lock()
+
+
+def get_catalogue(fichier: str = FICHIER_TYPES) -> CatalogueProcedes:
+    """
+    Retourne le catalogue compilé, reconstruit uniquement si types.json a changé.
+
+    Args:
+        fichier: Chemin du fichier des types de procédés
+
+    Returns:
+        Le catalogue (vide si le fichier est absent ou illisible)
+    """
+    global _CATALOGUE
+
+    signature = (fichier, signature_fichier(fichier))
+    catalogue = _CATALOGUE
+    if catalogue is not None and catalogue.signature == signature:
+        return catalogue
+
+    with _CATALOGUE_VERROU:
+        if _CATALOGUE is not None and _CATALOGUE.signature == signature:
+            return _CATALOGUE
+        types_data = {}
+        if os.path.exists(fichier):
+            try:
+                with open(fichier, 'r', encoding='utf-8') as f:
+                    types_data = json.load(f, object_pairs_hook=OrderedDict)
+            except (OSError, json.JSONDecodeError) as e:
+                log.error(f"Impossible de lire le fichier des types {fichier}: {e}")
+        else:
+            log.error(f"Le fichier {fichier} n'existe pas")
+        _CATALOGUE = CatalogueProcedes(types_data, signature)
+        return _CATALOGUE
+
+
+def invalider_catalogue() -> None:
+    """Force la recompilation du catalogue au prochain appel de get_catalogue()."""
+    global _CATALOGUE
+    _CATALOGUE = None
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sous-commandes non interactives de main.py, pour les scripts et les tâches planifiées.
+
+Chaque sous-commande appelle directement le stockage et le rendu, sans aucune
+saisie : une opération en lot (import, rendu de toute la flotte) s'exécute
+dans un seul processus, avec les caches des stations, des états et du
+catalogue chauds d'une station à l'autre.
+
+Exemple :
+    python main.py stations list --json
+    python main.py state as-of "2025-09-05 08:00" --json
+    python main.py state set Chlef "Dégrillage=en_panne" "Désinfection UV=en_maintenance"
+    python main.py state import passerelle.csv
+    python main.py export --format csv --debut 2024-01-01 --sortie etats.csv
+    python main.py stats availability --debut 2024-01-01 --fin 2024-12-31 --par type
+    python main.py stats reliability --format csv --sortie fiabilite.csv
+    python main.py stats health --json
+    python main.py render Chlef --date 2024-06-30 --sortie chlef.png
+    python main.py render-all --sortie diagrammes --format png svg
+"""
+
+import os
+import sys
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from utils import (
+    get_stations_list,
+    get_station_by_id,
+    get_station_by_nom,
+    update_stations_cache,
+    charger_historique_station,
+    ajouter_mise_a_jour_station,
+    invalider_cache_etats,
+    selectionner_mise_a_jour,
+)
+from stockage import get_stockage
+from catalogue import get_catalogue, normaliser_cle
+from ingestion import ETATS_VALIDES, FORMATS_IMPORT, importer_etats
+from export_etats import FORMATS_EXPORT, exporter_etats
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+FORMAT_DATE = '%Y-%m-%d %H:%M:%S'
+
+
+def trouver_station(reference: str) -> Optional[Dict[str, Any]]:
+    """Retourne la station désignée par son ID ou par son nom (insensible à la casse)."""
+    return get_station_by_id(reference) or get_station_by_nom(reference)
+
+
+def dernier_etat_ouvrages(station: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Retourne les états des ouvrages de la dernière mise à jour d'une station.
+
+    Sans historique, tous les ouvrages du procédé sont en service.
+    """
+    mise_a_jour = selectionner_mise_a_jour(charger_historique_station(str(station['id'])))
+    if mise_a_jour is not None:
+        return dict(mise_a_jour.get('etat_ouvrages', {}))
+    return dict(get_catalogue().etats_initiaux(station.get('type_procede')) or {})
+
+
+def appliquer_etats(station: Dict[str, Any], etat_ouvrages: Dict[str, str],
+                    modifications: Dict[str, str]) -> Dict[str, str]:
+    """
+    Applique des changements d'état à une copie des états d'une station.
+
+    Les noms d'ouvrages sont reconnus sans tenir compte de la casse ni des
+    accents, parmi les ouvrages du procédé et ceux déjà présents dans l'état.
+
+    Args:
+        station: Station concernée
+        etat_ouvrages: États actuels {ouvrage: etat}
+        modifications: Changements {ouvrage: etat}
+
+    Returns:
+        Nouveaux états {ouvrage: etat}
+
+    Raises:
+        ValueError: Ouvrage inconnu pour ce procédé ou état invalide
+    """
+    connus = {}
+    for nom in list(get_catalogue().ouvrages(station.get('type_procede'))) + list(etat_ouvrages):
+        connus.setdefault(normaliser_cle(nom), nom)
+
+    nouveaux = dict(etat_ouvrages)
+    for ouvrage, etat in modifications.items():
+        nom = connus.get(normaliser_cle(ouvrage))
+        if nom is None:
+            raise ValueError(f"Ouvrage '{ouvrage}' inconnu pour la station {station.get('nom')} "
+                             f"(procédé {station.get('type_procede')})")
+        if etat not in ETATS_VALIDES:
+            raise ValueError(f"État '{etat}' invalide pour '{nom}' (états: {', '.join(ETATS_VALIDES)})")
+        nouveaux[nom] = etat
+    return nouveaux
+
+
+def analyser_affectations(affectations: Iterable[str]) -> Dict[str, str]:
+    """
+    Analyse des arguments 'ouvrage=etat'.
+
+    Raises:
+        ValueError: Argument sans '='
+    """
+    modifications = {}
+    for affectation in affectations:
+        ouvrage, separateur, etat = affectation.rpartition('=')
+        if not separateur or not ouvrage.strip():
+            raise ValueError(f"Argument invalide '{affectation}' (attendu: ouvrage=etat)")
+        modifications[ouvrage.strip()] = etat.strip()
+    return modifications
+
+
+def _station_ou_erreur(reference: str) -> Optional[Dict[str, Any]]:
+    station = trouver_station(reference)
+    if station is None:
+        print(f"❌ Station '{reference}' introuvable")
+    return station
+
+
+def commande_stations_list(args) -> int:
+    """stations list : liste des stations (texte ou JSON)."""
+    stations = get_stations_list()
+    if args.json:
+        print(json.dumps(stations, ensure_ascii=False, indent=2))
+        return 0
+    for station in stations:
+        print(f"{station.get('id')}\t{station.get('nom')}\t{station.get('type_procede', '')}")
+    return 0
+
+
+def commande_stations_delete(args) -> int:
+    """stations delete : supprime une station et son historique."""
+    station = _station_ou_erreur(args.station)
+    if station is None:
+        return 1
+    if not args.oui:
+        print(f"❌ Suppression de la station '{station['nom']}' non confirmée (ajouter --oui)")
+        return 1
+    get_stockage().supprimer_station(station['id'])
+    update_stations_cache()
+    invalider_cache_etats()
+    print(f"✅ Station '{station['nom']}' supprimée")
+    return 0
+
+
+def commande_state_show(args) -> int:
+    """state show : états des ouvrages d'une station à une date."""
+    station = _station_ou_erreur(args.station)
+    if station is None:
+        return 1
+    mise_a_jour = selectionner_mise_a_jour(charger_historique_station(str(station['id'])), args.date)
+    if mise_a_jour is None:
+        print(f"❌ Aucune mise à jour disponible pour '{station['nom']}' à cette date")
+        return 1
+    if args.json:
+        print(json.dumps(mise_a_jour, ensure_ascii=False, indent=2))
+        return 0
+    print(f"# {station['nom']} — {mise_a_jour.get('date_maj', 'Date inconnue')}")
+    for ouvrage, etat in mise_a_jour.get('etat_ouvrages', {}).items():
+        print(f"{ouvrage}\t{etat}")
+    return 0
+
+
+def commande_state_as_of(args) -> int:
+    """state as-of : état de toutes les stations (ou de certaines) à une date."""
+    from requete_temporelle import etat_flotte_a_date
+
+    station_ids = None
+    if args.stations:
+        station_ids = []
+        for reference in args.stations:
+            station = _station_ou_erreur(reference)
+            if station is None:
+                return 1
+            station_ids.append(str(station['id']))
+    try:
+        etats = etat_flotte_a_date(args.date, station_ids)
+    except ValueError:
+        print(f"❌ Date invalide: {args.date}")
+        return 1
+
+    if args.json:
+        print(json.dumps(etats, ensure_ascii=False, indent=2))
+        return 0
+    for station_id, mise_a_jour in etats.items():
+        station = get_station_by_id(station_id) or {}
+        print(f"# {station.get('nom', station_id)} — {mise_a_jour.get('date_maj')}")
+        for ouvrage, etat in mise_a_jour.get('etat_ouvrages', {}).items():
+            print(f"{ouvrage}\t{etat}")
+    return 0
+
+
+def commande_state_set(args) -> int:
+    """state set : enregistre une nouvelle mise à jour à partir de la dernière."""
+    station = _station_ou_erreur(args.station)
+    if station is None:
+        return 1
+    try:
+        nouveaux = appliquer_etats(station, dernier_etat_ouvrages(station),
+                                   analyser_affectations(args.affectations))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    mise_a_jour = {'etat_ouvrages': nouveaux, 'date_maj': args.date or datetime.now().strftime(FORMAT_DATE)}
+    if not ajouter_mise_a_jour_station(mise_a_jour, station['id']):
+        print("❌ Erreur lors de l'enregistrement de la mise à jour")
+        return 1
+    print(f"✅ Mise à jour du {mise_a_jour['date_maj']} enregistrée pour '{station['nom']}'")
+    return 0
+
+
+def commande_state_import(args) -> int:
+    """state import : import en masse de changements d'état (CSV, JSONL ou JSON, voir ingestion.py)."""
+    try:
+        resume = importer_etats(args.fichier, args.format, args.strict)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    for erreur in resume['erreurs']:
+        print(f"❌ Ligne {erreur['ligne']}: {erreur['erreur']}")
+    if resume['rejetees'] > len(resume['erreurs']):
+        print(f"... {resume['rejetees'] - len(resume['erreurs'])} autre(s) ligne(s) rejetée(s)")
+    if resume['enregistre']:
+        print(f"✅ {resume['mises_a_jour']} mise(s) à jour enregistrée(s) pour {resume['stations']} station(s) "
+              f"({resume['acceptees']} ligne(s) acceptée(s), {resume['rejetees']} rejetée(s), {resume['duree_s']} s)")
+    else:
+        print(f"❌ Aucune mise à jour enregistrée ({resume['acceptees']} ligne(s) acceptée(s), "
+              f"{resume['rejetees']} rejetée(s))")
+    return 0 if resume['enregistre'] and not resume['rejetees'] else 1
+
+
+def commande_export(args) -> int:
+    """export : historique aplati (station_id, date_maj, ouvrage, etat) en CSV, JSONL ou colonnes."""
+    try:
+        resume = exporter_etats(args.sortie, args.format, args.stations, args.debut, args.fin)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    # Avec '--sortie -', la sortie standard ne contient que les données
+    print(f"✅ {resume['lignes']} ligne(s) exportée(s) vers {resume['fichier']} ({resume['duree_s']} s)",
+          file=sys.stderr if args.sortie == '-' else sys.stdout)
+    return 0
+
+
+def commande_stats_availability(args) -> int:
+    """stats availability : disponibilité et temps par état des ouvrages, par station, type ou flotte."""
+    from disponibilite import analyser_flotte
+
+    station_ids = None
+    if args.stations:
+        station_ids = []
+        for reference in args.stations:
+            station = _station_ou_erreur(reference)
+            if station is None:
+                return 1
+            station_ids.append(str(station['id']))
+    try:
+        groupes = analyser_flotte(args.debut, args.fin, station_ids, args.par)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.json:
+        print(json.dumps({cle: statistiques.vers_dict() for cle, statistiques in groupes.items()},
+                         ensure_ascii=False, indent=2))
+        return 0
+    for cle, statistiques in groupes.items():
+        nom = (get_station_by_id(cle) or {}).get('nom', cle) if args.par == 'station' else cle
+        globale = statistiques.disponibilite_globale()
+        print(f"# {nom} — disponibilité {'n/a' if globale is None else f'{globale:.1%}'}")
+        disponibilite = statistiques.disponibilite()
+        transitions = statistiques.nb_transitions()
+        for ouvrage, temps in statistiques.temps_par_etat().items():
+            total = sum(temps.values())
+            repartition = ', '.join(f"{etat} {secondes / total:.1%}"
+                                    for etat, secondes in sorted(temps.items(), key=lambda e: -e[1]))
+            part = disponibilite[ouvrage]
+            print(f"{ouvrage}\t{'n/a' if part is None else f'{part:.1%}'}\t"
+                  f"{transitions[ouvrage]} transition(s)\t{repartition}")
+    return 0
+
+
+def commande_stats_reliability(args) -> int:
+    """stats reliability : MTBF / MTTR par type d'ouvrage, affichés ou exportés."""
+    from fiabilite import get_table_fiabilite
+
+    table = get_table_fiabilite()
+    if args.sortie == '-':
+        table.ecrire(sys.stdout, args.format)
+        return 0
+    table.exporter(args.sortie, None if args.format == 'table' else args.format)
+    print(f"✅ Table de fiabilité ({len(table.lignes())} type(s) d'ouvrage) enregistrée: {args.sortie}")
+    return 0
+
+
+def commande_stats_health(args) -> int:
+    """stats health : score de santé des stations et ouvrages dégradés par l'amont."""
+    from impact import get_moteur_impact
+
+    moteur = get_moteur_impact()
+    impacts = list(moteur.stations.values())
+    if args.stations:
+        impacts = []
+        for reference in args.stations:
+            station = _station_ou_erreur(reference)
+            if station is None:
+                return 1
+            impact = moteur.stations.get(str(station['id']))
+            if impact is not None:
+                impacts.append(impact)
+
+    if args.json:
+        print(json.dumps({impact.station_id: impact.vers_dict() for impact in impacts},
+                         ensure_ascii=False, indent=2))
+        return 0
+    # Stations les plus dégradées en premier
+    for impact in sorted(impacts, key=lambda i: (i.score is None, i.score)):
+        nom = (get_station_by_id(impact.station_id) or {}).get('nom', impact.station_id)
+        score = 'n/a' if impact.score is None else f"{impact.score:.1f}/100"
+        impactes = impact.ouvrages_impactes()
+        print(f"{nom}\t{score}\t{impact.date_maj}\t"
+              f"{len(impactes)} ouvrage(s) dégradé(s) par l'amont{': ' + ', '.join(impactes) if impactes else ''}")
+    return 0
+
+
+def commande_render(args) -> int:
+    """render : diagramme d'une station dans un fichier."""
+    from rendu_lot import rendre_station, nom_fichier_diagramme
+
+    station = _station_ou_erreur(args.station)
+    if station is None:
+        return 1
+    chemin = args.sortie or nom_fichier_diagramme(station, 'png')
+    try:
+        resultat = rendre_station(station, chemin, args.date, not args.sans_cache)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if resultat['statut'] != 'ok':
+        print(f"❌ {resultat['erreur']}")
+        return 1
+    print(f"✅ Diagramme de '{station['nom']}' ({resultat['date_maj']}) enregistré: {chemin}")
+    return 0
+
+
+def commande_render_all(args) -> int:
+    """render-all : diagrammes de toute la flotte (voir rendu_lot.py)."""
+    from rendu_lot import rendre_flotte, NOM_MANIFESTE
+
+    manifeste = rendre_flotte(args.sortie, args.formats, args.stations, args.types, args.date,
+                              args.processus, not args.sans_cache)
+    totaux = manifeste['totaux']
+    print(f"✅ {totaux['ok']} diagramme(s) généré(s) ({manifeste['fichiers_depuis_cache']} fichier(s) repris du cache), "
+          f"{totaux['ignore']} station(s) ignorée(s), {totaux['erreur']} erreur(s) — manifeste: {os.path.join(args.sortie, NOM_MANIFESTE)}")
+    return 1 if totaux['erreur'] else 0
+
+
+def ajouter_sous_commandes(parser) -> None:
+    """
+    Déclare les sous-commandes non interactives sur le parseur de main.py.
+
+    Chaque sous-commande renseigne args.fonction, qui retourne le code de sortie.
+    """
+    sous_parsers = parser.add_subparsers(dest='commande', metavar='commande')
+
+    # stations
+    stations = sous_parsers.add_parser('stations', help="Gestion des stations")
+    actions = stations.add_subparsers(dest='action', metavar='action', required=True)
+    lister = actions.add_parser('list', help="Lister les stations")
+    lister.add_argument('--json', action='store_true', help="Sortie JSON")
+    lister.set_defaults(fonction=commande_stations_list)
+    supprimer = actions.add_parser('delete', help="Supprimer une station et son historique")
+    supprimer.add_argument('station', help="ID ou nom de la station")
+    supprimer.add_argument('--oui', action='store_true', help="Confirmer la suppression")
+    supprimer.set_defaults(fonction=commande_stations_delete)
+
+    # state
+    etats = sous_parsers.add_parser('state', help="États des ouvrages")
+    actions = etats.add_subparsers(dest='action', metavar='action', required=True)
+    afficher = actions.add_parser('show', help="Afficher les états d'une station")
+    afficher.add_argument('station', help="ID ou nom de la station")
+    afficher.add_argument('--date', default=None,
+                          help="Date de l'état (YYYY-MM-DD[ HH:MM:SS]), dernière mise à jour par défaut")
+    afficher.add_argument('--json', action='store_true', help="Sortie JSON")
+    afficher.set_defaults(fonction=commande_state_show)
+    a_date = actions.add_parser('as-of', help="État de la flotte à une date")
+    a_date.add_argument('date', help="Instant de la requête (YYYY-MM-DD[ HH:MM[:SS]])")
+    a_date.add_argument('--station', action='append', dest='stations',
+                        help="ID ou nom de station (option répétable, toutes par défaut)")
+    a_date.add_argument('--json', action='store_true', help="Sortie JSON")
+    a_date.set_defaults(fonction=commande_state_as_of)
+    modifier = actions.add_parser('set', help="Enregistrer une mise à jour (ouvrage=etat ...)")
+    modifier.add_argument('station', help="ID ou nom de la station")
+    modifier.add_argument('affectations', nargs='+', metavar='ouvrage=etat',
+                          help=f"Nouvel état d'un ouvrage ({', '.join(ETATS_VALIDES)})")
+    modifier.add_argument('--date', default=None, help="Date de la mise à jour (maintenant par défaut)")
+    modifier.set_defaults(fonction=commande_state_set)
+    importer = actions.add_parser('import', help="Importer des changements d'état (CSV, JSONL ou JSON)")
+    importer.add_argument('fichier', help="Fichier CSV, JSONL ou JSON (station_id, timestamp, ouvrage, etat)")
+    importer.add_argument('--format', choices=FORMATS_IMPORT, default=None,
+                          help="Format du fichier (d'après l'extension par défaut)")
+    importer.add_argument('--strict', action='store_true',
+                          help="N'enregistrer rien si une ligne est rejetée")
+    importer.set_defaults(fonction=commande_state_import)
+
+    # export
+    export = sous_parsers.add_parser('export', help="Exporter l'historique des états (CSV, JSONL ou colonnes)")
+    export.add_argument('--format', choices=FORMATS_EXPORT, default='csv', help="Format d'export")
+    export.add_argument('--sortie', default='-', help="Fichier de sortie ('-' : sortie standard)")
+    export.add_argument('--station', action='append', dest='stations',
+                        help="ID ou nom de station (option répétable, toutes par défaut)")
+    export.add_argument('--debut', default=None, help="Date de début incluse (YYYY-MM-DD[ HH:MM:SS])")
+    export.add_argument('--fin', default=None, help="Date de fin incluse (YYYY-MM-DD[ HH:MM:SS])")
+    export.set_defaults(fonction=commande_export)
+
+    # stats
+    statistiques = sous_parsers.add_parser('stats', help="Statistiques sur l'historique des états")
+    actions = statistiques.add_subparsers(dest='action', metavar='action', required=True)
+    disponibilite = actions.add_parser('availability', help="Disponibilité et temps passé dans chaque état")
+    disponibilite.add_argument('--debut', default=None,
+                               help="Début de la fenêtre (YYYY-MM-DD[ HH:MM:SS]), première mise à jour par défaut")
+    disponibilite.add_argument('--fin', default=None,
+                               help="Fin de la fenêtre (YYYY-MM-DD[ HH:MM:SS], jour inclus), maintenant par défaut")
+    disponibilite.add_argument('--station', action='append', dest='stations',
+                               help="ID ou nom de station (option répétable, toutes par défaut)")
+    disponibilite.add_argument('--par', choices=('station', 'type', 'flotte'), default='station',
+                               help="Regroupement des résultats")
+    disponibilite.add_argument('--json', action='store_true', help="Sortie JSON")
+    disponibilite.set_defaults(fonction=commande_stats_availability)
+    fiabilite = actions.add_parser('reliability', help="MTBF / MTTR par type d'ouvrage")
+    fiabilite.add_argument('--format', choices=('table', 'csv', 'json'), default='table',
+                           help="Format de sortie (fichier : d'après l'extension si 'table')")
+    fiabilite.add_argument('--sortie', default='-', help="Fichier de sortie ('-' : sortie standard)")
+    fiabilite.set_defaults(fonction=commande_stats_reliability)
+    sante = actions.add_parser('health', help="Score de santé des stations (pannes propagées vers l'aval)")
+    sante.add_argument('--station', action='append', dest='stations',
+                       help="ID ou nom de station (option répétable, toutes par défaut)")
+    sante.add_argument('--json', action='store_true', help="Sortie JSON")
+    sante.set_defaults(fonction=commande_stats_health)
+
+    # render
+    rendu = sous_parsers.add_parser('render', help="Diagramme d'une station")
+    rendu.add_argument('station', help="ID ou nom de la station")
+    rendu.add_argument('--date', default=None,
+                       help="Date de l'état à représenter (YYYY-MM-DD[ HH:MM:SS]), dernière mise à jour par défaut")
+    rendu.add_argument('--sortie', default=None, help="Fichier de sortie (.png ou .svg)")
+    rendu.add_argument('--sans-cache', action='store_true', help="Ignorer le cache de rendu")
+    rendu.set_defaults(fonction=commande_render)
+
+    # render-all
+    flotte = sous_parsers.add_parser('render-all', help="Diagrammes de toute la flotte")
+    flotte.add_argument('--sortie', default='diagrammes', help="Dossier de sortie")
+    flotte.add_argument('--format', nargs='+', default=['png'], choices=('png', 'svg'),
+                        dest='formats', help="Format(s) de sortie")
+    flotte.add_argument('--station', action='append', dest='stations',
+                        help="ID ou nom de station (option répétable, toutes par défaut)")
+    flotte.add_argument('--type', action='append', dest='types',
+                        help="Type de procédé (option répétable, tous par défaut)")
+    flotte.add_argument('--date', default=None,
+                        help="Date de l'état à représenter (YYYY-MM-DD[ HH:MM:SS]), dernière mise à jour par défaut")
+    flotte.add_argument('--processus', type=int, default=1,
+                        help="Nombre de processus de rendu (0 : un par cœur, 1 par défaut)")
+    flotte.add_argument('--sans-cache', action='store_true', help="Ignorer le cache de rendu (tout redessiner)")
+    flotte.set_defaults(fonction=commande_render_all)
@@ -7,7 +7,9 @@ from datetime import datetime, timedelta
 from collections import OrderedDict
 
 # Import des fonctions utilitaires
-from utils import log_erreur, log_info, log_avertissement, formater_nom_procede
+from utils import log_erreur, log_info, log_avertissement, formater_nom_procede, get_stations_list, save_stations, invalider_cache_etats
+from stockage import get_stockage
+from catalogue import get_catalogue
 from gen_station import get_types, get_ouvrages_procede, create_initial_state
 
 def load_json(path):
@@ -184,8 +186,7 @@ def customiser_ouvrages(etats_ouvrages, type_procede=None):
     
     # Obtenir la liste ordonnée des ouvrages si le type de procédé est fourni
     if type_procede:
-        from main import get_ouvrages_procede as main_get_ouvrages_procede
-        ouvrages_ordre = main_get_ouvrages_procede(type_procede)
+        ouvrages_ordre = get_catalogue().ouvrages(type_procede)
         if ouvrages_ordre:
             # Créer une liste ordonnée des ouvrages existants dans etat_ouvrages
             ouvrages_a_afficher = []
@@ -408,7 +409,7 @@ def create_station():
             log_avertissement(f"Veuillez entrer un nombre entre 1 et {len(destinations)}")
         
         # 6. Récupère la liste d'ouvrages avec leurs états initiaux
-        etat_initial = get_ouvrages_procede(data['type_procede'], types_dict)
+        etat_initial = get_ouvrages_procede(data['type_procede'])
         if not etat_initial:
             log_erreur("Aucun ouvrage trouvé pour ce type de procédé.")
             return None
@@ -447,32 +448,26 @@ def create_station():
         # 11. Enregistre les données
         try:
             # Enregistre la station
-            stations = load_json("data/stations.json")
-            if not isinstance(stations, list):
-                stations = []
+            stations = list(get_stations_list())
             stations.append(station_data)
-            save_json("data/stations.json", stations)
-            
-            # Enregistre l'état initial
-            etats_data = load_json("data/etat_station.json")
-            if not isinstance(etats_data, dict):
-                etats_data = OrderedDict()
-            
-            # Créer une nouvelle entrée avec l'ID de la station comme clé
-            etats_data[station_id] = [etat_data]
+            if not save_stations(stations):
+                raise IOError("Échec de l'enregistrement de la liste des stations")
             
             # Afficher l'ordre avant sauvegarde
             print("\nOrdre des ouvrages avant sauvegarde dans le fichier:")
             for i, (ouvrage, etat) in enumerate(etat_data['etat_ouvrages'].items(), 1):
                 print(f"{i}. {ouvrage}: {etat}")
             
-            save_json("data/etat_station.json", etats_data)
+            # Enregistre l'état initial (l'ID de la station sert de clé)
+            stockage = get_stockage()
+            stockage.sauvegarder_etats(station_id, [etat_data])
+            invalider_cache_etats()
             
             # Vérifier l'ordre après chargement
-            etats_verifies = load_json("data/etat_station.json")
-            if station_id in etats_verifies and etats_verifies[station_id]:
+            etats_verifies = stockage.charger_historique(station_id)
+            if etats_verifies:
                 print("\nOrdre des ouvrages après chargement du fichier:")
-                for i, (ouvrage, etat) in enumerate(etats_verifies[station_id][0]['etat_ouvrages'].items(), 1):
+                for i, (ouvrage, etat) in enumerate(etats_verifies[0]['etat_ouvrages'].items(), 1):
                     print(f"{i}. {ouvrage}: {etat}")
             
             log_info(f"Station '{data['nom']}' créée avec succès!")
@@ -3,15 +3,17 @@
 # -*- coding: utf-8 -*-
 
 # Configurer le backend de matplotlib pour l'affichage interactif
+# (un backend imposé via MPLBACKEND, par exemple 'Agg' pour le rendu par lot, est respecté)
+import os
 try:
-    import tkinter as tk
     import matplotlib
-    matplotlib.use('TkAgg')  # Utiliser le backend TkAgg pour l'affichage interactif
+    if not os.environ.get('MPLBACKEND'):
+        import tkinter as tk
+        matplotlib.use('TkAgg')  # Utiliser le backend TkAgg pour l'affichage interactif
 except ImportError:
     import matplotlib
     matplotlib.use('Agg')  # Fallback sur le backend non interactif si Tkinter n'est pas disponible
 
-import os
 import json
 import logging
 from datetime import datetime
@@ -27,645 +29,88 @@ plt.ioff()  # Désactiver le mode interactif par défaut
 
 # Configuration de la police pour le support des émojis
 plt.rcParams.update({
-    'font.family': 'sans-serif',
+    'font.family': 'Segoe UI Emoji',
     'font.sans-serif': ['Segoe UI Emoji', 'DejaVu Sans', 'Arial', 'sans-serif'],
     'figure.autolayout': True,
-    'figure.raise_window': False  # Empêche la fenêtre de s'afficher automatiquement
+    'figure.raise_window': False,  # Empêche la fenêtre de s'afficher automatiquement
+    'figure.max_open_warning': 0
 })
 
-# Configuration du logging
-log = logging.getLogger(__name__)
-
-import os
-import json
-import logging
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib import patches, text
-import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
-from collections import OrderedDict
-
-# Configuration de la police pour prendre en charge les émojis
-import matplotlib as mpl
-mpl.rcParams['font.family'] = 'Segoe UI Emoji'
-
-# Configuration du logging
-log = logging.getLogger(__name__)
-
-import os
-import json
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import logging
-from datetime import datetime
-from utils import get_stations_list, update_stations_cache, log_avertissement, log_erreur, log_info  # Ajout de l'import manquant
+from utils import get_stations_list, update_stations_cache, charger_historique_station, log_erreur, log_info  # Ajout de l'import manquant
 
-# Importer les utilitaires
-from gen_station import get_ouvrages_procede  # Ajout de l'import manquant
+from disposition_flux import (
+    STYLES_DESTINATION,
+    DispositionDiagramme,
+    ETATS_LEGENDE,
+    ModeleDiagramme,
+    preparer_ouvrages_station,
+    formater_titre_diagramme,
+    comparer_etats,
+)
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
 
-class DiagrammeFlux:
+class DiagrammeFlux(ModeleDiagramme):
     """Classe pour générer un diagramme de flux des ouvrages d'une station d'épuration."""
     
     def __init__(self, type_station=None):
         """Initialise le diagramme avec les paramètres par défaut."""
-        # Configuration des couleurs pour chaque état
-        self.couleurs_etats = {
-            'en_service': '#4CAF50',           # Vert
-            'en_panne': '#F44336',             # Rouge
-            'en_dysfonctionnement': '#FFC107',   # Ambre
-            'en_maintenance': '#FF9800',       # Orange
-            'hors_service': '#9E9E9E',         # Gris
-            'inexistant': '#FFFFFF',           # Blanc
-            'arret_volontaire': '#B22222',    # Rouge brique
-            'surcharge_sature': '#9C27B0',    # Violet
-            'nouvel_ouvrage': '#03A9F4'        # Bleu
-        }
+        super().__init__(type_station)
         
-        # Configuration de la station
-        self.type_station = type_station
-        self.filiere_eau = {}
-        self.filiere_boue = []  # Ajout de l'attribut
+        # Artistes du dernier diagramme dessiné, réutilisés par GabaritDiagramme :
+        # un patch et un libellé par ouvrage (dans l'ordre des ouvrages positionnés) et le titre
+        self.blocs = []
+        self.textes_blocs = []
+        self.titre_figure = None
         
-        # Charger la configuration des types si un type de station est fourni
-        if self.type_station:
-            self._charger_configuration_types()
+        # Couleur de mise en évidence des ouvrages modifiés (comparaison de deux mises à jour)
+        self.couleur_changement = '#E91E63'
         
-        # Configuration des dimensions (augmentation de la taille des blocs)
-        self.largeur_bloc = 6.0  # Augmenté de 4.0 à 6.0
-        self.hauteur_bloc = 1.8  # Légèrement augmenté pour les textes sur plusieurs lignes
-        self.espacement = 2.0    
-        self.marge_gauche = 2.0  # Augmenté pour mieux centrer
-        self.marge_haut = 1.5    # Augmenté de 1.0 à 1.5
-        
-        # Configuration de la police
-        self.police_titre = {
-            'fontsize': 10,       # Augmenté de 9 à 10
-            'fontweight': 'bold',
-            'color': '#333333',
-            'ha': 'center',
-            'va': 'center',
-            'wrap': True
-        }
-        
-        self.police_etat = {
-            'fontsize': 9,        # Augmenté de 8 à 9
-            'color': '#555555',
-            'ha': 'center',
-            'va': 'center',
-            'style': 'italic'
-        }
-        
-    def _charger_configuration_types(self):
-        """Charge la configuration des types depuis le fichier types.json"""
-        try:
-            with open('data/types.json', 'r', encoding='utf-8') as f:
-                types_config = json.load(f)
-                if self.type_station in types_config:
-                    config_station = types_config[self.type_station]
-                    self.filiere_eau = config_station.get('filiere_eau', {})
-                    self.filiere_boue = config_station.get('filiere_boue', [])
-        except Exception as e:
-            log.error(f"Erreur lors du chargement de la configuration des types : {e}")
+    def empreinte_style(self) -> dict:
+        """Paramètres de style qui influent sur l'image produite (entrée de la clé du cache de rendu)."""
+        return {**super().empreinte_style(), 'matplotlib': matplotlib.__version__}
     
-    def parser_ouvrages(self, liste_ouvrages: list) -> list:
-        """
-        Parse la liste des ouvrages pour extraire le nom et l'état.
-        
-        Args:
-            liste_ouvrages: Liste des chaînes au format "Numéro. Nom de l'ouvrage - État"
-            ou des dictionnaires contenant déjà les informations structurées
-            
-        Returns:
-            Liste de dictionnaires avec 'id', 'nom' et 'etat' pour chaque ouvrage,
-            ainsi que tous les champs supplémentaires présents dans l'entrée
-        """
-        ouvrages = []
-        for i, item in enumerate(liste_ouvrages):
-            if isinstance(item, dict):
-                # Si l'item est déjà un dictionnaire, l'utiliser directement
-                # en s'assurant qu'il a les champs requis
-                ouvrage = item.copy()
-                if 'id' not in ouvrage:
-                    ouvrage['id'] = i + 1
-                if 'nom' not in ouvrage or 'etat' not in ouvrage:
-                    continue  # Ignorer les entrées invalides
-                ouvrages.append(ouvrage)
-            elif isinstance(item, str):
-                # Traitement du format de chaîne de caractères
-                if ' - ' in item:
-                    # Supprimer le numéro et l'espace du début si présent
-                    ligne = item
-                    if ligne[0].isdigit() and '. ' in ligne:
-                        ligne = ligne.split('. ', 1)[1]
-                    
-                    # Séparer le nom et l'état
-                    parties = ligne.split(' - ', 1)
-                    if len(parties) == 2:
-                        nom, etat = parties
-                        ouvrages.append({
-                            'id': i + 1,
-                            'nom': nom.strip(),
-                            'etat': etat.strip()
-                        })
-        return ouvrages
-    
-    def classer_par_filiere(self, ouvrages: list) -> dict:
-        """
-        Répartit les ouvrages dans les différentes filières (eau, boue, etc.).
-        
-        Args:
-            ouvrages: Liste des ouvrages à classer
-            
-        Returns:
-            Dictionnaire des ouvrages classés par filière
-        """
-        filieres = {
-            'pretraitement': [],
-            'traitement_primaire': [],
-            'traitement_secondaire': [],
-            'traitement_tertiaire': [],
-            'rejet': [],
-            'traitement_boues': [],
-            'stockage': [],
-            'valorisation': [],
-            'epandage': [],
-            'mise_en_decharge': [],
-            'incineration': [],
-            'autre': []
-        }
-        
-        # Dictionnaire de correspondance entre les noms d'ouvrages et leurs filières
-        correspondance_ouvrages = {
-            # Prétraitement
-            'Dégrillage': 'pretraitement',
-            'Dégrillage fin': 'pretraitement',
-            'Dégrillage grossier': 'pretraitement',
-            'Dessablage/Dégraissage': 'pretraitement',
-            
-            # Traitement primaire
-            'Décanteur primaire': 'traitement_primaire',
-            'Bassin de décantation primaire': 'traitement_primaire',
-            'Décantation primaire': 'traitement_primaire',
-            'Lagune anaérobie': 'traitement_primaire',
-            'Lagune facultative': 'traitement_primaire',
-            'Lagune de maturation': 'traitement_primaire',
-            
-            # Traitement secondaire
-            "Bassins d'aération": 'traitement_secondaire',
-            'Décanteur secondaire': 'traitement_secondaire',
-            'Décantation intégrée': 'traitement_secondaire',
-            'Réacteur biologique séquentiel (SBR)': 'traitement_secondaire',
-            'Bassin de biofiltration': 'traitement_secondaire',
-            'Bassin biologique à membranes': 'traitement_secondaire',
-            'Lit planté de roseaux à écoulement horizontal': 'traitement_secondaire',
-            'Lit planté de roseaux à écoulement vertical': 'traitement_secondaire',
-            'Réacteur biologique compact': 'traitement_secondaire',
-            
-            # Traitement tertiaire
-            'Filtration sur sable': 'traitement_tertiaire',
-            'Désinfection UV': 'traitement_tertiaire',
-            'Filtration membranaire': 'traitement_tertiaire',
-            'Microfiltration/Ultrafiltration': 'traitement_tertiaire',
-            
-            # Traitement des boues
-            'Épaississement des boues': 'traitement_boues',
-            'Déshydratation mécanique': 'traitement_boues',
-            'Lits de séchage': 'traitement_boues',
-            'Recirculation des boues': 'traitement_boues',
-            'Épaississement dynamique': 'traitement_boues',
-            'Minéralisation dans les lits plantés': 'traitement_boues',
-            'Curage périodique des boues minéralisées': 'traitement_boues',
-            'Évacuation des boues par curage périodique': 'traitement_boues',
-            'Séchage naturel sur lit de séchage': 'traitement_boues',
-            
-            # Autres
-            'Rejet': 'rejet'
-        }
-        
-        # Dictionnaire pour les types de boues
-        type_boues = {
-            'Décanteur primaire': 'boues_primaires',
-            'Décanteur secondaire': 'boues_secondaires'
-        }
-        
-        for ouvrage in ouvrages:
-            nom = ouvrage['nom']
-            
-            # Vérifier si l'ouvrage est dans la correspondance
-            if nom in correspondance_ouvrages:
-                filiere = correspondance_ouvrages[nom]
-                
-                # Ajouter le type de boues si nécessaire
-                if nom in type_boues:
-                    ouvrage['type'] = type_boues[nom]
-                
-                filieres[filiere].append(ouvrage)
-            else:
-                # Si l'ouvrage n'est pas reconnu, on le met dans une filière par défaut
-                filieres['autre'].append(ouvrage)
-        
-        return filieres
-    
-    def calculer_positions(self, filieres: dict) -> list:
-        """
-        Calcule les positions des blocs dans le diagramme.
-        
-        Args:
-            filieres: Dictionnaire des ouvrages classés par filière
-            
-        Returns:
-            Liste des ouvrages avec leurs positions mises à jour
-        """
-        ouvrages_positionnes = []
-        
-        # Définir l'ordre des filières (de haut en bas)
-        ordre_filieres = [
-            'pretraitement',
-            'traitement_primaire',
-            'traitement_secondaire',
-            'traitement_tertiaire',
-            'rejet',
-            'traitement_boues',
-            'stockage',
-            'valorisation',
-            'epandage',
-            'mise_en_decharge',
-            'incineration',
-            'autre'
-        ]
-        
-        # Espacement entre les lignes de filières
-        espacement_lignes = 3.0
-        
-        # Position Y initiale (première ligne en haut)
-        y = 0
-        
-        # Pour chaque filière dans l'ordre défini
-        for filiere in ordre_filieres:
-            if filiere not in filieres or not filieres[filiere]:
-                continue
-                
-            # Trier les ouvrages de la filière de gauche à droite
-            ouvrages_filiere = filieres[filiere]
-            
-            # Position X initiale pour cette ligne (marge gauche)
-            x = self.marge_gauche
-            
-            # Pour chaque ouvrage de la filière
-            for ouvrage in ouvrages_filiere:
-                # Mettre à jour les coordonnées
-                ouvrage['x'] = x
-                ouvrage['y'] = y
-                ouvrage['largeur'] = self.largeur_bloc
-                ouvrage['hauteur'] = self.hauteur_bloc
-                ouvrage['filiere'] = filiere  # S'assurer que la filière est bien définie
-                
-                # Ajouter à la liste des ouvrages positionnés
-                ouvrages_positionnes.append(ouvrage)
-                
-                # Décaler vers la droite pour le prochain ouvrage
-                x += self.largeur_bloc + self.espacement
-            
-            # Ajouter le titre de la filière à gauche de la ligne
-            if ouvrages_filiere:
-                plt.text(
-                    self.marge_gauche / 2,  # Position X (à gauche des ouvrages)
-                    y + self.hauteur_bloc / 2,  # Centré verticalement sur la ligne
-                    filiere.replace('_', ' ').title(),
-                    ha='right',
-                    va='center',
-                    fontsize=10,
-                    fontweight='bold',
-                    bbox=dict(facecolor='white', alpha=0.8, edgecolor='gray', boxstyle='round,pad=0.3')
-                )
-            
-            # Passer à la ligne suivante (en descendant)
-            y -= (self.hauteur_bloc + espacement_lignes)
-        
-        return ouvrages_positionnes
 
-    def get_boues_info(self, ouvrages_positionnes):
-        """
-        Récupère les informations sur les boues à partir des ouvrages positionnés.
-        
-        Args:
-            ouvrages_positionnes: Liste des ouvrages avec leurs positions
-            
-        Returns:
-            dict: Dictionnaire contenant les informations sur les boues
-        """
-        boues_info = {
-            'boues_primaires': None,
-            'boues_secondaires': None
-        }
-        
-        for ouvrage in ouvrages_positionnes:
-            if 'boues_primaires' in ouvrage.get('type', ''):
-                boues_info['boues_primaires'] = {
-                    'x': ouvrage['x'],
-                    'y': ouvrage['y'] - 0.5,
-                    'label': 'Boues primaires',
-                    'color': '#8B4513'  # Marron
-                }
-            elif 'boues_secondaires' in ouvrage.get('type', ''):
-                boues_info['boues_secondaires'] = {
-                    'x': ouvrage['x'],
-                    'y': ouvrage['y'] - 0.5,
-                    'label': 'Boues secondaires',
-                    'color': '#8B4513'  # Marron
-                }
-                
-        return boues_info
-
-    def dessiner_fleches(self, ax, ouvrages_positionnes: list):
+    def dessiner_fleches(self, ax, ouvrages_positionnes: list, fleches: tuple = None):
         """
         Dessine des flèches entre les ouvrages selon un flux logique.
         
         Args:
             ax: Axes matplotlib où dessiner
             ouvrages_positionnes: Liste des ouvrages avec leurs positions
+            fleches: Résultat de calculer_fleches déjà calculé (optionnel)
         """
-        if not ouvrages_positionnes:
-            return
-        
-        # Dictionnaire pour stocker les positions des ouvrages par nom
-        ouvrages_par_nom = {}
-        for ouvrage in ouvrages_positionnes:
-            if 'nom' in ouvrage:
-                ouvrages_par_nom[ouvrage['nom']] = {
-                    'x': ouvrage['x'] + ouvrage['largeur'] / 2,
-                    'y': ouvrage['y'] + ouvrage['hauteur'] / 2,
-                    'largeur': ouvrage['largeur'],
-                    'hauteur': ouvrage['hauteur'],
-                    'filiere': ouvrage.get('filiere', 'autre')
-                }
-        
-        # Trier les ouvrages par filière
-        ouvrages_par_filiere = {}
-        for ouvrage in ouvrages_positionnes:
-            filiere = ouvrage.get('filiere', 'autre')
-            if filiere not in ouvrages_par_filiere:
-                ouvrages_par_filiere[filiere] = []
-            ouvrages_par_filiere[filiere].append(ouvrage)
-        
-        # Définir les filières d'eau (trait continu bleu) dans l'ordre du flux
-        filieres_eau_ordre = [
-            'pretraitement',
-            'traitement_primaire',
-            'traitement_secondaire', 
-            'traitement_tertiaire',
-            'rejet'
-        ]
-        
-        # Style des flèches pour l'eau
-        style_fleche_eau = {
-            'color': '#3498db',  # Bleu
-            'linestyle': '-',    # Trait continu
-            'linewidth': 1.5,
-            'alpha': 0.9,
-            'arrowstyle': '-|>',
-            'shrinkA': 0,  # Désactiver le retrait au point de départ
-            'shrinkB': 0,  # Désactiver le retrait au point d'arrivée
-            'connectionstyle': 'arc3,rad=0.0',  # Ligne droite sans courbure
-        }
-        
-        # Style des flèches pour les boues
-        style_fleche_boues = {
-            'color': '#8B4513',  # Marron
-            'linestyle': '--',   # Trait pointillé
-            'linewidth': 1.5,
-            'alpha': 0.8,
-            'arrowstyle': '-|>',
-            'shrinkA': 5,
-            'shrinkB': 5,
-            'connectionstyle': 'arc3,rad=0.3',  # Courbure de la flèche
-        }
-        
-        # 1. Dessiner les flèches entre les ouvrages d'une même filière
-        for filiere, ouvrages in ouvrages_par_filiere.items():
-            if len(ouvrages) < 2:
-                continue
-                
-            # Trier les ouvrages de gauche à droite
-            ouvrages_tries = sorted(ouvrages, key=lambda x: x['x'])
-            
-            # Ne pas dessiner de flèches pour la filière boue
-            if 'boue' in filiere.lower():
-                continue
-                
-            # Pour les ouvrages sur la même ligne, flèche horizontale
-            for i in range(len(ouvrages_tries) - 1):
-                source = ouvrages_tries[i]
-                cible = ouvrages_tries[i + 1]
-                
-                # Coordonnées de départ (bord droit du bloc source)
-                x1 = source['x'] + source['largeur']
-                y1 = source['y'] + source['hauteur'] / 2
-                
-                # Coordonnées d'arrivée (bord gauche du bloc cible)
-                x2 = cible['x']
-                y2 = cible['y'] + cible['hauteur'] / 2
-                
-                # Style de flèche en fonction de la filière
-                if 'boue' in filiere.lower():
-                    arrow_style = style_fleche_boues
-                else:
-                    arrow_style = style_fleche_eau
-                
-                # Dessiner la flèche
-                ax.annotate(
-                    "",
-                    xy=(x2, y2),     # Point d'arrivée (pointe de la flèche)
-                    xytext=(x1, y1), # Point de départ
-                    arrowprops=arrow_style,
-                    zorder=1  # Placer les flèches en arrière-plan
-                )
+        fleches, etiquettes = fleches if fleches is not None else self.calculer_fleches(ouvrages_positionnes)
         
-        # 2. Dessiner les flèches entre les différentes filières d'eau
-        for i in range(len(filieres_eau_ordre) - 1):
-            filiere_courante = filieres_eau_ordre[i]
-            filiere_suivante = filieres_eau_ordre[i + 1]
-            
-            # Vérifier que les deux filières existent
-            if filiere_courante not in ouvrages_par_filiere or filiere_suivante not in ouvrages_par_filiere:
-                continue
-                
-            # Prendre le dernier ouvrage de la filière courante (le plus à droite)
-            derniers_ouvrages_courants = sorted(ouvrages_par_filiere[filiere_courante], key=lambda x: x['x'], reverse=True)
-            if not derniers_ouvrages_courants:
-                continue
-            source = derniers_ouvrages_courants[0]
-            
-            # Prendre le premier ouvrage de la filière suivante (le plus à gauche)
-            premiers_ouvrages_suivants = sorted(ouvrages_par_filiere[filiere_suivante], key=lambda x: x['x'])
-            if not premiers_ouvrages_suivants:
-                continue
-            cible = premiers_ouvrages_suivants[0]
-            
-            # Coordonnées de départ (bord droit du bloc source)
-            x1 = source['x'] + source['largeur']
-            y1 = source['y'] + source['hauteur'] / 2
-            
-            # Coordonnées d'arrivée (centre du bord gauche du bloc cible)
-            x2 = cible['x']
-            y2 = cible['y'] + cible['hauteur'] / 2
-            
-            # Dessiner la flèche entre les filières
+        for fleche in fleches:
             ax.annotate(
                 "",
-                xy=(x2, y2),  # Point d'arrivée (haut du bloc cible)
-                xytext=(x1, y1),  # Point de départ (bas du bloc source)
-                arrowprops={
-                    **style_fleche_eau,
-                    'connectionstyle': 'arc3,rad=0.15',  # Légère courbure
-                    'shrinkA': 0,  # Pas de réduction à la source
-                    'shrinkB': 0,  # Pas de réduction à la cible
-                },
-                zorder=1
+                xy=fleche['xy'],          # Point d'arrivée (pointe de la flèche)
+                xytext=fleche['xytext'],  # Point de départ
+                arrowprops=dict(fleche['arrowprops']),
+                zorder=1  # Placer les flèches en arrière-plan
             )
         
-        # 3. Dessiner les flèches pour les boues
-        if hasattr(self, 'type_station') and hasattr(self, 'filiere_eau') and isinstance(self.filiere_eau, dict):
-            # Dictionnaire pour stocker les configurations de boues
-            boues_config = {}
-            
-            # Vérifier d'abord les boues_secondaires
-            if 'boues_secondaires' in self.filiere_eau and isinstance(self.filiere_eau['boues_secondaires'], dict):
-                boues_config['boues_secondaires'] = self.filiere_eau['boues_secondaires'].copy()
-                if 'etiquette' not in boues_config['boues_secondaires']:
-                    boues_config['boues_secondaires']['etiquette'] = 'Boues biologiques'
-            
-            # Ensuite, vérifier les boues_primaires
-            if 'boues_primaires' in self.filiere_eau and isinstance(self.filiere_eau['boues_primaires'], dict):
-                boues_config['boues_primaires'] = self.filiere_eau['boues_primaires'].copy()
-                if 'etiquette' not in boues_config['boues_primaires']:
-                    boues_config['boues_primaires']['etiquette'] = 'Boues primaires'
-        
-            # Pour chaque configuration de boue trouvée
-            for boue_type, config in boues_config.items():
-                if not isinstance(config, dict):
-                    continue
-                    
-                source_nom = config.get('source')
-                destination_nom = config.get('destination')
-                etiquette = config.get('etiquette')
-                
-                # Si pas de destination, utiliser le premier ouvrage de la filière boue
-                if not destination_nom and hasattr(self, 'filiere_boue') and isinstance(self.filiere_boue, (list, dict)) and len(self.filiere_boue) > 0:
-                    destination_nom = self.filiere_boue[0] if isinstance(self.filiere_boue, list) else list(self.filiere_boue.keys())[0]
-                
-                if not source_nom or not destination_nom:
-                    log_avertissement(f"Configuration incomplète pour {boue_type}: source={source_nom}, destination={destination_nom}")
-                    continue
-                    
-                if source_nom in ouvrages_par_nom and destination_nom in ouvrages_par_nom:
-                    source = ouvrages_par_nom[source_nom]
-                    destination = ouvrages_par_nom[destination_nom]
-                    
-                    # Coordonnées de départ (centre du bord inférieur du bloc source)
-                    x1 = source['x'] + source['largeur'] / 2
-                    y1 = source['y']  # Bord inférieur
-                    
-                    # Coordonnées d'arrivée (haut du bloc destination)
-                    x2 = destination['x'] + destination['largeur'] / 2
-                    y2 = destination['y'] + destination['hauteur']  # Bord supérieur
-                    
-                    # Dessiner la flèche
-                    ax.annotate(
-                        "",
-                        xy=(x2, y2),
-                        xytext=(x1, y1),
-                        arrowprops=style_fleche_boues,
-                        zorder=1
-                    )
-                    
-                    # Ajouter l'étiquette
-                    label_x = source['x'] + source['largeur'] / 2
-                    label_y = source['y'] - 0.8
-                    
-                    ax.text(
-                        label_x, label_y,
-                        etiquette,
-                        ha='center',
-                        va='top',
-                        fontsize=9,
-                        bbox=dict(
-                            facecolor='#8B4513',
-                            alpha=0.8,
-                            boxstyle='round,pad=0.3',
-                            edgecolor='#5D2906',
-                            linewidth=0
-                        ),
-                        color='white',
-                        zorder=10
-                    )
-                else:
-                    log_avertissement(f"Source ou destination non trouvée pour {boue_type}: source={source_nom}, destination={destination_nom}")
-                    
-            # 3.2 Flèches pour la filière boue
-            if hasattr(self, 'filiere_boue') and len(self.filiere_boue) > 1:
-                
-                # Le premier élément est la source (épaississement)
-                source_nom = self.filiere_boue[0]
-                
-                if source_nom in ouvrages_par_nom:
-                    source = ouvrages_par_nom[source_nom]
-                    x1 = source['x'] + source['largeur'] / 2
-                    y1 = source['y']  # Bord inférieur
-                    
-                    # Pour chaque destination (sauf la source)
-                    for dest_nom in self.filiere_boue[1:]:
-                        if dest_nom in ouvrages_par_nom:
-                            dest = ouvrages_par_nom[dest_nom]
-                            x2 = dest['x'] + dest['largeur'] / 2
-                            # Ajuster y2 pour arriver exactement sur le bord inférieur du bloc de destination
-                            y2 = dest['y']  # Bord inférieur de la destination
-                            
-                            # Dessiner la flèche avec une courbure réduite
-                            ax.annotate(
-                                "",
-                                xy=(x2, y2),  # Point d'arrivée exact sur le bord inférieur
-                                xytext=(x1, y1),  # Point de départ (bas du bloc source)
-                                arrowprops={
-                                    'arrowstyle': '->',
-                                    'color': '#8B4513',  # Marron
-                                    'linewidth': 1.5,
-                                    'alpha': 0.8,
-                                    'shrinkA': 0,  # Pas de réduction au point de départ
-                                    'shrinkB': 0,  # Pas de réduction au point d'arrivée
-                                    'connectionstyle': 'arc3,rad=0.15'  # Courbure très réduite (0.1 au lieu de 0.2)
-                                },
-                                zorder=1
-                            )
-                else:
-                    print(f"[DEBUG] Erreur: {source_nom} non trouvé dans ouvrages_par_nom")
-            else:
-                print("[DEBUG] Moins de 2 ouvrages dans la filière boue")        
-            
-    def _formater_nom_ouvrage(self, nom: str) -> str:
-        """
-        Formate le nom d'un ouvrage pour un affichage sur une seule ligne.
-        
-        Args:
-            nom: Le nom de l'ouvrage à formater
+        for etiquette in etiquettes:
+            ax.text(
+                etiquette['x'], etiquette['y'],
+                etiquette['texte'],
+                ha='center',
+                va='top',
+                fontsize=9,
+                bbox=dict(
+                    facecolor='#8B4513',
+                    alpha=0.8,
+                    boxstyle='round,pad=0.3',
+                    edgecolor='#5D2906',
+                    linewidth=0
+                ),
+                color='white',
+                zorder=10
+            )
             
-        Returns:
-            Le nom formaté sur une seule ligne
-        """
-        # Remplacer les séparateurs par des espaces simples
-        separators = [' - ', ' / ', ' /', '/ ', ' -', '- ']
-        for sep in separators:
-            nom = nom.replace(sep, ' ')
-        
-        # Supprimer les espaces multiples
-        return ' '.join(nom.split())
-    
     def generer_diagramme(self, liste_ouvrages: list, titre: str, destination: str = None):
         """
         Génère le diagramme de flux avec les ouvrages donnés.
@@ -678,10 +123,8 @@ class DiagrammeFlux:
         Returns:
             tuple: Figure et axes matplotlib
         """
-        # Préparer les données
-        ouvrages = self.parser_ouvrages(liste_ouvrages)
-        filieres = self.classer_par_filiere(ouvrages)
-        ouvrages_positionnes = self.calculer_positions(filieres)
+        # Préparer les données (disposition en cache pour ce type de procédé)
+        ouvrages_positionnes, disposition = self.calculer_disposition(liste_ouvrages)
         
         # Créer une nouvelle figure avec constrained_layout pour un meilleur espacement
         fig, ax = plt.subplots(figsize=(14, 8), dpi=100, facecolor='white', 
@@ -691,13 +134,13 @@ class DiagrammeFlux:
         plt.ioff()
         
         # Dessiner le diagramme
-        self.dessiner_diagramme(ax, ouvrages_positionnes, destination)
+        self.dessiner_diagramme(ax, ouvrages_positionnes, destination, disposition)
         
         # Diviser le titre en lignes pour un meilleur affichage
         lignes_titre = titre.split('\n')
         
         # Ajouter le titre principal avec un espacement amélioré
-        fig.suptitle(
+        self.titre_figure = fig.suptitle(
             '\n'.join(lignes_titre),
             fontsize=13,
             fontweight='bold',
@@ -712,7 +155,17 @@ class DiagrammeFlux:
         
         return fig, ax
     
-    def dessiner_diagramme(self, ax, ouvrages_positionnes: list, destination: str = None):
+    def creer_gabarit(self, liste_ouvrages: list, destination: str = None) -> 'GabaritDiagramme':
+        """
+        Construit une figure réutilisable pour ce jeu d'ouvrages et cette destination.
+        
+        Voir GabaritDiagramme : les rendus suivants ne font que changer les
+        couleurs des blocs et le titre.
+        """
+        return GabaritDiagramme(self, liste_ouvrages, destination)
+    
+    def dessiner_diagramme(self, ax, ouvrages_positionnes: list, destination: str = None,
+                           disposition: 'DispositionDiagramme' = None, autonome: bool = True):
         """
         Dessine le diagramme de flux avec les ouvrages positionnés.
         
@@ -720,25 +173,19 @@ class DiagrammeFlux:
             ax: Axes matplotlib où dessiner
             ouvrages_positionnes: Liste des ouvrages avec leurs positions
             destination: Destination finale des eaux épurées (optionnel)
+            disposition: Géométrie précalculée (calculer_disposition) ; recalculée
+                à partir des ouvrages si elle n'est pas fournie
+            autonome: Ajouter la légende et ajuster la mise en page de la figure ;
+                False pour une tuile d'une figure qui en regroupe plusieurs
             
         Returns:
             tuple: Figure et axes matplotlib
         """
-        # Déterminer les limites automatiquement
-        if ouvrages_positionnes:
-            x_vals = [o['x'] for o in ouvrages_positionnes]
-            y_vals = [o['y'] for o in ouvrages_positionnes]
-            
-            # Ajouter des marges
-            x_margin = 1.0
-            y_margin = 1.0
-            x_min = min(x_vals) - x_margin
-            x_max = max(x_vals) + self.largeur_bloc + x_margin
-            y_min = min(y_vals) - y_margin
-            y_max = max(y_vals) + self.hauteur_bloc + y_margin
-        else:
-            x_min, x_max = 0, 16  # Ajusté pour correspondre à la nouvelle largeur
-            y_min, y_max = -16, 2  # Ajusté pour correspondre à la nouvelle hauteur
+        if disposition is None:
+            disposition = DispositionDiagramme(self, ouvrages_positionnes)
+        x_min, x_max, y_min, y_max = disposition.limites
+        self.blocs = []
+        self.textes_blocs = []
         
         # Dessiner chaque ouvrage
         for ouvrage in ouvrages_positionnes:
@@ -759,6 +206,7 @@ class DiagrammeFlux:
                 zorder=2
             )
             ax.add_patch(rect)
+            self.blocs.append(rect)
             
             # Formater le nom de l'ouvrage
             nom_formate = self._formater_nom_ouvrage(ouvrage['nom'])
@@ -779,31 +227,38 @@ class DiagrammeFlux:
                     edgecolor='none'
                 )
             )
+            self.textes_blocs.append(text)
         
-        # Dessiner les flèches entre les ouvrages
-        self.dessiner_fleches(ax, ouvrages_positionnes)
+        # Ajouter le titre de chaque filière à gauche de sa ligne
+        for titre_x, titre_y, libelle in disposition.titres_filieres:
+            ax.text(
+                titre_x,
+                titre_y,
+                libelle,
+                ha='right',
+                va='center',
+                fontsize=10,
+                fontweight='bold',
+                bbox=dict(facecolor='white', alpha=0.8, edgecolor='gray', boxstyle='round,pad=0.3')
+            )
         
-        # Trier les ouvrages par position x pour déterminer le premier et le dernier
-        ouvrages_tries = sorted(ouvrages_positionnes, key=lambda o: o['x'])
+        # Dessiner les flèches entre les ouvrages
+        self.dessiner_fleches(ax, ouvrages_positionnes, (disposition.fleches, disposition.etiquettes_boues))
         
-        if ouvrages_tries:
-            # Ajouter 'Eaux usées' au-dessus du premier ouvrage
-            premier_ouvrage = ouvrages_tries[0]
-            x_label = premier_ouvrage['x'] + premier_ouvrage['largeur']/2
-            y_label = premier_ouvrage['y'] + premier_ouvrage['hauteur'] + 2.0
-            
+        entree = disposition.entree
+        if entree:
             # Flèche verticale vers le bas
             ax.annotate(
                 "",
-                xy=(x_label, premier_ouvrage['y'] + premier_ouvrage['hauteur'] + 0.1),
-                xytext=(x_label, y_label - 0.5),
+                xy=entree['fleche_xy'],
+                xytext=entree['fleche_xytext'],
                 arrowprops=dict(arrowstyle='->', color='black', lw=1.5, shrinkA=0, shrinkB=0),
                 zorder=1
             )
             
-            # Étiquette 'Eaux usées'
+            # Étiquette 'Eaux usées' au-dessus du premier ouvrage
             ax.text(
-                x_label, y_label,
+                entree['x'], entree['y'],
                 'Eaux usées',
                 ha='center',
                 va='bottom',
@@ -812,66 +267,40 @@ class DiagrammeFlux:
                 color='black',
                 bbox=dict(facecolor='white', alpha=0.0, boxstyle='round,pad=0.5', linewidth=0)
             )
-            
-            # Trouver le dernier ouvrage du traitement secondaire
-            dernier_ouvrage_secondaire = None
-            for ouvrage in reversed(ouvrages_tries):
-                if any(nom in ouvrage['nom'] for nom in ['Décanteur secondaire', 'Clarificateur', 'Bassin aération', 'Décantation intégrée', 'Bassin biologique à membranes']):
-                    dernier_ouvrage_secondaire = ouvrage
-                    break
-            
-            # Si on a trouvé un ouvrage du traitement secondaire, on l'utilise
-            # Sinon, on prend le dernier ouvrage
-            dernier_ouvrage = dernier_ouvrage_secondaire if dernier_ouvrage_secondaire else ouvrages_tries[-1]
-            
-            # Ajouter 'Eaux épurées' après le dernier ouvrage
-            x_label = dernier_ouvrage['x'] + dernier_ouvrage['largeur'] + 3.0  # Augmenté de 2.0 à 5.0 pour correspondre aux 'Eaux usées'
-            y_label = dernier_ouvrage['y'] + dernier_ouvrage['hauteur']/2
+        
+        sortie = disposition.sortie
+        if sortie:
+            x_label, y_label = sortie['x'], sortie['y']
             
             # Flèche horizontale vers la droite
             ax.annotate(
                 "",
-                xy=(x_label - 1.5, y_label),
-                xytext=(dernier_ouvrage['x'] + dernier_ouvrage['largeur'] + 0.1, y_label),
+                xy=sortie['fleche_xy'],
+                xytext=sortie['fleche_xytext'],
                 arrowprops=dict(arrowstyle='->', color='blue', lw=1.5, shrinkA=0, shrinkB=0),
                 zorder=1
             )
             
-        # Styles pour les différentes destinations
-        styles_destination = {
-            'Autre': {'color': '#1f77b4', 'icon': '🌊', 'style': 'normal', 'icon_size': 24},  # Bleu avec icône vague
-            'Milieu naturel': {'color': '#1f77b4', 'icon': '🌳', 'style': 'normal', 'icon_color': '#2ca02c', 'icon_size': 28},  # Bleu avec icône arbre verte
-            'Réutilisation': {'color': '#2ca02c', 'icon': '♻️', 'style': 'italic', 'icon_size': 22},  # Vert avec icône recyclage
-            'Irrigation': {'color': '#8c564b', 'icon': '🌱', 'style': 'normal', 'icon_size': 22},  # Marron avec icône plante
-            'Irrigation agricole': {'color': '#8c564b', 'icon': '🚜', 'style': 'normal', 'icon_size': 24},  # Marron avec icône tracteur
-            'Irrigation des espaces verts': {'color': '#2e8b57', 'icon': '🌿', 'style': 'normal', 'icon_size': 26},  # Vert foncé avec icône feuille
-            'Industrie': {'color': '#ff7f0e', 'icon': '🏭', 'style': 'normal', 'icon_size': 24},  # Orange avec icône usine
-        }
-
-        # Afficher l'étiquette 'Eaux épurées'
-        ax.text(
-            x_label - 1, y_label,
-            'Eaux épurées',
-            ha='left',
-            va='center',
-            fontsize=10,
-            fontweight='bold',
-            color='blue',
-            bbox=dict(facecolor='white', alpha=0.8, edgecolor='none', pad=2.0),
-            zorder=5
-        )
+            # Afficher l'étiquette 'Eaux épurées'
+            ax.text(
+                x_label - 1, y_label,
+                'Eaux épurées',
+                ha='left',
+                va='center',
+                fontsize=10,
+                fontweight='bold',
+                color='blue',
+                bbox=dict(facecolor='white', alpha=0.8, edgecolor='none', pad=2.0),
+                zorder=5
+            )
 
         # Afficher la destination avec style
-        if destination:
+        if destination and sortie:
             # Vérifier si la destination est dans les styles spéciaux
             dest_speciale = destination in ['Rejet', 'Milieu naturel']
             
             # Utiliser le style défini ou un style par défaut
-            style = styles_destination.get(destination, {'color': '#666666', 'icon': '➡️', 'style': 'normal'})
-            
-            # Augmenter la taille pour les destinations spéciales
-            font_size = 14 if dest_speciale else 10
-            padding = 0.8 if dest_speciale else 0.3
+            style = STYLES_DESTINATION.get(destination, {'color': '#666666', 'icon': '➡️', 'style': 'normal'})
             
             # Ajuster la position pour le texte plus grand
             x_position = x_label + 2.5
@@ -904,7 +333,8 @@ class DiagrammeFlux:
             )
         
         # Ajouter la légende
-        self.ajouter_legende(ax)
+        if autonome:
+            self.ajouter_legende(ax)
         
         # Configurer l'aspect du graphique
         ax.set_xlim(x_min, x_max)
@@ -912,16 +342,19 @@ class DiagrammeFlux:
         ax.axis('off')
         
         # Ajuster le layout pour laisser de l'espace pour le titre et la légende
-        plt.tight_layout(rect=[0, 0.05, 1, 0.97])
+        if autonome:
+            plt.tight_layout(rect=[0, 0.05, 1, 0.97])
         
         # Ne pas afficher la figure ici, laisser la méthode appelante gérer l'affichage
         return ax
     
-    def ajouter_legende(self, ax):
+    def elements_legende(self) -> list:
         """
-        Ajoute une légende pour les états des ouvrages dans le coin supérieur droit.
+        Construit les éléments de la légende : un carré par état et un trait par filière.
+        
+        Returns:
+            list: Artistes Line2D à passer à legend(handles=...)
         """
-        # Créer les éléments de la légende
         legend_elements = [
             plt.Line2D(
                 [0], [0],
@@ -1032,10 +465,15 @@ class DiagrammeFlux:
                 linestyle='--'
             )
         ])
-        
+        return legend_elements
+    
+    def ajouter_legende(self, ax):
+        """
+        Ajoute une légende pour les états des ouvrages dans le coin supérieur droit.
+        """
         # Créer la légende avec un fond blanc et une bordure
         legend = ax.legend(
-            handles=legend_elements,
+            handles=self.elements_legende(),
             title="Légende",
             title_fontsize=10,
             fontsize=9,
@@ -1074,6 +512,103 @@ class DiagrammeFlux:
         )
         ax.add_patch(shadow)
     
+    def mettre_en_evidence_changements(self, ax, ouvrages_positionnes: list, changements: dict):
+        """
+        Fait ressortir les ouvrages modifiés du dernier diagramme dessiné.
+        
+        Les blocs inchangés sont estompés. Un bloc modifié est bicolore (état
+        avant à gauche, état après à droite), cerclé et annoté « avant → après ».
+        
+        Args:
+            ax: Axes du diagramme (dessiner_diagramme vient d'y être appelé)
+            ouvrages_positionnes: Ouvrages positionnés, dans l'ordre du dessin
+            changements: {nom: (etat_avant, etat_apres)} (voir comparer_etats)
+        """
+        libelles = dict(ETATS_LEGENDE)
+        for bloc, texte, ouvrage in zip(self.blocs, self.textes_blocs, ouvrages_positionnes):
+            changement = changements.get(ouvrage['nom'])
+            if changement is None:
+                bloc.set_alpha(0.25)
+                bloc.set_edgecolor('#BBBBBB')
+                texte.set_alpha(0.5)
+                continue
+            
+            etat_avant, etat_apres = changement
+            # Moitié gauche du bloc dans la couleur de l'état précédent, découpée selon le bloc arrondi
+            moitie = patches.Rectangle(
+                (ouvrage['x'] - 0.1, ouvrage['y'] - 0.1),
+                ouvrage['largeur'] / 2 + 0.1,
+                ouvrage['hauteur'] + 0.2,
+                facecolor=self.couleurs_etats.get(etat_avant, '#FFFFFF'),
+                edgecolor='none',
+                zorder=bloc.get_zorder()
+            )
+            ax.add_patch(moitie)
+            moitie.set_clip_path(bloc)
+            bloc.set_edgecolor(self.couleur_changement)
+            bloc.set_linewidth(3)
+            
+            ax.text(
+                ouvrage['x'] + ouvrage['largeur'] / 2,
+                ouvrage['y'] + 0.3,
+                f"{libelles.get(etat_avant, etat_avant or 'Absent')} → {libelles.get(etat_apres, etat_apres or 'Absent')}",
+                ha='center',
+                va='center',
+                fontsize=8,
+                fontweight='bold',
+                color=self.couleur_changement,
+                bbox=dict(facecolor='white', alpha=0.85, boxstyle='round,pad=0.2', edgecolor='none'),
+                zorder=4
+            )
+    
+class GabaritDiagramme:
+    """
+    Figure construite une seule fois pour un type de procédé, un jeu d'ouvrages
+    et une destination.
+    
+    Seules les couleurs des blocs et le titre varient d'une station ou d'une date
+    à l'autre : appliquer() met à jour ces artistes (set_facecolor, set_text) au
+    lieu de reconstruire blocs, textes, flèches et légende.
+    """
+    
+    def __init__(self, diagramme: DiagrammeFlux, liste_ouvrages: list, destination: str = None):
+        self.diagramme = diagramme
+        self.destination = destination
+        _, self.disposition = diagramme.calculer_disposition(liste_ouvrages)
+        self.noms = tuple(o['nom'] for o in diagramme.parser_ouvrages(liste_ouvrages))
+        self.fig, self.ax = diagramme.generer_diagramme(liste_ouvrages, '', destination)
+        self.blocs = list(diagramme.blocs)
+        self.textes_blocs = list(diagramme.textes_blocs)
+        self.titre = diagramme.titre_figure
+    
+    def appliquer(self, liste_ouvrages: list, titre: str):
+        """
+        Applique les états d'une station au gabarit.
+        
+        Args:
+            liste_ouvrages: Ouvrages de la station, avec les mêmes noms et dans le
+                même ordre que ceux du gabarit
+            titre: Titre du diagramme
+            
+        Returns:
+            La figure mise à jour, prête pour savefig
+            
+        Raises:
+            ValueError: Si les ouvrages ne correspondent pas au gabarit
+        """
+        ouvrages = self.diagramme.parser_ouvrages(liste_ouvrages)
+        if tuple(o['nom'] for o in ouvrages) != self.noms:
+            raise ValueError("Les ouvrages ne correspondent pas au gabarit du diagramme")
+        
+        couleurs = self.diagramme.couleurs_etats
+        for bloc, geometrie in zip(self.blocs, self.disposition.ouvrages):
+            bloc.set_facecolor(couleurs.get(ouvrages[geometrie['indice']]['etat'], '#FFFFFF'))
+        self.titre.set_text(titre)
+        return self.fig
+    
+    def fermer(self) -> None:
+        plt.close(self.fig)
+
 def get_station_etat(station_id, station_nom=None):
     """
     Récupère l'état d'une station à partir de son ID.
@@ -1086,19 +621,8 @@ def get_station_etat(station_id, station_nom=None):
         tuple: (etat_equipements, date_maj) ou (None, None) en cas d'erreur
     """
     try:
-        if not os.path.exists('data/etat_station.json'):
-            log.error("Le fichier etat_station.json n'existe pas.")
-            return None, None
-            
-        with open('data/etat_station.json', 'r', encoding='utf-8') as f:
-            etats_data = json.load(f)
-
-        if not isinstance(etats_data, dict):
-            log.error("Le fichier etat_station.json n'est pas un dictionnaire.")
-            return None, None
-
         # Récupérer les états pour la station spécifiée
-        etats_station = etats_data.get(station_id, [])
+        etats_station = charger_historique_station(station_id)
         
         if not etats_station:
             log.warning(f"Aucun état trouvé pour la station {station_nom or station_id}")
@@ -1125,15 +649,8 @@ def get_toutes_les_mises_a_jour(station_id):
         list: Liste des mises à jour triées par date (la plus récente en premier)
     """
     try:
-        with open('data/etat_station.json', 'r', encoding='utf-8') as f:
-            etats_data = json.load(f)
-
-        if not isinstance(etats_data, dict):
-            log.error("Le fichier etat_station.json n'est pas un dictionnaire.")
-            return []
-            
         # Récupérer les mises à jour pour la station spécifiée
-        mises_a_jour = etats_data.get(station_id, [])
+        mises_a_jour = charger_historique_station(station_id)
         
         # S'assurer que c'est toujours une liste
         if isinstance(mises_a_jour, dict):
@@ -1155,6 +672,83 @@ def get_toutes_les_mises_a_jour(station_id):
         log.error(f"Erreur lors de la récupération des mises à jour: {e}")
         return []
 
+def generer_diagramme_comparaison(type_procede, etat_avant, etat_apres, titre, destination=None):
+    """
+    Dessine un seul diagramme qui fait ressortir les différences entre deux mises à jour.
+    
+    Les ouvrages modifiés sont obtenus par comparaison des deux dictionnaires
+    d'états (sans rendre les deux diagrammes) ; le diagramme est dessiné avec
+    les états « après ».
+    
+    Args:
+        type_procede (str): Type de procédé de la station
+        etat_avant (dict): États de référence {nom: etat}
+        etat_apres (dict): États comparés {nom: etat}
+        titre (str): Titre du diagramme
+        destination (str, optional): Destination des eaux épurées
+        
+    Returns:
+        tuple: (figure, axes, changements {nom: (etat_avant, etat_apres)})
+    """
+    ouvrages_avant = preparer_ouvrages_station(type_procede, etat_avant)
+    ouvrages_apres = preparer_ouvrages_station(type_procede, etat_apres)
+    # États effectivement dessinés : les ouvrages non renseignés prennent l'état par défaut
+    changements = comparer_etats({o['nom']: o['etat'] for o in ouvrages_avant},
+                                 {o['nom']: o['etat'] for o in ouvrages_apres})
+    
+    nombre = len(changements)
+    titre = f"{titre}\n{nombre} ouvrage(s) modifié(s)" if nombre else f"{titre}\nAucun ouvrage modifié"
+    diagramme = DiagrammeFlux(type_station=type_procede)
+    fig, ax = diagramme.generer_diagramme(ouvrages_apres, titre, destination)
+    ouvrages_positionnes, _ = diagramme.calculer_disposition(ouvrages_apres)
+    diagramme.mettre_en_evidence_changements(ax, ouvrages_positionnes, changements)
+    return fig, ax, changements
+
+def afficher_comparaison_station(station, mise_a_jour_avant, mise_a_jour_apres):
+    """
+    Affiche les différences entre deux mises à jour d'une station et propose de les enregistrer.
+    
+    Args:
+        station (dict): Station comparée
+        mise_a_jour_avant (dict): Mise à jour de référence
+        mise_a_jour_apres (dict): Mise à jour comparée
+    """
+    type_procede = station.get('type_procede')
+    if not type_procede:
+        print("\033[1;31m❌ Le type de procédé n'est pas défini pour cette station.\033[0m")
+        return
+    
+    date_avant = mise_a_jour_avant.get('date_maj', 'Date inconnue')
+    date_apres = mise_a_jour_apres.get('date_maj', 'Date inconnue')
+    titre = (f"STEP {station.get('nom', 'Station inconnue')} | Type de procédé : "
+             f"{type_procede.replace('_', ' ').upper()}\nComparaison : {date_avant} → {date_apres}")
+    fig, _, changements = generer_diagramme_comparaison(
+        type_procede,
+        mise_a_jour_avant.get('etat_ouvrages', {}),
+        mise_a_jour_apres.get('etat_ouvrages', {}),
+        titre,
+        station.get('destination', 'Rejet')
+    )
+    
+    if changements:
+        print(f"\n\033[1m{len(changements)} ouvrage(s) modifié(s) :\033[0m")
+        for nom, (etat_avant, etat_apres) in changements.items():
+            print(f"  - {nom}: {etat_avant} → {etat_apres}")
+    else:
+        print("\n\033[1;33mAucun ouvrage modifié entre ces deux mises à jour.\033[0m")
+    
+    try:
+        plt.show(block=False)
+        plt.pause(0.1)
+        choix = input("\nVoulez-vous enregistrer la comparaison ? (o/n): ").strip().lower()
+        if choix == 'o':
+            nom_fichier = (f"comparaison_{station.get('nom', 'station').lower().replace(' ', '_')}_"
+                           f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
+            fig.savefig(nom_fichier, bbox_inches='tight', dpi=100)
+            print(f"\033[1;32m✅ Comparaison enregistrée sous : {nom_fichier}\033[0m")
+    finally:
+        plt.close(fig)
+
 def select_station_interactive():
     """Permet à l'utilisateur de sélectionner une station de manière interactive."""
     try:
@@ -1245,64 +839,17 @@ def generer_diagramme_station():
         
         # Récupérer la liste des ouvrages pour ce type de procédé
         try:
-            # Charger les données des types de procédés
-            with open('data/types.json', 'r', encoding='utf-8') as f:
-                types_data = json.load(f)
-            
-            # Récupérer les ouvrages sous forme de dictionnaire d'états
-            etats_ouvrages = get_ouvrages_procede(type_procede, types_data)
-            if not etats_ouvrages:
-                raise ValueError(f"Aucun ouvrage trouvé pour le type de procédé: {type_procede}")
-            
-            # Mettre à jour les états avec les valeurs actuelles
-            for nom_ouvrage, etat in etat_ouvrages.items():
-                if nom_ouvrage in etats_ouvrages:
-                    etats_ouvrages[nom_ouvrage] = etat
-            
-            # Convertir le dictionnaire d'états en liste d'ouvrages formatée
-            ouvrages = [{
-                'id': i + 1,
-                'nom': nom,
-                'etat': etat,
-                'etat_affiche': etat.replace('_', ' ').capitalize() if etat in ['en_service', 'en_panne', 'en_maintenance', 'hors_service', 'inexistant'] else etat
-            } for i, (nom, etat) in enumerate(etats_ouvrages.items())]
-            
+            ouvrages = preparer_ouvrages_station(type_procede, etat_ouvrages)
         except Exception as e:
             raise Exception(f"Erreur lors de la récupération des ouvrages: {str(e)}")
         
         # Créer le titre du diagramme avec la date de mise à jour
-        type_procede_formate = type_procede.replace('_', ' ').upper()
-        
-        # Formater la date pour l'affichage
-        if date_maj and date_maj != "Date inconnue":
-            try:
-                # Essayer différents formats de date
-                if isinstance(date_maj, str):
-                    if 'T' in date_maj:  # Format ISO avec 'T'
-                        date_obj = datetime.fromisoformat(date_maj.replace('Z', '+00:00'))
-                    else:
-                        # Essayer le format 'YYYY-MM-DD HH:MM:SS'
-                        try:
-                            date_obj = datetime.strptime(date_maj, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            # Essayer le format 'YYYY-MM-DD'
-                            date_obj = datetime.strptime(date_maj, '%Y-%m-%d')
-                    date_formatee = date_obj.strftime('%d/%m/%Y')
-                else:
-                    # Si date_maj est déjà un objet datetime
-                    date_formatee = date_maj.strftime('%d/%m/%Y')
-                
-                titre = f"STEP {nom_station} | Type de procédé : {type_procede_formate}\nMise à jour du {date_formatee}"
-            
-            except Exception as e:
-                print(f"\033[1;33m⚠️  Erreur de format de date: {e}. Utilisation de la date brute: {date_maj}\033[0m")
-                titre = f"STEP {nom_station} | Type de procédé : {type_procede_formate}\nMise à jour du {date_maj}"
-        else:
-            titre = f"STEP {nom_station} | Type de procédé : {type_procede_formate}"
+        titre = formater_titre_diagramme(nom_station, type_procede, date_maj)
                     
         # Créer une instance du diagramme et générer le diagramme
         print("\n\033[1mGénération du diagramme en cours...\033[0m")
         diagramme = DiagrammeFlux(type_station=type_procede)
+        destination = station.get('destination', 'Rejet')  # Utiliser la destination de la station ou 'Rejet' par défaut
         
         # Créer la figure et configurer pour le plein écran
         fig = plt.figure(figsize=(14, 8), dpi=100, num='Diagramme STEP', clear=True)
@@ -1318,15 +865,26 @@ def generer_diagramme_station():
         
         ax = fig.add_subplot(111)
         
-        # Dessiner le diagramme directement
-        diagramme.dessiner_diagramme(ax, diagramme.calculer_positions(
-            diagramme.classer_par_filiere(diagramme.parser_ouvrages(ouvrages))
-        ), station.get('destination', 'Rejet'))  # Utiliser la destination de la station ou 'Rejet' par défaut
+        # Dessiner le diagramme directement (vectoriel : zoom et déplacement restent nets)
+        ouvrages_positionnes, disposition = diagramme.calculer_disposition(ouvrages)
+        diagramme.dessiner_diagramme(ax, ouvrages_positionnes, destination, disposition)
         
         # Ajouter le titre
         fig.suptitle(titre, fontsize=13, fontweight='bold', y=0.99)
         fig.tight_layout(rect=[0, 0, 1, 0.95])
         
+        def enregistrer_diagramme(chemin):
+            """Enregistre le rendu du lot (taille fixe, cache de rendu) plutôt que la fenêtre affichée."""
+            # Import local : rendu_lot importe ce module
+            from rendu_lot import preparer_tache, rendre_fichier, fermer_gabarits
+            mise_a_jour = {'date_maj': date_maj, 'etat_ouvrages': etat_ouvrages}
+            try:
+                resultat = rendre_fichier(preparer_tache(station, mise_a_jour=mise_a_jour), chemin)
+            finally:
+                fermer_gabarits()
+            if resultat['statut'] != 'ok':
+                raise Exception(resultat['erreur'])
+        
         # Afficher la figure
         try:
             print("\033[1;32m✅ Diagramme généré avec succès !\033[0m")
@@ -1345,13 +903,13 @@ def generer_diagramme_station():
             if choix == 'o':
                 # Créer un nom de fichier basé sur le nom de la station et la date
                 nom_fichier = f"diagramme_{nom_station.lower().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                fig.savefig(nom_fichier, bbox_inches='tight', dpi=100)
+                enregistrer_diagramme(nom_fichier)
                 print(f"\033[1;32m✅ Diagramme enregistré sous : {nom_fichier}\033[0m")
             
         except Exception as e:
             # En cas d'échec d'affichage, sauvegarder automatiquement
             print(f"\033[1;33m⚠️  Impossible d'afficher la figure de manière interactive. Sauvegarde dans 'diagramme.png'\033[0m")
-            fig.savefig('diagramme.png', bbox_inches='tight', dpi=100)
+            enregistrer_diagramme('diagramme.png')
             print("\033[1;32m✅ Diagramme sauvegardé dans 'diagramme.png'\033[0m")
         
         # Nettoyer la figure
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disponibilité des ouvrages : temps passé dans chaque état et transitions d'état.
+
+Les calculs portent sur l'historique compact (historique_compact.py). Pour une
+station, les mises à jour sont triées par horodatage ; chacune est en vigueur
+jusqu'à la suivante (la dernière jusqu'à la fin de la fenêtre), et sa durée
+est bornée à la fenêtre [debut, fin). Le temps passé par chaque ouvrage dans
+chaque état est alors une seule somme pondérée (np.bincount) sur la matrice
+des codes d'état, et les transitions une comparaison de lignes consécutives :
+aucune boucle Python sur les mises à jour.
+
+La disponibilité d'un ouvrage est la part de son temps observé passée
+`en_service`. Le temps observé exclut les périodes où l'ouvrage est absent de
+la mise à jour en vigueur ou `inexistant`.
+
+Exemple :
+    from disponibilite import analyser_flotte
+
+    par_type = analyser_flotte('2024-01-01', '2024-12-31', par='type')
+    par_type['SBR'].disponibilite()     # {ouvrage: part du temps en service}
+    par_type['SBR'].temps_par_etat()    # {ouvrage: {etat: secondes}}
+
+    python main.py stats availability --debut 2024-01-01 --fin 2024-12-31 --par type
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils import get_stations_list
+from historique_compact import (
+    CODE_ABSENT,
+    HORODATAGE_INCONNU,
+    EtatsCompacts,
+    HistoriqueCompact,
+    get_etats_compacts,
+)
+from requete_temporelle import horodatage_requete
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+ETAT_DISPONIBLE = 'en_service'
+# États exclus du temps observé : l'ouvrage n'existe pas sur la station
+ETATS_HORS_PARC = ('inexistant',)
+REGROUPEMENTS = ('station', 'type', 'flotte')
+
+
+def bornes_fenetre(debut: Optional[str] = None, fin: Optional[str] = None) -> Tuple[Optional[int], int]:
+    """
+    Convertit une fenêtre de dates en horodatages [debut, fin).
+
+    Une date sans heure couvre toute la journée : '2024-12-31' comme fin
+    inclut le 31 décembre. Sans fin, la fenêtre s'arrête maintenant.
+
+    Raises:
+        ValueError: Date invalide
+    """
+    borne_debut = None
+    if debut is not None:
+        texte = str(debut).strip()
+        borne_debut = horodatage_requete(f"{texte} 00:00:00" if len(texte) == 10 else texte)
+    if fin is None:
+        fin = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    borne_fin = horodatage_requete(fin) + (1 if len(str(fin).strip()) == 10 else 0)
+    return borne_debut, borne_fin
+
+
+def calculer_station(compact: HistoriqueCompact, nb_codes: int, debut: Optional[int],
+                     fin: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Temps par état et transitions des ouvrages d'une station sur une fenêtre.
+
+    Args:
+        compact: Historique compact de la station
+        nb_codes: Nombre de codes d'état (code maximal + 1)
+        debut: Début de la fenêtre en secondes (première mise à jour si None)
+        fin: Fin (exclue) de la fenêtre en secondes
+
+    Returns:
+        (temps, transitions) : float64 (ouvrages × codes) en secondes et
+        int64 (ouvrages × codes × codes) indexé par [ouvrage, avant, après]
+    """
+    nb_ouvrages = compact.codes.shape[1]
+    temps = np.zeros((nb_ouvrages, nb_codes))
+    transitions = np.zeros((nb_ouvrages, nb_codes, nb_codes), dtype=np.int64)
+
+    ordre = np.argsort(compact.horodatages, kind='stable')
+    ordre = ordre[compact.horodatages[ordre] != HORODATAGE_INCONNU]
+    if not len(ordre) or not nb_ouvrages:
+        return temps, transitions
+    horodatages = compact.horodatages[ordre]
+    codes = compact.codes[ordre].astype(np.int64)
+    if debut is None:
+        debut = int(horodatages[0])
+    if fin <= debut:
+        return temps, transitions
+
+    # Chaque mise à jour vaut jusqu'à la suivante, la dernière jusqu'à la fin de la fenêtre
+    suivants = np.empty_like(horodatages)
+    suivants[:-1] = horodatages[1:]
+    suivants[-1] = fin
+    durees = (np.clip(suivants, debut, fin) - np.clip(horodatages, debut, fin)).astype(np.float64)
+
+    colonnes = np.arange(nb_ouvrages, dtype=np.int64)
+    indices = colonnes * nb_codes + codes
+    temps = np.bincount(indices.ravel(), weights=np.repeat(durees, nb_ouvrages),
+                        minlength=nb_ouvrages * nb_codes).reshape(nb_ouvrages, nb_codes)
+
+    if len(ordre) > 1:
+        avant, apres = codes[:-1], codes[1:]
+        dans_fenetre = (horodatages[1:] >= debut) & (horodatages[1:] < fin)
+        changements = ((avant != apres) & (avant != CODE_ABSENT) & (apres != CODE_ABSENT)
+                       & dans_fenetre[:, None])
+        lignes, cols = np.nonzero(changements)
+        indices = (cols * nb_codes + avant[lignes, cols]) * nb_codes + apres[lignes, cols]
+        transitions = np.bincount(indices, minlength=nb_ouvrages * nb_codes * nb_codes).reshape(
+            nb_ouvrages, nb_codes, nb_codes)
+    return temps, transitions
+
+
+class StatistiquesEtats:
+    """
+    Temps par état et transitions d'un ensemble d'ouvrages sur une fenêtre.
+
+    Attributes:
+        flotte: Historique compact d'origine (tables des ouvrages et des états)
+        colonnes: Vecteur des codes d'ouvrage (une ligne de `temps` par ouvrage)
+        temps: float64 (ouvrages × codes d'état), secondes passées dans chaque état
+        transitions: int64 (ouvrages × codes × codes), nombre de passages d'un état à un autre
+        nb_stations: Nombre de stations agrégées
+    """
+
+    def __init__(self, flotte: EtatsCompacts, colonnes: np.ndarray, temps: np.ndarray,
+                 transitions: np.ndarray, nb_stations: int = 1):
+        self.flotte = flotte
+        self.colonnes = colonnes
+        self.temps = temps
+        self.transitions = transitions
+        self.nb_stations = nb_stations
+
+    @classmethod
+    def fusionner(cls, flotte: EtatsCompacts, statistiques: List['StatistiquesEtats']) -> 'StatistiquesEtats':
+        """Agrège plusieurs statistiques en additionnant les ouvrages de même nom."""
+        nb_codes = len(flotte.etats) + flotte.etats.premier_code
+        if not statistiques:
+            return cls(flotte, np.zeros(0, dtype=np.int32), np.zeros((0, nb_codes)),
+                       np.zeros((0, nb_codes, nb_codes), dtype=np.int64), 0)
+        colonnes, inverse = np.unique(np.concatenate([s.colonnes for s in statistiques]), return_inverse=True)
+        temps = np.zeros((len(colonnes), nb_codes))
+        transitions = np.zeros((len(colonnes), nb_codes, nb_codes), dtype=np.int64)
+        np.add.at(temps, inverse, np.concatenate([s.temps for s in statistiques]))
+        np.add.at(transitions, inverse, np.concatenate([s.transitions for s in statistiques]))
+        return cls(flotte, colonnes, temps, transitions, sum(s.nb_stations for s in statistiques))
+
+    @property
+    def ouvrages(self) -> List[str]:
+        return [self.flotte.ouvrages.valeur(int(code)) for code in self.colonnes]
+
+    def _code_etat(self, etat: str) -> Optional[int]:
+        return self.flotte.etats.codes.get(etat)
+
+    def _temps_observe(self) -> np.ndarray:
+        """Temps observé de chaque ouvrage (hors absence et hors états ETATS_HORS_PARC)."""
+        exclus = [CODE_ABSENT] + [code for code in map(self._code_etat, ETATS_HORS_PARC) if code is not None]
+        return self.temps.sum(axis=1) - self.temps[:, exclus].sum(axis=1)
+
+    def disponibilite(self) -> Dict[str, Optional[float]]:
+        """Part du temps observé passée en service, par ouvrage (None sans temps observé)."""
+        code = self._code_etat(ETAT_DISPONIBLE)
+        observe = self._temps_observe()
+        en_service = self.temps[:, code] if code is not None else np.zeros(len(self.colonnes))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            parts = en_service / observe
+        return {ouvrage: (float(part) if total > 0 else None)
+                for ouvrage, part, total in zip(self.ouvrages, parts.tolist(), observe.tolist())}
+
+    def disponibilite_globale(self) -> Optional[float]:
+        """Part du temps observé passée en service, tous ouvrages confondus."""
+        code = self._code_etat(ETAT_DISPONIBLE)
+        observe = float(self._temps_observe().sum())
+        if observe <= 0 or code is None:
+            return None
+        return float(self.temps[:, code].sum()) / observe
+
+    def temps_par_etat(self) -> Dict[str, Dict[str, float]]:
+        """Secondes passées dans chaque état, par ouvrage (états jamais atteints omis)."""
+        etats = self.flotte.etats
+        resultat = {}
+        for ouvrage, ligne in zip(self.ouvrages, self.temps.tolist()):
+            resultat[ouvrage] = {etats.valeur(code): secondes
+                                 for code, secondes in enumerate(ligne)
+                                 if code != CODE_ABSENT and secondes > 0}
+        return resultat
+
+    def nb_transitions(self) -> Dict[str, int]:
+        """Nombre de changements d'état, par ouvrage."""
+        return dict(zip(self.ouvrages, self.transitions.sum(axis=(1, 2)).tolist()))
+
+    def matrice_transitions(self) -> Dict[Tuple[str, str], int]:
+        """Nombre de passages (état avant, état après), tous ouvrages confondus."""
+        totaux = self.transitions.sum(axis=0)
+        etats = self.flotte.etats
+        avants, apres = np.nonzero(totaux)
+        return {(etats.valeur(int(a)), etats.valeur(int(b))): int(totaux[a, b]) for a, b in zip(avants, apres)}
+
+    def vers_dict(self) -> Dict[str, Any]:
+        """Forme sérialisable en JSON."""
+        disponibilite = self.disponibilite()
+        temps = self.temps_par_etat()
+        transitions = self.nb_transitions()
+        return {
+            'stations': self.nb_stations,
+            'disponibilite': self.disponibilite_globale(),
+            'ouvrages': {
+                ouvrage: {
+                    'disponibilite': disponibilite[ouvrage],
+                    'temps_par_etat_s': temps[ouvrage],
+                    'transitions': transitions[ouvrage],
+                }
+                for ouvrage in self.ouvrages
+            },
+            'transitions': [{'avant': avant, 'apres': apres, 'nombre': nombre}
+                            for (avant, apres), nombre in self.matrice_transitions().items()],
+        }
+
+    def __repr__(self):
+        return f"StatistiquesEtats({len(self.colonnes)} ouvrages, {self.nb_stations} station(s))"
+
+
+def analyser_station(station_id: str, debut: Optional[str] = None, fin: Optional[str] = None,
+                     flotte: Optional[EtatsCompacts] = None) -> StatistiquesEtats:
+    """
+    Statistiques d'état des ouvrages d'une station.
+
+    Args:
+        station_id: ID de la station
+        debut: Début de la fenêtre (première mise à jour de la station par défaut)
+        fin: Fin de la fenêtre, incluse pour une date sans heure (maintenant par défaut)
+        flotte: Historique compact (celui du stockage courant par défaut)
+
+    Raises:
+        KeyError: Station sans historique
+        ValueError: Date invalide
+    """
+    flotte = flotte or get_etats_compacts()
+    compact = flotte.stations[str(station_id)]
+    borne_debut, borne_fin = bornes_fenetre(debut, fin)
+    temps, transitions = calculer_station(compact, len(flotte.etats) + flotte.etats.premier_code,
+                                          borne_debut, borne_fin)
+    return StatistiquesEtats(flotte, compact.colonnes, temps, transitions)
+
+
+def analyser_flotte(debut: Optional[str] = None, fin: Optional[str] = None,
+                    station_ids: Optional[Iterable[str]] = None, par: str = 'station',
+                    flotte: Optional[EtatsCompacts] = None) -> Dict[str, StatistiquesEtats]:
+    """
+    Statistiques d'état des ouvrages de la flotte, regroupées par station ou par type de procédé.
+
+    Args:
+        debut: Début de la fenêtre (première mise à jour de chaque station par défaut)
+        fin: Fin de la fenêtre, incluse pour une date sans heure (maintenant par défaut)
+        station_ids: Stations à analyser (toutes par défaut)
+        par: 'station' (clé : ID), 'type' (clé : type de procédé) ou 'flotte' (clé unique 'flotte')
+        flotte: Historique compact (celui du stockage courant par défaut)
+
+    Raises:
+        ValueError: Regroupement inconnu ou date invalide
+    """
+    if par not in REGROUPEMENTS:
+        raise ValueError(f"Regroupement inconnu: {par} (regroupements: {', '.join(REGROUPEMENTS)})")
+    flotte = flotte or get_etats_compacts()
+    borne_debut, borne_fin = bornes_fenetre(debut, fin)
+    nb_codes = len(flotte.etats) + flotte.etats.premier_code
+
+    station_ids = list(flotte.stations) if station_ids is None else [str(s) for s in station_ids]
+    types = {str(station.get('id')): station.get('type_procede') or 'inconnu' for station in get_stations_list()}
+
+    groupes: Dict[str, List[StatistiquesEtats]] = {}
+    for station_id in station_ids:
+        compact = flotte.stations.get(station_id)
+        if compact is None:
+            continue
+        temps, transitions = calculer_station(compact, nb_codes, borne_debut, borne_fin)
+        statistiques = StatistiquesEtats(flotte, compact.colonnes, temps, transitions)
+        cle = station_id if par == 'station' else types.get(station_id, 'inconnu') if par == 'type' else 'flotte'
+        groupes.setdefault(cle, []).append(statistiques)
+
+    if par == 'station':
+        return {cle: statistiques[0] for cle, statistiques in groupes.items()}
+    return {cle: StatistiquesEtats.fusionner(flotte, statistiques) for cle, statistiques in groupes.items()}
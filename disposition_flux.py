@@ -0,0 +1,905 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disposition des diagrammes de flux, sans dépendance à matplotlib.
+
+Contient la classification des ouvrages par filière, le calcul des positions,
+des flèches et des repères du diagramme, ainsi que les styles partagés par les
+moteurs de dessin (diagramme_flux pour matplotlib, svg_flux pour le SVG direct).
+"""
+
+import logging
+from datetime import datetime
+
+from catalogue import ARC_BOUES, ARC_EAU, ARC_INTER_SECTIONS, GrapheProcede, get_catalogue
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+# États affichés dans la légende, dans l'ordre, avec leur libellé
+ETATS_LEGENDE = (
+    ('en_service', 'En service'),
+    ('en_panne', 'En panne'),
+    ('en_dysfonctionnement', 'En dysfonctionnement'),
+    ('en_maintenance', 'En maintenance'),
+    ('hors_service', 'Hors service'),
+    ('inexistant', 'Inexistant'),
+    ('arret_volontaire', 'Arrêt volontaire'),
+    ('surcharge_sature', 'Surchargé / Saturé'),
+    ('nouvel_ouvrage', 'Nouvel ouvrage'),
+)
+
+# Styles des flèches du diagramme
+STYLE_FLECHE_EAU = {
+    'color': '#3498db',  # Bleu
+    'linestyle': '-',    # Trait continu
+    'linewidth': 1.5,
+    'alpha': 0.9,
+    'arrowstyle': '-|>',
+    'shrinkA': 0,  # Désactiver le retrait au point de départ
+    'shrinkB': 0,  # Désactiver le retrait au point d'arrivée
+    'connectionstyle': 'arc3,rad=0.0',  # Ligne droite sans courbure
+}
+
+# Flèches entre filières d'eau : légère courbure
+STYLE_FLECHE_INTER_FILIERES = {**STYLE_FLECHE_EAU, 'connectionstyle': 'arc3,rad=0.15'}
+
+STYLE_FLECHE_BOUES = {
+    'color': '#8B4513',  # Marron
+    'linestyle': '--',   # Trait pointillé
+    'linewidth': 1.5,
+    'alpha': 0.8,
+    'arrowstyle': '-|>',
+    'shrinkA': 5,
+    'shrinkB': 5,
+    'connectionstyle': 'arc3,rad=0.3',  # Courbure de la flèche
+}
+
+# Flèches internes à la filière boue : courbure réduite
+STYLE_FLECHE_FILIERE_BOUE = {
+    'arrowstyle': '->',
+    'color': '#8B4513',  # Marron
+    'linewidth': 1.5,
+    'alpha': 0.8,
+    'shrinkA': 0,
+    'shrinkB': 0,
+    'connectionstyle': 'arc3,rad=0.15'
+}
+
+# Styles des différentes destinations des eaux épurées
+STYLES_DESTINATION = {
+    'Autre': {'color': '#1f77b4', 'icon': '🌊', 'style': 'normal', 'icon_size': 24},  # Bleu avec icône vague
+    'Milieu naturel': {'color': '#1f77b4', 'icon': '🌳', 'style': 'normal', 'icon_color': '#2ca02c', 'icon_size': 28},  # Bleu avec icône arbre verte
+    'Réutilisation': {'color': '#2ca02c', 'icon': '♻️', 'style': 'italic', 'icon_size': 22},  # Vert avec icône recyclage
+    'Irrigation': {'color': '#8c564b', 'icon': '🌱', 'style': 'normal', 'icon_size': 22},  # Marron avec icône plante
+    'Irrigation agricole': {'color': '#8c564b', 'icon': '🚜', 'style': 'normal', 'icon_size': 24},  # Marron avec icône tracteur
+    'Irrigation des espaces verts': {'color': '#2e8b57', 'icon': '🌿', 'style': 'normal', 'icon_size': 26},  # Vert foncé avec icône feuille
+    'Industrie': {'color': '#ff7f0e', 'icon': '🏭', 'style': 'normal', 'icon_size': 24},  # Orange avec icône usine
+}
+
+class DispositionDiagramme:
+    """
+    Géométrie d'un diagramme, indépendante de l'état des ouvrages : positions des
+    blocs, titres des filières, flèches, étiquettes des boues, repères d'entrée et
+    de sortie et limites des axes.
+    
+    Elle est identique pour toutes les stations d'un même type de procédé : le
+    rendu n'a plus qu'à y appliquer les couleurs des états (voir
+    ModeleDiagramme.calculer_disposition).
+    """
+    
+    def __init__(self, diagramme: 'ModeleDiagramme', ouvrages_positionnes: list):
+        # Seule la géométrie est conservée, jamais l'état des ouvrages
+        self.ouvrages = tuple(
+            {cle: valeur for cle, valeur in ouvrage.items() if cle not in ('etat', 'etat_affiche')}
+            for ouvrage in ouvrages_positionnes
+        )
+        self.titres_filieres = diagramme.calculer_titres_filieres(self.ouvrages)
+        self.fleches, self.etiquettes_boues = diagramme.calculer_fleches(self.ouvrages)
+        reperes = diagramme.calculer_reperes(self.ouvrages)
+        self.limites = reperes['limites']
+        self.entree = reperes['entree']
+        self.sortie = reperes['sortie']
+    
+    def appliquer_etats(self, ouvrages: list) -> list:
+        """
+        Associe la géométrie aux ouvrages d'une station.
+        
+        Args:
+            ouvrages: Ouvrages analysés (parser_ouvrages), dans l'ordre utilisé
+                pour calculer la disposition
+            
+        Returns:
+            Liste des ouvrages positionnés, avec leur état
+        """
+        return [{**ouvrages[geometrie['indice']], **geometrie} for geometrie in self.ouvrages]
+
+class ModeleDiagramme:
+    """
+    Modèle d'un diagramme de flux, indépendant de tout moteur de dessin :
+    configuration du procédé, couleurs et dimensions, classification des
+    ouvrages, positions et flèches. DiagrammeFlux (matplotlib) et DiagrammeSVG
+    (SVG direct) en héritent.
+    """
+    
+    # Version du rendu : à incrémenter à chaque modification du dessin pour invalider le cache des diagrammes
+    VERSION_RENDU = 3
+    
+    # Dispositions déjà calculées, partagées par toutes les instances (voir calculer_disposition)
+    _DISPOSITIONS = {}
+    TAILLE_MAX_DISPOSITIONS = 256
+    
+    def __init__(self, type_station=None):
+        """Initialise le diagramme avec les paramètres par défaut."""
+        # Configuration des couleurs pour chaque état
+        self.couleurs_etats = {
+            'en_service': '#4CAF50',           # Vert
+            'en_panne': '#F44336',             # Rouge
+            'en_dysfonctionnement': '#FFC107',   # Ambre
+            'en_maintenance': '#FF9800',       # Orange
+            'hors_service': '#9E9E9E',         # Gris
+            'inexistant': '#FFFFFF',           # Blanc
+            'arret_volontaire': '#B22222',    # Rouge brique
+            'surcharge_sature': '#9C27B0',    # Violet
+            'nouvel_ouvrage': '#03A9F4'        # Bleu
+        }
+        
+        # Configuration de la station
+        self.type_station = type_station
+        self.filiere_eau = {}
+        self.filiere_boue = []  # Ajout de l'attribut
+        
+        # Charger la configuration des types si un type de station est fourni
+        if self.type_station:
+            self._charger_configuration_types()
+        
+        # Configuration des dimensions (augmentation de la taille des blocs)
+        self.largeur_bloc = 6.0  # Augmenté de 4.0 à 6.0
+        self.hauteur_bloc = 1.8  # Légèrement augmenté pour les textes sur plusieurs lignes
+        self.espacement = 2.0    
+        self.marge_gauche = 2.0  # Augmenté pour mieux centrer
+        self.marge_haut = 1.5    # Augmenté de 1.0 à 1.5
+        
+        # Configuration de la police
+        self.police_titre = {
+            'fontsize': 10,       # Augmenté de 9 à 10
+            'fontweight': 'bold',
+            'color': '#333333',
+            'ha': 'center',
+            'va': 'center',
+            'wrap': True
+        }
+        
+        self.police_etat = {
+            'fontsize': 9,        # Augmenté de 8 à 9
+            'color': '#555555',
+            'ha': 'center',
+            'va': 'center',
+            'style': 'italic'
+        }
+        
+    def empreinte_style(self) -> dict:
+        """Paramètres de style qui influent sur l'image produite (entrée de la clé du cache de rendu)."""
+        return {
+            'version': self.VERSION_RENDU,
+            'couleurs_etats': self.couleurs_etats,
+            'dimensions': [self.largeur_bloc, self.hauteur_bloc, self.espacement,
+                           self.marge_gauche, self.marge_haut],
+            'police_titre': self.police_titre,
+            'police_etat': self.police_etat,
+        }
+    
+    def _charger_configuration_types(self):
+        """Charge la configuration des types depuis le fichier types.json"""
+        try:
+            procede = get_catalogue().trouver(self.type_station)
+            if procede is not None:
+                config = procede.copie_config()
+                self.filiere_eau = config.get('filiere_eau', {})
+                self.filiere_boue = config.get('filiere_boue', [])
+        except Exception as e:
+            log.error(f"Erreur lors du chargement de la configuration des types : {e}")
+    
+    def parser_ouvrages(self, liste_ouvrages: list) -> list:
+        """
+        Parse la liste des ouvrages pour extraire le nom et l'état.
+        
+        Args:
+            liste_ouvrages: Liste des chaînes au format "Numéro. Nom de l'ouvrage - État"
+            ou des dictionnaires contenant déjà les informations structurées
+            
+        Returns:
+            Liste de dictionnaires avec 'id', 'nom' et 'etat' pour chaque ouvrage,
+            ainsi que tous les champs supplémentaires présents dans l'entrée
+        """
+        ouvrages = []
+        for i, item in enumerate(liste_ouvrages):
+            if isinstance(item, dict):
+                # Si l'item est déjà un dictionnaire, l'utiliser directement
+                # en s'assurant qu'il a les champs requis
+                ouvrage = item.copy()
+                if 'id' not in ouvrage:
+                    ouvrage['id'] = i + 1
+                if 'nom' not in ouvrage or 'etat' not in ouvrage:
+                    continue  # Ignorer les entrées invalides
+                ouvrages.append(ouvrage)
+            elif isinstance(item, str):
+                # Traitement du format de chaîne de caractères
+                if ' - ' in item:
+                    # Supprimer le numéro et l'espace du début si présent
+                    ligne = item
+                    if ligne[0].isdigit() and '. ' in ligne:
+                        ligne = ligne.split('. ', 1)[1]
+                    
+                    # Séparer le nom et l'état
+                    parties = ligne.split(' - ', 1)
+                    if len(parties) == 2:
+                        nom, etat = parties
+                        ouvrages.append({
+                            'id': i + 1,
+                            'nom': nom.strip(),
+                            'etat': etat.strip()
+                        })
+        return ouvrages
+    
+    def classer_par_filiere(self, ouvrages: list) -> dict:
+        """
+        Répartit les ouvrages dans les différentes filières (eau, boue, etc.).
+        
+        Args:
+            ouvrages: Liste des ouvrages à classer
+            
+        Returns:
+            Dictionnaire des ouvrages classés par filière
+        """
+        filieres = {
+            'pretraitement': [],
+            'traitement_primaire': [],
+            'traitement_secondaire': [],
+            'traitement_tertiaire': [],
+            'rejet': [],
+            'traitement_boues': [],
+            'stockage': [],
+            'valorisation': [],
+            'epandage': [],
+            'mise_en_decharge': [],
+            'incineration': [],
+            'autre': []
+        }
+        
+        # Dictionnaire de correspondance entre les noms d'ouvrages et leurs filières
+        correspondance_ouvrages = {
+            # Prétraitement
+            'Dégrillage': 'pretraitement',
+            'Dégrillage fin': 'pretraitement',
+            'Dégrillage grossier': 'pretraitement',
+            'Dessablage/Dégraissage': 'pretraitement',
+            
+            # Traitement primaire
+            'Décanteur primaire': 'traitement_primaire',
+            'Bassin de décantation primaire': 'traitement_primaire',
+            'Décantation primaire': 'traitement_primaire',
+            'Lagune anaérobie': 'traitement_primaire',
+            'Lagune facultative': 'traitement_primaire',
+            'Lagune de maturation': 'traitement_primaire',
+            
+            # Traitement secondaire
+            "Bassins d'aération": 'traitement_secondaire',
+            'Décanteur secondaire': 'traitement_secondaire',
+            'Décantation intégrée': 'traitement_secondaire',
+            'Réacteur biologique séquentiel (SBR)': 'traitement_secondaire',
+            'Bassin de biofiltration': 'traitement_secondaire',
+            'Bassin biologique à membranes': 'traitement_secondaire',
+            'Lit planté de roseaux à écoulement horizontal': 'traitement_secondaire',
+            'Lit planté de roseaux à écoulement vertical': 'traitement_secondaire',
+            'Réacteur biologique compact': 'traitement_secondaire',
+            
+            # Traitement tertiaire
+            'Filtration sur sable': 'traitement_tertiaire',
+            'Désinfection UV': 'traitement_tertiaire',
+            'Filtration membranaire': 'traitement_tertiaire',
+            'Microfiltration/Ultrafiltration': 'traitement_tertiaire',
+            
+            # Traitement des boues
+            'Épaississement des boues': 'traitement_boues',
+            'Déshydratation mécanique': 'traitement_boues',
+            'Lits de séchage': 'traitement_boues',
+            'Recirculation des boues': 'traitement_boues',
+            'Épaississement dynamique': 'traitement_boues',
+            'Minéralisation dans les lits plantés': 'traitement_boues',
+            'Curage périodique des boues minéralisées': 'traitement_boues',
+            'Évacuation des boues par curage périodique': 'traitement_boues',
+            'Séchage naturel sur lit de séchage': 'traitement_boues',
+            
+            # Autres
+            'Rejet': 'rejet'
+        }
+        
+        # Dictionnaire pour les types de boues
+        type_boues = {
+            'Décanteur primaire': 'boues_primaires',
+            'Décanteur secondaire': 'boues_secondaires'
+        }
+        
+        for ouvrage in ouvrages:
+            nom = ouvrage['nom']
+            
+            # Vérifier si l'ouvrage est dans la correspondance
+            if nom in correspondance_ouvrages:
+                filiere = correspondance_ouvrages[nom]
+                
+                # Ajouter le type de boues si nécessaire
+                if nom in type_boues:
+                    ouvrage['type'] = type_boues[nom]
+                
+                filieres[filiere].append(ouvrage)
+            else:
+                # Si l'ouvrage n'est pas reconnu, on le met dans une filière par défaut
+                filieres['autre'].append(ouvrage)
+        
+        return filieres
+    
+    def calculer_positions(self, filieres: dict) -> list:
+        """
+        Calcule les positions des blocs dans le diagramme.
+        
+        Args:
+            filieres: Dictionnaire des ouvrages classés par filière
+            
+        Returns:
+            Liste des ouvrages avec leurs positions mises à jour (les titres des
+            filières sont dessinés par dessiner_diagramme)
+        """
+        ouvrages_positionnes = []
+        
+        # Définir l'ordre des filières (de haut en bas)
+        ordre_filieres = [
+            'pretraitement',
+            'traitement_primaire',
+            'traitement_secondaire',
+            'traitement_tertiaire',
+            'rejet',
+            'traitement_boues',
+            'stockage',
+            'valorisation',
+            'epandage',
+            'mise_en_decharge',
+            'incineration',
+            'autre'
+        ]
+        
+        # Espacement entre les lignes de filières
+        espacement_lignes = 3.0
+        
+        # Position Y initiale (première ligne en haut)
+        y = 0
+        
+        # Pour chaque filière dans l'ordre défini
+        for filiere in ordre_filieres:
+            if filiere not in filieres or not filieres[filiere]:
+                continue
+                
+            # Trier les ouvrages de la filière de gauche à droite
+            ouvrages_filiere = filieres[filiere]
+            
+            # Position X initiale pour cette ligne (marge gauche)
+            x = self.marge_gauche
+            
+            # Pour chaque ouvrage de la filière
+            for ouvrage in ouvrages_filiere:
+                # Mettre à jour les coordonnées
+                ouvrage['x'] = x
+                ouvrage['y'] = y
+                ouvrage['largeur'] = self.largeur_bloc
+                ouvrage['hauteur'] = self.hauteur_bloc
+                ouvrage['filiere'] = filiere  # S'assurer que la filière est bien définie
+                
+                # Ajouter à la liste des ouvrages positionnés
+                ouvrages_positionnes.append(ouvrage)
+                
+                # Décaler vers la droite pour le prochain ouvrage
+                x += self.largeur_bloc + self.espacement
+            
+            # Passer à la ligne suivante (en descendant)
+            y -= (self.hauteur_bloc + espacement_lignes)
+        
+        return ouvrages_positionnes
+
+    def calculer_titres_filieres(self, ouvrages_positionnes: list) -> list:
+        """
+        Calcule la position du titre de chaque filière, à gauche de sa ligne.
+        
+        Returns:
+            Liste de tuples (x, y, libellé)
+        """
+        titres = []
+        filieres_vues = set()
+        for ouvrage in ouvrages_positionnes:
+            filiere = ouvrage.get('filiere', 'autre')
+            if filiere in filieres_vues:
+                continue
+            filieres_vues.add(filiere)
+            titres.append((
+                self.marge_gauche / 2,  # Position X (à gauche des ouvrages)
+                ouvrage['y'] + self.hauteur_bloc / 2,  # Centré verticalement sur la ligne
+                filiere.replace('_', ' ').title()
+            ))
+        return titres
+    
+    def calculer_reperes(self, ouvrages_positionnes: list) -> dict:
+        """
+        Calcule les limites des axes et les repères 'Eaux usées' / 'Eaux épurées'.
+        
+        Returns:
+            dict: {'limites': (x_min, x_max, y_min, y_max), 'entree': dict ou None, 'sortie': dict ou None}
+        """
+        # Déterminer les limites automatiquement
+        if ouvrages_positionnes:
+            x_vals = [o['x'] for o in ouvrages_positionnes]
+            y_vals = [o['y'] for o in ouvrages_positionnes]
+            
+            # Ajouter des marges
+            x_margin = 1.0
+            y_margin = 1.0
+            limites = (
+                min(x_vals) - x_margin,
+                max(x_vals) + self.largeur_bloc + x_margin,
+                min(y_vals) - y_margin,
+                max(y_vals) + self.hauteur_bloc + y_margin
+            )
+        else:
+            limites = (0, 16, -16, 2)  # Ajusté pour correspondre à la nouvelle taille des blocs
+        
+        reperes = {'limites': limites, 'entree': None, 'sortie': None}
+        
+        # Trier les ouvrages par position x pour déterminer le premier et le dernier
+        ouvrages_tries = sorted(ouvrages_positionnes, key=lambda o: o['x'])
+        if not ouvrages_tries:
+            return reperes
+        
+        # 'Eaux usées' au-dessus du premier ouvrage, avec une flèche verticale vers le bas
+        premier_ouvrage = ouvrages_tries[0]
+        x_label = premier_ouvrage['x'] + premier_ouvrage['largeur']/2
+        y_label = premier_ouvrage['y'] + premier_ouvrage['hauteur'] + 2.0
+        reperes['entree'] = {
+            'x': x_label,
+            'y': y_label,
+            'fleche_xy': (x_label, premier_ouvrage['y'] + premier_ouvrage['hauteur'] + 0.1),
+            'fleche_xytext': (x_label, y_label - 0.5),
+        }
+        
+        # Trouver le dernier ouvrage du traitement secondaire
+        dernier_ouvrage_secondaire = None
+        for ouvrage in reversed(ouvrages_tries):
+            if any(nom in ouvrage['nom'] for nom in ['Décanteur secondaire', 'Clarificateur', 'Bassin aération', 'Décantation intégrée', 'Bassin biologique à membranes']):
+                dernier_ouvrage_secondaire = ouvrage
+                break
+        
+        # Si on a trouvé un ouvrage du traitement secondaire, on l'utilise
+        # Sinon, on prend le dernier ouvrage
+        dernier_ouvrage = dernier_ouvrage_secondaire if dernier_ouvrage_secondaire else ouvrages_tries[-1]
+        
+        # 'Eaux épurées' après le dernier ouvrage, avec une flèche horizontale vers la droite
+        x_label = dernier_ouvrage['x'] + dernier_ouvrage['largeur'] + 3.0
+        y_label = dernier_ouvrage['y'] + dernier_ouvrage['hauteur']/2
+        reperes['sortie'] = {
+            'x': x_label,
+            'y': y_label,
+            'fleche_xy': (x_label - 1.5, y_label),
+            'fleche_xytext': (dernier_ouvrage['x'] + dernier_ouvrage['largeur'] + 0.1, y_label),
+        }
+        return reperes
+    
+    def calculer_disposition(self, liste_ouvrages: list) -> tuple:
+        """
+        Analyse les ouvrages et retourne leur disposition, mise en cache par
+        type de procédé et jeu d'ouvrages.
+        
+        Deux stations du même type (ou deux dates d'une même station) ne
+        diffèrent que par les états : la classification, le positionnement et
+        le calcul des flèches ne sont faits qu'une fois.
+        
+        Args:
+            liste_ouvrages: Liste des ouvrages à afficher (voir parser_ouvrages)
+            
+        Returns:
+            tuple: (ouvrages positionnés avec leur état, DispositionDiagramme)
+        """
+        ouvrages = self.parser_ouvrages(liste_ouvrages)
+        cle = (
+            self.type_station,
+            get_catalogue().signature,
+            tuple(ouvrage['nom'] for ouvrage in ouvrages),
+            (self.largeur_bloc, self.hauteur_bloc, self.espacement, self.marge_gauche, self.marge_haut),
+        )
+        
+        disposition = ModeleDiagramme._DISPOSITIONS.get(cle)
+        if disposition is None:
+            geometries = [
+                {'indice': i, 'id': ouvrage['id'], 'nom': ouvrage['nom']}
+                for i, ouvrage in enumerate(ouvrages)
+            ]
+            disposition = DispositionDiagramme(self, self.calculer_positions(self.classer_par_filiere(geometries)))
+            if len(ModeleDiagramme._DISPOSITIONS) >= self.TAILLE_MAX_DISPOSITIONS:
+                # Retirer la disposition la plus ancienne
+                ModeleDiagramme._DISPOSITIONS.pop(next(iter(ModeleDiagramme._DISPOSITIONS)))
+            ModeleDiagramme._DISPOSITIONS[cle] = disposition
+        
+        return disposition.appliquer_etats(ouvrages), disposition
+    
+    def get_boues_info(self, ouvrages_positionnes):
+        """
+        Récupère les informations sur les boues à partir des ouvrages positionnés.
+        
+        Args:
+            ouvrages_positionnes: Liste des ouvrages avec leurs positions
+            
+        Returns:
+            dict: Dictionnaire contenant les informations sur les boues
+        """
+        boues_info = {
+            'boues_primaires': None,
+            'boues_secondaires': None
+        }
+        
+        for ouvrage in ouvrages_positionnes:
+            if 'boues_primaires' in ouvrage.get('type', ''):
+                boues_info['boues_primaires'] = {
+                    'x': ouvrage['x'],
+                    'y': ouvrage['y'] - 0.5,
+                    'label': 'Boues primaires',
+                    'color': '#8B4513'  # Marron
+                }
+            elif 'boues_secondaires' in ouvrage.get('type', ''):
+                boues_info['boues_secondaires'] = {
+                    'x': ouvrage['x'],
+                    'y': ouvrage['y'] - 0.5,
+                    'label': 'Boues secondaires',
+                    'color': '#8B4513'  # Marron
+                }
+                
+        return boues_info
+
+    def calculer_fleches(self, ouvrages_positionnes: list) -> tuple:
+        """
+        Calcule les flèches entre les ouvrages selon un flux logique, sans rien dessiner.
+        
+        Les flèches suivent les arcs du graphe du procédé (catalogue) quand tous
+        les ouvrages du diagramme en font partie ; sinon elles sont déduites de
+        la position des blocs.
+        
+        Args:
+            ouvrages_positionnes: Liste des ouvrages avec leurs positions
+            
+        Returns:
+            tuple: (fleches, etiquettes) où chaque flèche est un dictionnaire
+            {'xy', 'xytext', 'arrowprops'} prêt pour ax.annotate et chaque
+            étiquette de boues un dictionnaire {'x', 'y', 'texte'}
+        """
+        fleches = []
+        etiquettes = []
+        if not ouvrages_positionnes:
+            return fleches, etiquettes
+        
+        # Dictionnaire pour stocker les positions des ouvrages par nom
+        ouvrages_par_nom = {}
+        for ouvrage in ouvrages_positionnes:
+            if 'nom' in ouvrage:
+                ouvrages_par_nom[ouvrage['nom']] = {
+                    'x': ouvrage['x'] + ouvrage['largeur'] / 2,
+                    'y': ouvrage['y'] + ouvrage['hauteur'] / 2,
+                    'largeur': ouvrage['largeur'],
+                    'hauteur': ouvrage['hauteur'],
+                    'filiere': ouvrage.get('filiere', 'autre')
+                }
+        
+        procede = get_catalogue().trouver(self.type_station) if self.type_station else None
+        if procede is not None and all(nom in procede.graphe.indices for nom in ouvrages_par_nom):
+            return self._fleches_graphe(procede.graphe, ouvrages_positionnes, ouvrages_par_nom)
+        
+        # Trier les ouvrages par filière
+        ouvrages_par_filiere = {}
+        for ouvrage in ouvrages_positionnes:
+            filiere = ouvrage.get('filiere', 'autre')
+            if filiere not in ouvrages_par_filiere:
+                ouvrages_par_filiere[filiere] = []
+            ouvrages_par_filiere[filiere].append(ouvrage)
+        
+        # Définir les filières d'eau (trait continu bleu) dans l'ordre du flux
+        filieres_eau_ordre = [
+            'pretraitement',
+            'traitement_primaire',
+            'traitement_secondaire', 
+            'traitement_tertiaire',
+            'rejet'
+        ]
+        
+        # 1. Flèches entre les ouvrages d'une même filière
+        for filiere, ouvrages in ouvrages_par_filiere.items():
+            if len(ouvrages) < 2:
+                continue
+                
+            # Ne pas dessiner de flèches pour la filière boue
+            if 'boue' in filiere.lower():
+                continue
+                
+            # Trier les ouvrages de gauche à droite
+            ouvrages_tries = sorted(ouvrages, key=lambda x: x['x'])
+            
+            # Pour les ouvrages sur la même ligne, flèche horizontale
+            for i in range(len(ouvrages_tries) - 1):
+                source = ouvrages_tries[i]
+                cible = ouvrages_tries[i + 1]
+                
+                fleches.append({
+                    # Point d'arrivée (bord gauche du bloc cible)
+                    'xy': (cible['x'], cible['y'] + cible['hauteur'] / 2),
+                    # Point de départ (bord droit du bloc source)
+                    'xytext': (source['x'] + source['largeur'], source['y'] + source['hauteur'] / 2),
+                    'arrowprops': STYLE_FLECHE_EAU,
+                })
+        
+        # 2. Flèches entre les différentes filières d'eau
+        for i in range(len(filieres_eau_ordre) - 1):
+            filiere_courante = filieres_eau_ordre[i]
+            filiere_suivante = filieres_eau_ordre[i + 1]
+            
+            # Vérifier que les deux filières existent
+            if filiere_courante not in ouvrages_par_filiere or filiere_suivante not in ouvrages_par_filiere:
+                continue
+                
+            # Dernier ouvrage de la filière courante (le plus à droite)
+            source = max(ouvrages_par_filiere[filiere_courante], key=lambda x: x['x'])
+            # Premier ouvrage de la filière suivante (le plus à gauche)
+            cible = min(ouvrages_par_filiere[filiere_suivante], key=lambda x: x['x'])
+            
+            fleches.append({
+                'xy': (cible['x'], cible['y'] + cible['hauteur'] / 2),
+                'xytext': (source['x'] + source['largeur'], source['y'] + source['hauteur'] / 2),
+                'arrowprops': STYLE_FLECHE_INTER_FILIERES,
+            })
+        
+        # 3. Flèches pour les boues
+        if hasattr(self, 'type_station') and hasattr(self, 'filiere_eau') and isinstance(self.filiere_eau, dict):
+            # Dictionnaire pour stocker les configurations de boues
+            boues_config = {}
+            
+            # Vérifier d'abord les boues_secondaires
+            if 'boues_secondaires' in self.filiere_eau and isinstance(self.filiere_eau['boues_secondaires'], dict):
+                boues_config['boues_secondaires'] = self.filiere_eau['boues_secondaires'].copy()
+                if 'etiquette' not in boues_config['boues_secondaires']:
+                    boues_config['boues_secondaires']['etiquette'] = 'Boues biologiques'
+            
+            # Ensuite, vérifier les boues_primaires
+            if 'boues_primaires' in self.filiere_eau and isinstance(self.filiere_eau['boues_primaires'], dict):
+                boues_config['boues_primaires'] = self.filiere_eau['boues_primaires'].copy()
+                if 'etiquette' not in boues_config['boues_primaires']:
+                    boues_config['boues_primaires']['etiquette'] = 'Boues primaires'
+        
+            # Pour chaque configuration de boue trouvée
+            for boue_type, config in boues_config.items():
+                if not isinstance(config, dict):
+                    continue
+                    
+                source_nom = config.get('source')
+                destination_nom = config.get('destination')
+                etiquette = config.get('etiquette')
+                
+                # Si pas de destination, utiliser le premier ouvrage de la filière boue
+                if not destination_nom and hasattr(self, 'filiere_boue') and isinstance(self.filiere_boue, (list, dict)) and len(self.filiere_boue) > 0:
+                    destination_nom = self.filiere_boue[0] if isinstance(self.filiere_boue, list) else list(self.filiere_boue.keys())[0]
+                
+                if not source_nom or not destination_nom:
+                    log.warning(f"Configuration incomplète pour {boue_type}: source={source_nom}, destination={destination_nom}")
+                    continue
+                    
+                if source_nom in ouvrages_par_nom and destination_nom in ouvrages_par_nom:
+                    source = ouvrages_par_nom[source_nom]
+                    destination = ouvrages_par_nom[destination_nom]
+                    
+                    fleches.append({
+                        # Arrivée : haut du bloc destination
+                        'xy': (destination['x'] + destination['largeur'] / 2, destination['y'] + destination['hauteur']),
+                        # Départ : centre du bord inférieur du bloc source
+                        'xytext': (source['x'] + source['largeur'] / 2, source['y']),
+                        'arrowprops': STYLE_FLECHE_BOUES,
+                    })
+                    
+                    # Étiquette sous le bloc source
+                    etiquettes.append({
+                        'x': source['x'] + source['largeur'] / 2,
+                        'y': source['y'] - 0.8,
+                        'texte': etiquette,
+                    })
+                else:
+                    log.warning(f"Source ou destination non trouvée pour {boue_type}: source={source_nom}, destination={destination_nom}")
+                    
+            # 3.2 Flèches pour la filière boue
+            if hasattr(self, 'filiere_boue') and len(self.filiere_boue) > 1:
+                
+                # Le premier élément est la source (épaississement)
+                source_nom = self.filiere_boue[0]
+                
+                if source_nom in ouvrages_par_nom:
+                    source = ouvrages_par_nom[source_nom]
+                    
+                    # Pour chaque destination (sauf la source)
+                    for dest_nom in self.filiere_boue[1:]:
+                        if dest_nom in ouvrages_par_nom:
+                            dest = ouvrages_par_nom[dest_nom]
+                            fleches.append({
+                                # Arrivée exacte sur le bord inférieur du bloc de destination
+                                'xy': (dest['x'] + dest['largeur'] / 2, dest['y']),
+                                'xytext': (source['x'] + source['largeur'] / 2, source['y']),
+                                'arrowprops': STYLE_FLECHE_FILIERE_BOUE,
+                            })
+                else:
+                    log.debug(f"Tête de la filière boue {source_nom} absente des ouvrages positionnés")
+            else:
+                log.debug("Moins de 2 ouvrages dans la filière boue")
+        
+        return fleches, etiquettes
+    
+    def _fleches_graphe(self, graphe: GrapheProcede, ouvrages_positionnes: list, ouvrages_par_nom: dict) -> tuple:
+        """
+        Flèches et étiquettes des boues correspondant aux arcs du graphe du procédé.
+        
+        Les points d'accroche sont ceux des flèches déduites de la géométrie
+        (voir calculer_fleches).
+        """
+        fleches = []
+        etiquettes = []
+        blocs = {ouvrage['nom']: ouvrage for ouvrage in ouvrages_positionnes if 'nom' in ouvrage}
+        
+        for source_nom, destination_nom, nature, etiquette in graphe.arcs_nommes():
+            if source_nom not in blocs or destination_nom not in blocs:
+                continue
+            
+            if nature in (ARC_EAU, ARC_INTER_SECTIONS):
+                source = blocs[source_nom]
+                cible = blocs[destination_nom]
+                # Trait droit sur une même ligne, courbé d'une ligne à l'autre
+                style = STYLE_FLECHE_EAU if source.get('filiere') == cible.get('filiere') else STYLE_FLECHE_INTER_FILIERES
+                fleches.append({
+                    'xy': (cible['x'], cible['y'] + cible['hauteur'] / 2),
+                    'xytext': (source['x'] + source['largeur'], source['y'] + source['hauteur'] / 2),
+                    'arrowprops': style,
+                })
+            elif nature == ARC_BOUES:
+                source = ouvrages_par_nom[source_nom]
+                destination = ouvrages_par_nom[destination_nom]
+                fleches.append({
+                    'xy': (destination['x'] + destination['largeur'] / 2, destination['y'] + destination['hauteur']),
+                    'xytext': (source['x'] + source['largeur'] / 2, source['y']),
+                    'arrowprops': STYLE_FLECHE_BOUES,
+                })
+                etiquettes.append({
+                    'x': source['x'] + source['largeur'] / 2,
+                    'y': source['y'] - 0.8,
+                    'texte': etiquette,
+                })
+            else:
+                source = ouvrages_par_nom[source_nom]
+                dest = ouvrages_par_nom[destination_nom]
+                fleches.append({
+                    'xy': (dest['x'] + dest['largeur'] / 2, dest['y']),
+                    'xytext': (source['x'] + source['largeur'] / 2, source['y']),
+                    'arrowprops': STYLE_FLECHE_FILIERE_BOUE,
+                })
+        
+        return fleches, etiquettes
+    
+    def _formater_nom_ouvrage(self, nom: str) -> str:
+        """
+        Formate le nom d'un ouvrage pour un affichage sur une seule ligne.
+        
+        Args:
+            nom: Le nom de l'ouvrage à formater
+            
+        Returns:
+            Le nom formaté sur une seule ligne
+        """
+        # Remplacer les séparateurs par des espaces simples
+        separators = [' - ', ' / ', ' /', '/ ', ' -', '- ']
+        for sep in separators:
+            nom = nom.replace(sep, ' ')
+        
+        # Supprimer les espaces multiples
+        return ' '.join(nom.split())
+
+def preparer_ouvrages_station(type_procede, etat_ouvrages):
+    """
+    Construit la liste des ouvrages à dessiner pour un type de procédé.
+    
+    Les ouvrages suivent l'ordre du catalogue des procédés ; leur état est pris
+    dans etat_ouvrages lorsqu'il y est renseigné.
+    
+    Args:
+        type_procede (str): Type de procédé de la station
+        etat_ouvrages (dict): États des ouvrages {nom: etat}
+        
+    Returns:
+        list: Ouvrages au format attendu par DiagrammeFlux.parser_ouvrages
+        
+    Raises:
+        ValueError: Si le type de procédé ne définit aucun ouvrage
+    """
+    etats_ouvrages = get_catalogue().etats_initiaux(type_procede)
+    if not etats_ouvrages:
+        raise ValueError(f"Aucun ouvrage trouvé pour le type de procédé: {type_procede}")
+    
+    # Mettre à jour les états avec les valeurs actuelles
+    for nom_ouvrage, etat in (etat_ouvrages or {}).items():
+        if nom_ouvrage in etats_ouvrages:
+            etats_ouvrages[nom_ouvrage] = etat
+    
+    # Convertir le dictionnaire d'états en liste d'ouvrages formatée
+    return [{
+        'id': i + 1,
+        'nom': nom,
+        'etat': etat,
+        'etat_affiche': etat.replace('_', ' ').capitalize() if etat in ['en_service', 'en_panne', 'en_maintenance', 'hors_service', 'inexistant'] else etat
+    } for i, (nom, etat) in enumerate(etats_ouvrages.items())]
+
+def formater_titre_diagramme(nom_station, type_procede, date_maj=None):
+    """
+    Construit le titre du diagramme avec la date de mise à jour.
+    
+    Args:
+        nom_station (str): Nom de la station
+        type_procede (str): Type de procédé
+        date_maj (str|datetime, optional): Date de la mise à jour affichée
+        
+    Returns:
+        str: Titre sur une ou deux lignes
+    """
+    type_procede_formate = type_procede.replace('_', ' ').upper()
+    titre = f"STEP {nom_station} | Type de procédé : {type_procede_formate}"
+    
+    if not date_maj or date_maj == "Date inconnue":
+        return titre
+    
+    try:
+        # Essayer différents formats de date
+        if isinstance(date_maj, str):
+            if 'T' in date_maj:  # Format ISO avec 'T'
+                date_obj = datetime.fromisoformat(date_maj.replace('Z', '+00:00'))
+            else:
+                # Essayer le format 'YYYY-MM-DD HH:MM:SS'
+                try:
+                    date_obj = datetime.strptime(date_maj, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    # Essayer le format 'YYYY-MM-DD'
+                    date_obj = datetime.strptime(date_maj, '%Y-%m-%d')
+            date_formatee = date_obj.strftime('%d/%m/%Y')
+        else:
+            # Si date_maj est déjà un objet datetime
+            date_formatee = date_maj.strftime('%d/%m/%Y')
+    except Exception as e:
+        log.warning(f"Erreur de format de date: {e}. Utilisation de la date brute: {date_maj}")
+        date_formatee = date_maj
+    
+    return f"{titre}\nMise à jour du {date_formatee}"
+
+def comparer_etats(etat_avant, etat_apres):
+    """
+    Liste les ouvrages dont l'état diffère entre deux instantanés etat_ouvrages.
+    
+    Args:
+        etat_avant (dict): États de référence {nom: etat}
+        etat_apres (dict): États à comparer {nom: etat}
+        
+    Returns:
+        dict: {nom: (etat_avant, etat_apres)} pour les seuls ouvrages modifiés ;
+            un ouvrage absent d'un instantané y a l'état None
+    """
+    etat_avant = etat_avant or {}
+    etat_apres = etat_apres or {}
+    if etat_avant == etat_apres:
+        return {}
+    changements = {nom: (etat_avant.get(nom), etat) for nom, etat in etat_apres.items()
+                   if etat_avant.get(nom) != etat}
+    for nom, etat in etat_avant.items():
+        if nom not in etat_apres:
+            changements[nom] = (etat, None)
+    return changements
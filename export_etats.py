@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export en flux de l'historique des états des ouvrages, pour un entrepôt de données.
+
+L'historique est aplati en lignes (station_id, date_maj, ouvrage, etat) et
+produit par un générateur : seules les lignes en cours d'écriture (ou un bloc
+de colonnes) sont en mémoire. Les filtres sur les stations et les dates sont
+transmis au moteur de stockage (requête SQL avec SQLite, lecture d'un seul
+fichier par station avec le moteur fragmenté, historique décodé station par
+station avec les moteurs JSON).
+
+Formats :
+- csv : une ligne par état d'ouvrage, avec en-tête
+- jsonl : un objet JSON par état d'ouvrage
+- colonnes : un objet JSON par bloc de lignes, une liste par colonne
+  ({"station_id": [...], "date_maj": [...], "ouvrage": [...], "etat": [...]})
+
+Exemple :
+    python main.py export --format csv --sortie etats.csv
+    python main.py export --format colonnes --station Chlef --debut 2024-01-01 --fin 2024-06-30 --sortie -
+"""
+
+import os
+import csv
+import sys
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from utils import get_station_by_id, get_station_by_nom
+from stockage import get_stockage
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+COLONNES = ('station_id', 'date_maj', 'ouvrage', 'etat')
+FORMATS_EXPORT = ('csv', 'jsonl', 'colonnes')
+TAILLE_BLOC = 65536
+
+
+def iterer_lignes(stations: Optional[Iterable[str]] = None, debut: Optional[str] = None,
+                  fin: Optional[str] = None) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Itère sur l'historique aplati (station_id, date_maj, ouvrage, etat).
+
+    Args:
+        stations: IDs ou noms des stations (toutes si None)
+        debut: Date de début incluse ('YYYY-MM-DD[ HH:MM:SS]')
+        fin: Date de fin incluse ('YYYY-MM-DD[ HH:MM:SS]')
+
+    Raises:
+        ValueError: Station introuvable
+    """
+    station_ids = None
+    if stations:
+        station_ids = []
+        for reference in stations:
+            station = get_station_by_id(reference) or get_station_by_nom(reference)
+            if station is None:
+                raise ValueError(f"Station '{reference}' introuvable")
+            station_ids.append(str(station['id']))
+    return get_stockage().iterer_lignes_etats(station_ids, debut, fin)
+
+
+def iterer_blocs(lignes: Iterable[Tuple[str, str, str, str]],
+                 taille: int = TAILLE_BLOC) -> Iterator[Dict[str, List[str]]]:
+    """
+    Regroupe des lignes en blocs de colonnes d'au plus `taille` lignes.
+
+    Yields:
+        {colonne: [valeurs]} pour chaque colonne de COLONNES
+    """
+    bloc = tuple([] for _ in COLONNES)
+    for ligne in lignes:
+        for colonne, valeur in zip(bloc, ligne):
+            colonne.append(valeur)
+        if len(bloc[0]) >= taille:
+            yield dict(zip(COLONNES, bloc))
+            bloc = tuple([] for _ in COLONNES)
+    if bloc[0]:
+        yield dict(zip(COLONNES, bloc))
+
+
+def ecrire_csv(lignes: Iterable[Tuple[str, str, str, str]], flux: TextIO) -> int:
+    """Écrit les lignes au format CSV (avec en-tête) et retourne leur nombre."""
+    ecrivain = csv.writer(flux, lineterminator='\n')
+    ecrivain.writerow(COLONNES)
+    nombre = 0
+    for ligne in lignes:
+        ecrivain.writerow(ligne)
+        nombre += 1
+    return nombre
+
+
+def ecrire_jsonl(lignes: Iterable[Tuple[str, str, str, str]], flux: TextIO) -> int:
+    """Écrit un objet JSON par ligne et retourne le nombre de lignes."""
+    nombre = 0
+    for ligne in lignes:
+        flux.write(json.dumps(dict(zip(COLONNES, ligne)), ensure_ascii=False) + '\n')
+        nombre += 1
+    return nombre
+
+
+def ecrire_colonnes(lignes: Iterable[Tuple[str, str, str, str]], flux: TextIO,
+                    taille: int = TAILLE_BLOC) -> int:
+    """Écrit un bloc de colonnes JSON par ligne de texte et retourne le nombre de lignes exportées."""
+    nombre = 0
+    for bloc in iterer_blocs(lignes, taille):
+        flux.write(json.dumps(bloc, ensure_ascii=False) + '\n')
+        nombre += len(bloc['station_id'])
+    return nombre
+
+
+def exporter_etats(chemin: str, format_export: str = 'csv', stations: Optional[Iterable[str]] = None,
+                   debut: Optional[str] = None, fin: Optional[str] = None,
+                   taille_bloc: int = TAILLE_BLOC) -> Dict[str, Any]:
+    """
+    Exporte l'historique des états dans un fichier (ou sur la sortie standard si chemin vaut '-').
+
+    Le fichier est écrit sous un nom temporaire puis renommé : un export
+    interrompu ne laisse pas de fichier partiel.
+
+    Returns:
+        Résumé : fichier, format, nombre de lignes et durée
+
+    Raises:
+        ValueError: Format non supporté ou station introuvable
+    """
+    if format_export not in FORMATS_EXPORT:
+        raise ValueError(f"Format non supporté: {format_export} (formats: {', '.join(FORMATS_EXPORT)})")
+
+    debut_export = datetime.now()
+    lignes = iterer_lignes(stations, debut, fin)
+
+    def _ecrire(flux):
+        if format_export == 'csv':
+            return ecrire_csv(lignes, flux)
+        if format_export == 'jsonl':
+            return ecrire_jsonl(lignes, flux)
+        return ecrire_colonnes(lignes, flux, taille_bloc)
+
+    if chemin == '-':
+        nombre = _ecrire(sys.stdout)
+        sys.stdout.flush()
+    else:
+        if os.path.dirname(chemin):
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        try:
+            with open(temporaire, 'w', encoding='utf-8', newline='') as f:
+                nombre = _ecrire(f)
+            os.replace(temporaire, chemin)
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+
+    resume = {
+        'fichier': chemin,
+        'format': format_export,
+        'lignes': nombre,
+        'duree_s': round((datetime.now() - debut_export).total_seconds(), 3),
+    }
+    log.info(f"Export de {nombre} ligne(s) d'état vers {chemin} ({resume['duree_s']} s)")
+    return resume
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fiabilité des ouvrages : MTBF et MTTR par type d'ouvrage sur toute la flotte.
+
+Définitions (historique trié par date_maj, observé jusqu'à la dernière mise à
+jour de la flotte) :
+- une panne est une entrée en `en_panne` depuis un état hors ETATS_ARRET ;
+  un historique qui commence en panne ne compte pas (début inconnu) ;
+- l'arrêt qui suit dure tant que l'ouvrage reste en `en_panne` ou
+  `en_maintenance` ; il compte comme réparation s'il se termine par un état
+  de fonctionnement (ETATS_FONCTIONNEMENT) ;
+- MTBF = temps passé en fonctionnement / nombre de pannes ;
+- MTTR = durée totale des arrêts réparés / nombre de réparations.
+
+Le calcul est vectorisé : chaque station est réduite (NumPy) à ses séquences
+d'états (un changement d'état par ouvrage), puis toutes les séquences de la
+flotte sont traitées en une seule passe sur des tableaux concaténés. La table
+est mise en cache pour la version courante de l'historique compact.
+
+Exemple :
+    from fiabilite import get_table_fiabilite
+
+    table = get_table_fiabilite()
+    table.lignes()   # [{'ouvrage': 'Dégrillage', 'mtbf_h': ..., 'mttr_h': ..., ...}, ...]
+
+    python main.py stats reliability --format csv --sortie fiabilite.csv
+"""
+
+import os
+import csv
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, TextIO
+
+import numpy as np
+
+from historique_compact import CODE_ABSENT, HORODATAGE_INCONNU, EtatsCompacts, get_etats_compacts
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+ETAT_PANNE = 'en_panne'
+ETATS_ARRET = ('en_panne', 'en_maintenance')
+ETATS_FONCTIONNEMENT = ('en_service', 'en_dysfonctionnement', 'surcharge_sature')
+FORMATS_FIABILITE = ('table', 'csv', 'json')
+COLONNES_FIABILITE = ('ouvrage', 'ouvrages', 'pannes', 'reparations',
+                      'fonctionnement_h', 'mtbf_h', 'mttr_h')
+
+
+def _table_etats(flotte: EtatsCompacts, etats) -> np.ndarray:
+    """Table de correspondance code d'état -> appartenance à `etats` (indexée par un code uint8)."""
+    table = np.zeros(256, dtype=bool)
+    for etat in etats:
+        if etat in flotte.etats.codes:
+            table[flotte.etats.codes[etat]] = True
+    return table
+
+
+class TableFiabilite:
+    """
+    MTBF / MTTR par type d'ouvrage (nom de l'ouvrage).
+
+    Attributes:
+        flotte: Historique compact dont la table est issue
+        ouvrages: Noms des ouvrages (une entrée par code d'ouvrage de la flotte)
+        nb_ouvrages: Nombre d'ouvrages de ce type dans la flotte
+        pannes: Nombre de pannes
+        reparations: Nombre d'arrêts réparés
+        fonctionnement_s: Temps passé en fonctionnement (secondes)
+        arret_repare_s: Durée cumulée des arrêts réparés (secondes)
+    """
+
+    def __init__(self, flotte: EtatsCompacts):
+        self.flotte = flotte
+        self.ouvrages = list(flotte.ouvrages.valeurs)
+        nb = len(self.ouvrages)
+        self.nb_ouvrages = np.zeros(nb, dtype=np.int64)
+        self.pannes = np.zeros(nb, dtype=np.int64)
+        self.reparations = np.zeros(nb, dtype=np.int64)
+        self.fonctionnement_s = np.zeros(nb)
+        self.arret_repare_s = np.zeros(nb)
+        self._calculer()
+
+    def _sequences(self):
+        """
+        Réduit chaque station à ses séquences d'états.
+
+        Returns:
+            (sequence, code, debut, ouvrage_sequence, horizon) : pour chaque
+            séquence (un état tenu par un ouvrage entre deux changements), son
+            numéro d'ouvrage-station, son code d'état et sa date de début ; le
+            code d'ouvrage de chaque ouvrage-station ; la dernière date connue
+        """
+        sequences, codes, debuts, colonnes = [], [], [], []
+        nb_series = 0
+        horizon = None
+        for compact in self.flotte.stations.values():
+            ordre = np.argsort(compact.horodatages, kind='stable')
+            ordre = ordre[compact.horodatages[ordre] != HORODATAGE_INCONNU]
+            nb_ouvrages = compact.codes.shape[1]
+            if not len(ordre) or not nb_ouvrages:
+                continue
+            horodatages = compact.horodatages[ordre]
+            horizon = int(horodatages[-1]) if horizon is None else max(horizon, int(horodatages[-1]))
+            etats = compact.codes[ordre]
+
+            # Une séquence commence à la première mise à jour et à chaque changement d'état
+            debut_sequence = np.ones(etats.shape, dtype=bool)
+            debut_sequence[1:] = etats[1:] != etats[:-1]
+            cols, lignes = np.nonzero(debut_sequence.T)
+            sequences.append((cols + nb_series).astype(np.int32))
+            codes.append(etats[lignes, cols])
+            debuts.append(horodatages[lignes])
+            colonnes.append(compact.colonnes)
+            nb_series += nb_ouvrages
+
+        if not sequences:
+            vide = np.zeros(0, dtype=np.int64)
+            return vide, vide, vide, vide, 0
+        return (np.concatenate(sequences), np.concatenate(codes), np.concatenate(debuts),
+                np.concatenate(colonnes).astype(np.int64), horizon)
+
+    def _calculer(self) -> None:
+        serie, code, debut, ouvrage_serie, horizon = self._sequences()
+        nb = len(self.ouvrages)
+        if not len(serie):
+            return
+        nb_series = len(ouvrage_serie)
+        self.nb_ouvrages = np.bincount(ouvrage_serie, minlength=nb)
+
+        # Fin de chaque séquence : début de la suivante du même ouvrage, sinon l'horizon
+        derniere = np.ones(len(serie), dtype=bool)
+        derniere[:-1] = serie[1:] != serie[:-1]
+        fin = np.empty_like(debut)
+        fin[:-1] = debut[1:]
+        fin[derniere] = horizon
+        duree = fin - debut
+
+        # Sommes par ouvrage-station, puis par type d'ouvrage
+        fonctionnement = _table_etats(self.flotte, ETATS_FONCTIONNEMENT)
+        par_serie = np.bincount(serie, weights=np.where(fonctionnement[code], duree, 0), minlength=nb_series)
+        self.fonctionnement_s = np.bincount(ouvrage_serie, weights=par_serie, minlength=nb)
+
+        # Arrêts : séquences consécutives en ETATS_ARRET regroupées en blocs
+        arret = _table_etats(self.flotte, ETATS_ARRET)[code]
+        nouveau_bloc = np.ones(len(serie), dtype=bool)
+        nouveau_bloc[1:] = derniere[:-1] | (arret[1:] != arret[:-1])
+        premiers = np.flatnonzero(nouveau_bloc)
+        derniers = np.empty_like(premiers)
+        derniers[:-1] = premiers[1:] - 1
+        derniers[-1] = len(serie) - 1
+        serie_bloc, code_bloc = serie[premiers], code[premiers]
+        nouvelle_serie = np.r_[True, derniere[:-1]][premiers]
+
+        # Panne : bloc d'arrêt commençant en panne, précédé d'un bloc du même ouvrage
+        code_panne = self.flotte.etats.codes.get(ETAT_PANNE, CODE_ABSENT)
+        pannes = arret[premiers] & (code_bloc == code_panne) & ~nouvelle_serie
+        indices = np.flatnonzero(pannes)
+        # Réparation : le bloc suivant, du même ouvrage, commence dans un état de fonctionnement
+        suivants = indices + 1
+        reparees = indices[(suivants < len(premiers)) & ~np.append(nouvelle_serie, True)[suivants]
+                           & fonctionnement[np.append(code_bloc, 0)[suivants]]]
+        duree_reparees = (fin[derniers[reparees]] - debut[premiers[reparees]]).astype(np.float64)
+
+        self.pannes = np.bincount(ouvrage_serie[serie_bloc[indices]], minlength=nb)
+        self.reparations = np.bincount(ouvrage_serie[serie_bloc[reparees]], minlength=nb)
+        self.arret_repare_s = np.bincount(ouvrage_serie[serie_bloc[reparees]],
+                                          weights=duree_reparees, minlength=nb)
+
+    def lignes(self) -> List[Dict[str, Any]]:
+        """Une ligne par type d'ouvrage présent dans la flotte (durées en heures, None sans événement)."""
+        lignes = []
+        for i, ouvrage in enumerate(self.ouvrages):
+            if not self.nb_ouvrages[i]:
+                continue
+            pannes, reparations = int(self.pannes[i]), int(self.reparations[i])
+            lignes.append({
+                'ouvrage': ouvrage,
+                'ouvrages': int(self.nb_ouvrages[i]),
+                'pannes': pannes,
+                'reparations': reparations,
+                'fonctionnement_h': round(float(self.fonctionnement_s[i]) / 3600, 2),
+                'mtbf_h': round(float(self.fonctionnement_s[i]) / pannes / 3600, 2) if pannes else None,
+                'mttr_h': round(float(self.arret_repare_s[i]) / reparations / 3600, 2) if reparations else None,
+            })
+        return lignes
+
+    def ecrire(self, flux: TextIO, format_sortie: str = 'table') -> None:
+        """
+        Écrit la table dans un flux.
+
+        Raises:
+            ValueError: Format non supporté
+        """
+        if format_sortie not in FORMATS_FIABILITE:
+            raise ValueError(f"Format non supporté: {format_sortie} (formats: {', '.join(FORMATS_FIABILITE)})")
+        lignes = self.lignes()
+        if format_sortie == 'json':
+            json.dump(lignes, flux, ensure_ascii=False, indent=2)
+            flux.write('\n')
+        elif format_sortie == 'csv':
+            ecrivain = csv.DictWriter(flux, COLONNES_FIABILITE, lineterminator='\n')
+            ecrivain.writeheader()
+            ecrivain.writerows(lignes)
+        else:
+            largeur = max([len('ouvrage')] + [len(ligne['ouvrage']) for ligne in lignes])
+            flux.write(f"{'ouvrage':<{largeur}}  {'nb':>5}  {'pannes':>7}  {'MTBF (h)':>10}  {'MTTR (h)':>10}\n")
+            for ligne in lignes:
+                mtbf = '-' if ligne['mtbf_h'] is None else f"{ligne['mtbf_h']:.1f}"
+                mttr = '-' if ligne['mttr_h'] is None else f"{ligne['mttr_h']:.1f}"
+                flux.write(f"{ligne['ouvrage']:<{largeur}}  {ligne['ouvrages']:>5}  {ligne['pannes']:>7}  "
+                           f"{mtbf:>10}  {mttr:>10}\n")
+
+    def exporter(self, chemin: str, format_sortie: Optional[str] = None) -> None:
+        """Écrit la table dans un fichier (format d'après l'extension par défaut : .json, sinon CSV)."""
+        format_sortie = format_sortie or ('json' if chemin.lower().endswith('.json') else 'csv')
+        if os.path.dirname(chemin):
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        with open(chemin, 'w', encoding='utf-8', newline='') as f:
+            self.ecrire(f, format_sortie)
+
+    def __repr__(self):
+        return f"TableFiabilite({int(np.count_nonzero(self.nb_ouvrages))} types d'ouvrage)"
+
+
+_TABLE: Optional[TableFiabilite] = None
+_TABLE_VERROU = threading.Lock()
+
+
+def get_table_fiabilite() -> TableFiabilite:
+    """Retourne la table MTBF / MTTR, recalculée uniquement si l'historique compact a changé."""
+    global _TABLE
+
+    flotte = get_etats_compacts()
+    table = _TABLE
+    if table is not None and table.flotte is flotte:
+        return table
+    with _TABLE_VERROU:
+        if _TABLE is None or _TABLE.flotte is not flotte:
+            _TABLE = TableFiabilite(flotte)
+            log.info(f"Table de fiabilité calculée: {_TABLE!r}")
+        return _TABLE
@@ -4,6 +4,9 @@ from datetime import datetime
 import logging
 from collections import OrderedDict
 
+from catalogue import get_catalogue, CatalogueProcedes
+from utils import get_station_by_nom, charger_etats_station, charger_historique_station
+
 # Configuration du système de logs
 logging.basicConfig(
     level=logging.INFO,
@@ -64,18 +67,16 @@ def get_types():
         dict: Dictionary of procedure types with their configurations and display names
     """
     try:
-        types = load_json("data/types.json")
-        if not isinstance(types, dict):
-            error_msg = "Le fichier types.json ne contient pas un format de dictionnaire valide"
-            log_erreur(error_msg)
+        catalogue = get_catalogue()
+        if not len(catalogue):
+            log_erreur("Le fichier types.json ne contient aucun type de procédé valide")
             return {}
             
-        # Add formatted display name to each procedure type
-        for key, value in types.items():
-            if isinstance(value, dict):
-                value['display_name'] = formater_nom_procede(key)
-        
-        return types
+        # Copie de chaque configuration avec son nom d'affichage
+        return OrderedDict(
+            (procede.cle, dict(procede.copie_config(), display_name=formater_nom_procede(procede.cle)))
+            for procede in catalogue
+        )
         
     except Exception as e:
         log_erreur("Erreur lors du chargement des types de procédés", exc_info=True)
@@ -103,69 +104,35 @@ def create_initial_state(ouvrages):
     
     return etat_initial
 
-def get_ouvrages_procede(procedure_type, types_data):
+def get_ouvrages_procede(procedure_type, types_data=None):
     """
     Récupère la liste des ouvrages pour un type de procédé donné en respectant l'ordre logique de traitement.
     
     Args:
         procedure_type (str): Le type de procédé (ex: 'MBR')
-        types_data (dict): Les données des types de procédés
+        types_data (dict, optional): Les données des types de procédés ; par défaut
+            le catalogue compilé de data/types.json
         
     Returns:
         OrderedDict: Dictionnaire ordonné des états initiaux des ouvrages
     """
-    if not procedure_type or not isinstance(types_data, dict):
-        log_avertissement("Type de procédé ou données de types invalides")
+    if not procedure_type:
+        log_avertissement("Type de procédé invalide")
         return OrderedDict()
     
     try:
-        # Vérifier si le type de procédé existe
-        if procedure_type not in types_data:
-            log_avertissement(f"Type de procédé '{procedure_type}' non trouvé dans les données")
-            return OrderedDict()
-            
-        procedure_data = types_data[procedure_type]
-        if not isinstance(procedure_data, dict):
-            log_avertissement(f"Données du procédé '{procedure_type}' invalides")
+        if types_data is None:
+            catalogue = get_catalogue()
+        elif isinstance(types_data, dict):
+            catalogue = CatalogueProcedes(types_data)
+        else:
+            log_avertissement("Données de types invalides")
             return OrderedDict()
         
-        etat_initial = OrderedDict()
-        
-        # 1. Filière eau - prétraitement
-        pretraitement = procedure_data.get('filiere_eau', {}).get('pretraitement', [])
-        if isinstance(pretraitement, list):
-            for item in pretraitement:
-                if isinstance(item, str) and item.strip():
-                    etat_initial[item.strip()] = 'en_service'
-        
-        # 2. Filière eau - traitement primaire
-        traitement_primaire = procedure_data.get('filiere_eau', {}).get('traitement_primaire', [])
-        if isinstance(traitement_primaire, list):
-            for item in traitement_primaire:
-                if isinstance(item, str) and item.strip():
-                    etat_initial[item.strip()] = 'en_service'
-        
-        # 3. Filière eau - traitement secondaire
-        traitement_secondaire = procedure_data.get('filiere_eau', {}).get('traitement_secondaire', [])
-        if isinstance(traitement_secondaire, list):
-            for item in traitement_secondaire:
-                if isinstance(item, str) and item.strip():
-                    etat_initial[item.strip()] = 'en_service'
-        
-        # 4. Traitement tertiaire
-        traitement_tertiaire = procedure_data.get('traitement_tertiaire', [])
-        if isinstance(traitement_tertiaire, list):
-            for item in traitement_tertiaire:
-                if isinstance(item, str) and item.strip() and item.strip() not in etat_initial:
-                    etat_initial[item.strip()] = 'en_service'
-        
-        # 5. Filière boue
-        filiere_boue = procedure_data.get('filiere_boue', [])
-        if isinstance(filiere_boue, list):
-            for item in filiere_boue:
-                if isinstance(item, str) and item.strip() and item.strip() not in etat_initial:
-                    etat_initial[item.strip()] = 'en_service'
-        
+        etat_initial = catalogue.etats_initiaux(procedure_type)
+        if etat_initial is None:
+            log_avertissement(f"Type de procédé '{procedure_type}' non trouvé dans les données")
+            return OrderedDict()
         return etat_initial
         
     except Exception as e:
@@ -188,16 +155,17 @@ def get_stations():
 
 def get_etats():
     """
-    Charge et retourne la liste des états des stations depuis etat_station.json
+    Charge et retourne la liste des états des stations depuis le moteur de stockage
     
     Returns:
         list: Liste des états des stations avec la structure mise à jour
     """
     try:
-        etats = load_json("data/etat_station.json")
-        if not isinstance(etats, list):
-            log_avertissement("Le fichier etat_station.json ne contient pas un tableau, initialisation d'une nouvelle liste")
-            return []
+        etats = [
+            etat
+            for historique in charger_etats_station().values()
+            for etat in historique
+        ]
             
         # Vérifier et mettre à jour le format des états si nécessaire
         for etat in etats:
@@ -223,10 +191,9 @@ def get_station(station_name):
         dict: Station data if found, None otherwise
     """
     try:
-        stations = get_stations()
-        for s in stations:
-            if s.get("nom", "").lower() == station_name.lower():
-                return s
+        station = get_station_by_nom(station_name)
+        if station is not None:
+            return station
         log_avertissement(f"Station non trouvée: {station_name}")
         return None
     except Exception as e:
@@ -237,17 +204,17 @@ def get_station(station_name):
 def get_dates_for_station(station_id):
     # Convertir station_id en chaîne si ce n'est pas déjà le cas
     station_id = str(station_id)
-    etats = get_etats()
-    return sorted([e["date"] for e in etats if str(e.get("station_id")) == station_id])
+    etats = charger_historique_station(station_id)
+    return sorted([e.get("date_maj", e.get("date")) for e in etats])
 
 # --- Récupérer l'état d'une station pour une date ---
 def get_state_for_date(station_id, date):
     # Convertir station_id en chaîne si ce n'est pas déjà le cas
     station_id = str(station_id)
-    etats = get_etats()
+    etats = charger_historique_station(station_id)
     for e in etats:
-        if str(e.get("station_id")) == station_id and e.get("date") == date:
-            return e.get("etat", {})
+        if date in (e.get("date_maj"), e.get("date")):
+            return e.get("etat_ouvrages", {})
     return {}
 
 # --- Dessin du schéma ---
@@ -261,9 +228,9 @@ def load_step_config(step_type):
     Returns:
         dict: Configuration de la STEP ou None si non trouvée
     """
-    types = get_types()
-    if step_type in types:
-        return types[step_type]
+    procede = get_catalogue().trouver(step_type)
+    if procede is not None:
+        return procede.copie_config()
     log_avertissement(f"Type de STEP '{step_type}' non trouvé dans la configuration.")
     return None
 
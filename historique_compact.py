@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Représentation compacte en mémoire de l'historique des états des ouvrages.
+
+Dans la forme dictionnaire renvoyée par charger_etats_station(), chaque mise
+à jour répète les noms des ouvrages et les états sous forme de chaînes. Ici :
+- les noms d'ouvrages et les états sont internés dans deux tables de symboles
+  communes à la flotte (un entier par nom ou par état) ;
+- l'historique d'une station est une matrice NumPy uint8 (mises à jour ×
+  ouvrages de la station) de codes d'état, 0 signifiant « ouvrage absent de
+  cette mise à jour », et un vecteur int64 des horodatages (secondes depuis
+  1970, date_maj lue comme heure locale naïve).
+
+La conversion est sans perte dans les deux sens : les dates qui ne sont pas
+au format 'YYYY-MM-DD HH:MM:SS', l'ordre des ouvrages quand il diffère de
+celui des colonnes et les champs supplémentaires d'une mise à jour sont
+conservés à part (ils sont rares).
+
+Exemple :
+    from historique_compact import get_etats_compacts
+
+    flotte = get_etats_compacts()
+    historique = flotte.stations[station_id]
+    historique.codes        # matrice uint8 (mises à jour × ouvrages)
+    historique.horodatages  # vecteur int64
+    flotte.vers_dict() == dict(charger_etats_station())
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from stockage import MoteurStockage, get_stockage
+from disposition_flux import ETATS_LEGENDE
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+# Code d'un ouvrage absent d'une mise à jour
+CODE_ABSENT = 0
+# Horodatage d'une date_maj illisible (la chaîne d'origine est conservée à part)
+HORODATAGE_INCONNU = np.iinfo(np.int64).min
+# Champs d'une mise à jour représentés par la matrice et le vecteur des horodatages
+_CHAMPS_COMPACTS = ('station_id', 'date_maj', 'etat_ouvrages')
+
+
+class TableSymboles:
+    """
+    Table d'internement : associe à chaque valeur un code entier stable.
+
+    Args:
+        valeurs: Valeurs à interner d'emblée, dans l'ordre
+        premier_code: Code de la première valeur (les codes inférieurs sont réservés)
+        limite: Code maximal (OverflowError au-delà)
+    """
+
+    __slots__ = ('valeurs', 'codes', 'premier_code', 'limite')
+
+    def __init__(self, valeurs: Iterable[Any] = (), premier_code: int = 0, limite: Optional[int] = None):
+        self.valeurs: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+        self.premier_code = premier_code
+        self.limite = limite
+        for valeur in valeurs:
+            self.code(valeur)
+
+    def code(self, valeur: Any) -> int:
+        """Retourne le code d'une valeur, en l'internant si elle est nouvelle."""
+        code = self.codes.get(valeur)
+        if code is None:
+            code = self.premier_code + len(self.valeurs)
+            if self.limite is not None and code > self.limite:
+                raise OverflowError(f"Plus de {self.limite - self.premier_code + 1} valeurs distinctes")
+            self.codes[valeur] = code
+            self.valeurs.append(valeur)
+        return code
+
+    def valeur(self, code: int) -> Any:
+        """Retourne la valeur d'un code."""
+        return self.valeurs[code - self.premier_code]
+
+    def __len__(self):
+        return len(self.valeurs)
+
+    def __repr__(self):
+        return f"TableSymboles({len(self.valeurs)} valeurs)"
+
+
+def horodatages_depuis_dates(dates: List[str]) -> Tuple[np.ndarray, Dict[int, str]]:
+    """
+    Convertit des date_maj en secondes depuis 1970 (int64).
+
+    Returns:
+        (horodatages, {indice: date d'origine}) pour les dates qui ne se
+        reconstruisent pas à l'identique depuis leur horodatage
+    """
+    textes = [str(date) for date in dates]
+    try:
+        horodatages = np.array(textes, dtype='datetime64[s]').astype(np.int64)
+    except ValueError:
+        horodatages = np.empty(len(textes), dtype=np.int64)
+        for i, texte in enumerate(textes):
+            try:
+                horodatages[i] = np.datetime64(texte, 's').astype(np.int64)
+            except ValueError:
+                horodatages[i] = HORODATAGE_INCONNU
+
+    reconstruites = dates_depuis_horodatages(horodatages)
+    differentes = {i: dates[i] for i, (texte, reconstruite) in enumerate(zip(textes, reconstruites))
+                   if texte != reconstruite or not isinstance(dates[i], str)}
+    return horodatages, differentes
+
+
+def dates_depuis_horodatages(horodatages: np.ndarray) -> List[str]:
+    """Convertit des horodatages (secondes depuis 1970) en dates 'YYYY-MM-DD HH:MM:SS'."""
+    valides = np.where(horodatages == HORODATAGE_INCONNU, 0, horodatages)
+    textes = np.datetime_as_string(valides.astype('datetime64[s]'), unit='s')
+    return [texte.replace('T', ' ') for texte in textes.tolist()]
+
+
+class HistoriqueCompact:
+    """
+    Historique compact d'une station.
+
+    Attributes:
+        station_id: ID de la station
+        horodatages: Vecteur int64 (n,) des date_maj en secondes depuis 1970
+        codes: Matrice uint8 (n, k) des codes d'état, CODE_ABSENT si l'ouvrage est absent
+        colonnes: Vecteur int32 (k,) des codes d'ouvrage de chaque colonne
+    """
+
+    __slots__ = ('station_id', 'horodatages', 'codes', 'colonnes', '_dates', '_ordres', '_extras')
+
+    def __init__(self, station_id: str, horodatages: np.ndarray, codes: np.ndarray, colonnes: np.ndarray,
+                 dates: Optional[Dict[int, Any]] = None, ordres: Optional[Dict[int, Tuple[int, ...]]] = None,
+                 extras: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.station_id = station_id
+        self.horodatages = horodatages
+        self.codes = codes
+        self.colonnes = colonnes
+        # Exceptions, par indice de mise à jour : date d'origine, ordre des colonnes, autres champs
+        self._dates = dates or {}
+        self._ordres = ordres or {}
+        self._extras = extras or {}
+
+    @property
+    def nb_mises_a_jour(self) -> int:
+        return len(self.horodatages)
+
+    def memoire_octets(self) -> int:
+        """Taille des tableaux NumPy (hors exceptions, en général vides)."""
+        return self.horodatages.nbytes + self.codes.nbytes + self.colonnes.nbytes
+
+    def mise_a_jour(self, indice: int, ouvrages: TableSymboles, etats: TableSymboles) -> Dict[str, Any]:
+        """Reconstruit une seule mise à jour (indice dans l'ordre de l'historique)."""
+        ligne = self.codes[indice].tolist()
+        ordre = self._ordres.get(indice)
+        if ordre is None:
+            ordre = [j for j, code in enumerate(ligne) if code]
+        etat = {
+            'station_id': self.station_id,
+            'date_maj': self._dates[indice] if indice in self._dates
+                        else dates_depuis_horodatages(self.horodatages[indice:indice + 1])[0],
+            'etat_ouvrages': {ouvrages.valeur(int(self.colonnes[j])): etats.valeur(ligne[j]) for j in ordre},
+        }
+        extras = self._extras.get(indice)
+        if extras:
+            etat.update(extras)
+        return etat
+
+    def vers_liste(self, ouvrages: TableSymboles, etats: TableSymboles) -> List[Dict[str, Any]]:
+        """Reconstruit l'historique sous forme de liste de dictionnaires."""
+        noms = [ouvrages.valeur(code) for code in self.colonnes.tolist()]
+        valeurs_etats = [None] + [etats.valeur(code) for code in range(etats.premier_code,
+                                                                          etats.premier_code + len(etats))]
+        dates = dates_depuis_horodatages(self.horodatages)
+        historique = []
+        for i, ligne in enumerate(self.codes.tolist()):
+            ordre = self._ordres.get(i)
+            if ordre is None:
+                etat_ouvrages = {noms[j]: valeurs_etats[code] for j, code in enumerate(ligne) if code}
+            else:
+                etat_ouvrages = {noms[j]: valeurs_etats[ligne[j]] for j in ordre}
+            etat = {'station_id': self.station_id, 'date_maj': self._dates.get(i, dates[i]),
+                    'etat_ouvrages': etat_ouvrages}
+            extras = self._extras.get(i)
+            if extras:
+                etat.update(extras)
+            historique.append(etat)
+        return historique
+
+    def __repr__(self):
+        return f"HistoriqueCompact({self.station_id!r}, {self.codes.shape[0]}×{self.codes.shape[1]})"
+
+
+class EtatsCompacts:
+    """
+    Historique compact de toute la flotte.
+
+    Attributes:
+        ouvrages: Table des noms d'ouvrages
+        etats: Table des états (codes 1 à 255, dans l'ordre de la légende pour les états connus)
+        stations: {station_id: HistoriqueCompact}, dans l'ordre du stockage
+        signature: Signature des données sources (validation du cache)
+    """
+
+    def __init__(self, signature: Any = None):
+        self.ouvrages = TableSymboles()
+        self.etats = TableSymboles((etat for etat, _ in ETATS_LEGENDE), premier_code=1, limite=255)
+        self.stations: 'OrderedDict[str, HistoriqueCompact]' = OrderedDict()
+        self.signature = signature
+
+    def ajouter_historique(self, station_id: str, historique: List[Dict[str, Any]]) -> HistoriqueCompact:
+        """Encode l'historique d'une station (forme dictionnaire) et l'ajoute à la flotte."""
+        station_id = str(station_id)
+        colonnes = {}
+        codes_etats = self.etats.codes
+        lignes = []
+        ordres = {}
+        extras = {}
+        for i, etat in enumerate(historique):
+            etat_ouvrages = etat.get('etat_ouvrages')
+            supplementaires = {cle: valeur for cle, valeur in etat.items() if cle not in _CHAMPS_COMPACTS}
+            if etat.get('station_id', station_id) != station_id:
+                supplementaires['station_id'] = etat['station_id']
+            if not isinstance(etat_ouvrages, dict):
+                supplementaires['etat_ouvrages'] = etat_ouvrages
+                etat_ouvrages = {}
+            if supplementaires:
+                extras[i] = supplementaires
+
+            ligne = []
+            precedente = -1
+            dans_l_ordre = True
+            for nom, valeur in etat_ouvrages.items():
+                colonne = colonnes.get(nom)
+                if colonne is None:
+                    colonne = colonnes[nom] = len(colonnes)
+                if colonne < precedente:
+                    dans_l_ordre = False
+                precedente = colonne
+                # Les codes d'état valent au moins 1 : get() suffit pour un état déjà interné
+                ligne.append((colonne, codes_etats.get(valeur) or self.etats.code(valeur)))
+            if not dans_l_ordre:
+                ordres[i] = tuple(colonne for colonne, _ in ligne)
+            lignes.append(ligne)
+
+        nb_colonnes = len(colonnes)
+        tampon = bytearray(len(lignes) * nb_colonnes)
+        for i, ligne in enumerate(lignes):
+            base = i * nb_colonnes
+            for colonne, code in ligne:
+                tampon[base + colonne] = code
+        codes = np.frombuffer(bytes(tampon), dtype=np.uint8).reshape(len(lignes), nb_colonnes)
+
+        horodatages, dates = horodatages_depuis_dates([etat.get('date_maj', '') for etat in historique])
+        compact = HistoriqueCompact(
+            station_id,
+            horodatages,
+            codes,
+            np.array([self.ouvrages.code(nom) for nom in colonnes], dtype=np.int32),
+            dates, ordres, extras
+        )
+        self.stations[station_id] = compact
+        return compact
+
+    @classmethod
+    def depuis_dict(cls, etats_par_station: Dict[str, List[Dict[str, Any]]], signature: Any = None) -> 'EtatsCompacts':
+        """Encode la forme renvoyée par charger_etats_station()."""
+        flotte = cls(signature)
+        for station_id, historique in etats_par_station.items():
+            flotte.ajouter_historique(station_id, historique)
+        return flotte
+
+    @classmethod
+    def depuis_stockage(cls, stockage: Optional[MoteurStockage] = None) -> 'EtatsCompacts':
+        """Encode l'historique d'un moteur de stockage, une station à la fois (sans passer par la forme dictionnaire complète)."""
+        stockage = stockage or get_stockage()
+        flotte = cls((id(stockage), stockage.signature_etats()))
+        for station_id, historique in stockage.iterer_historiques():
+            flotte.ajouter_historique(station_id, historique)
+        return flotte
+
+    def historique(self, station_id: str) -> List[Dict[str, Any]]:
+        """Historique d'une station sous forme de dictionnaires (liste vide si inconnue)."""
+        compact = self.stations.get(str(station_id))
+        return compact.vers_liste(self.ouvrages, self.etats) if compact is not None else []
+
+    def mise_a_jour(self, station_id: str, indice: int) -> Dict[str, Any]:
+        """Une mise à jour d'une station sous forme de dictionnaire."""
+        return self.stations[str(station_id)].mise_a_jour(indice, self.ouvrages, self.etats)
+
+    def vers_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Reconstruit la forme renvoyée par charger_etats_station()."""
+        return {station_id: compact.vers_liste(self.ouvrages, self.etats)
+                for station_id, compact in self.stations.items()}
+
+    def memoire_octets(self) -> int:
+        """Taille des tableaux NumPy de toute la flotte."""
+        return sum(compact.memoire_octets() for compact in self.stations.values())
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __contains__(self, station_id):
+        return str(station_id) in self.stations
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.stations)
+
+    def __repr__(self):
+        return (f"EtatsCompacts({len(self.stations)} stations, {len(self.ouvrages)} ouvrages, "
+                f"{self.memoire_octets()} octets)")
+
+
+_ETATS_COMPACTS: Optional[EtatsCompacts] = None
+_ETATS_COMPACTS_VERROU = threading.Lock()
+
+
+def get_etats_compacts() -> EtatsCompacts:
+    """
+    Retourne l'historique compact de la flotte, réencodé uniquement si le stockage a changé.
+
+    Sans signature fournie par le moteur de stockage, l'historique est réencodé à chaque appel.
+    """
+    global _ETATS_COMPACTS
+
+    stockage = get_stockage()
+    signature = (id(stockage), stockage.signature_etats())
+    flotte = _ETATS_COMPACTS
+    if flotte is not None and signature[1] is not None and flotte.signature == signature:
+        return flotte
+
+    with _ETATS_COMPACTS_VERROU:
+        if _ETATS_COMPACTS is not None and signature[1] is not None and _ETATS_COMPACTS.signature == signature:
+            return _ETATS_COMPACTS
+        _ETATS_COMPACTS = EtatsCompacts.depuis_stockage(stockage)
+        log.info(f"Historique compact encodé: {_ETATS_COMPACTS!r}")
+        return _ETATS_COMPACTS
+
+
+def invalider_etats_compacts() -> None:
+    """Force le réencodage de l'historique compact au prochain appel de get_etats_compacts()."""
+    global _ETATS_COMPACTS
+    _ETATS_COMPACTS = None
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Propagation des pannes vers l'aval et score de santé des stations.
+
+Chaque état a une capacité (1 en service, 0,5 dégradé, 0 à l'arrêt). La
+capacité effective d'un ouvrage est la plus faible de sa propre capacité et
+des capacités effectives de ses prédécesseurs dans le graphe du procédé
+(catalogue.GrapheProcede), celles-ci étant ramenées au moins à
+CAPACITE_AVAL_MIN : une panne du décanteur secondaire dégrade (sans
+l'arrêter) tout ce qui est en aval, sur la filière eau comme sur la filière
+boue. Un ouvrage `inexistant` ou absent de la mise à jour est traversé sans
+effet. Un ouvrage qui fonctionne mais dont la capacité effective est réduite
+par l'amont a l'état effectif ETAT_IMPACTE.
+
+Le score de santé d'une station est la moyenne des capacités effectives de
+ses ouvrages, sur 100.
+
+Le calcul est incrémental : une mise à jour ne recalcule que les ouvrages
+dont l'état a changé et leurs descendants, dans l'ordre topologique, en
+s'arrêtant dès qu'une capacité effective reste inchangée. Le moteur partagé
+(get_moteur_impact) suit les mises à jour écrites par utils au fil de l'eau.
+
+Exemple :
+    from impact import get_moteur_impact
+
+    moteur = get_moteur_impact()
+    station = moteur.stations[station_id]
+    station.score                  # 0 à 100
+    station.etats_effectifs()      # {ouvrage: état effectif}
+
+    python main.py stats health --json
+"""
+
+import heapq
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from utils import abonner_mises_a_jour, desabonner_mises_a_jour, get_station_by_id
+from catalogue import GrapheProcede, get_catalogue
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+# Capacité de traitement associée à chaque état
+CAPACITES_ETATS = {
+    'en_service': 1.0,
+    'nouvel_ouvrage': 1.0,
+    'en_dysfonctionnement': 0.5,
+    'surcharge_sature': 0.5,
+    'en_maintenance': 0.0,
+    'en_panne': 0.0,
+    'hors_service': 0.0,
+    'arret_volontaire': 0.0,
+}
+# Capacité d'un état inconnu du moteur
+CAPACITE_PAR_DEFAUT = 1.0
+# Un ouvrage en aval d'une panne reçoit un flux mal traité, mais continue de fonctionner
+CAPACITE_AVAL_MIN = 0.5
+# États d'un ouvrage qui n'existe pas : le flux le traverse sans effet
+ETATS_TRANSPARENTS = ('inexistant',)
+# État effectif d'un ouvrage qui fonctionne mais que l'amont dégrade
+ETAT_IMPACTE = 'impacte'
+
+_GRAPHE_VIDE = GrapheProcede((), [])
+
+
+class ImpactStation:
+    """
+    États effectifs et score de santé d'une station, tenus à jour incrémentalement.
+
+    Attributes:
+        station_id: ID de la station
+        graphe: Graphe du procédé de la station
+        noeuds: Ouvrages (ceux du graphe, puis ceux de la station absents du graphe, isolés)
+        date_maj: Date de la mise à jour appliquée en dernier
+        etats: État de chaque ouvrage (None si absent de la mise à jour)
+        effectives: Capacité effective de chaque ouvrage
+    """
+
+    def __init__(self, station_id: str, graphe: GrapheProcede):
+        self.station_id = str(station_id)
+        self.graphe = graphe
+        self.noeuds: List[str] = list(graphe.noeuds)
+        self.indices: Dict[str, int] = dict(graphe.indices)
+        self._rangs = [0] * len(self.noeuds)
+        for rang, i in enumerate(graphe.ordre_topologique):
+            self._rangs[i] = rang
+        self.date_maj: Optional[str] = None
+        self.etats: List[Optional[str]] = [None] * len(self.noeuds)
+        self._propres = [1.0] * len(self.noeuds)
+        self.effectives = [1.0] * len(self.noeuds)
+        # Somme des capacités effectives et nombre des ouvrages comptés dans le score
+        self._somme = 0.0
+        self._nombre = 0
+
+    def _ajouter_noeud(self, nom: str) -> int:
+        """Ajoute un ouvrage hors graphe (sans liaison), placé après tous les autres."""
+        i = len(self.noeuds)
+        self.noeuds.append(nom)
+        self.indices[nom] = i
+        self._rangs.append(len(self._rangs))
+        self.etats.append(None)
+        self._propres.append(1.0)
+        self.effectives.append(1.0)
+        return i
+
+    def _predecesseurs(self, i: int) -> Iterable[int]:
+        if i >= len(self.graphe.noeuds):
+            return ()
+        return self.graphe.predecesseurs[self.graphe.debut_predecesseurs[i]:self.graphe.debut_predecesseurs[i + 1]]
+
+    def _successeurs(self, i: int) -> Iterable[int]:
+        if i >= len(self.graphe.noeuds):
+            return ()
+        return self.graphe.successeurs[self.graphe.debut_successeurs[i]:self.graphe.debut_successeurs[i + 1]]
+
+    @staticmethod
+    def _compte(etat: Optional[str]) -> bool:
+        return etat is not None and etat not in ETATS_TRANSPARENTS
+
+    def appliquer(self, etat_ouvrages: Dict[str, str], date_maj: Optional[str] = None) -> Set[str]:
+        """
+        Applique une mise à jour (état de tous les ouvrages) et propage ses effets.
+
+        Args:
+            etat_ouvrages: {ouvrage: état} ; un ouvrage absent est considéré comme absent de la station
+            date_maj: Date de la mise à jour
+
+        Returns:
+            Les ouvrages dont l'état ou la capacité effective a changé
+        """
+        changes = []
+        for nom, etat in etat_ouvrages.items():
+            i = self.indices.get(nom)
+            if i is None:
+                i = self._ajouter_noeud(nom)
+            if self.etats[i] != etat:
+                changes.append(i)
+        for nom, i in self.indices.items():
+            if self.etats[i] is not None and nom not in etat_ouvrages:
+                changes.append(i)
+
+        for i in changes:
+            if self._compte(self.etats[i]):
+                self._somme -= self.effectives[i]
+                self._nombre -= 1
+            etat = etat_ouvrages.get(self.noeuds[i])
+            self.etats[i] = etat
+            self._propres[i] = CAPACITES_ETATS.get(etat, CAPACITE_PAR_DEFAUT) if self._compte(etat) else 1.0
+            if self._compte(etat):
+                self._somme += self.effectives[i]
+                self._nombre += 1
+        self.date_maj = date_maj if date_maj is not None else self.date_maj
+
+        modifies = self._propager(changes)
+        return {self.noeuds[i] for i in modifies.union(changes)}
+
+    def _propager(self, departs: Iterable[int]) -> Set[int]:
+        """Recalcule les capacités effectives des ouvrages de départ et de leurs descendants touchés."""
+        modifies = set()
+        file = [(self._rangs[i], i) for i in set(departs)]
+        heapq.heapify(file)
+        vus = {i for _, i in file}
+        while file:
+            _, i = heapq.heappop(file)
+            effective = self._propres[i]
+            for p in self._predecesseurs(i):
+                amont = max(self.effectives[p], CAPACITE_AVAL_MIN)
+                if amont < effective:
+                    effective = amont
+            if effective == self.effectives[i]:
+                continue
+            if self._compte(self.etats[i]):
+                self._somme += effective - self.effectives[i]
+            self.effectives[i] = effective
+            modifies.add(i)
+            for j in self._successeurs(i):
+                if j not in vus:
+                    vus.add(j)
+                    heapq.heappush(file, (self._rangs[j], j))
+        return modifies
+
+    @property
+    def score(self) -> Optional[float]:
+        """Score de santé sur 100 (None sans ouvrage à évaluer)."""
+        if not self._nombre:
+            return None
+        return round(100 * self._somme / self._nombre, 1)
+
+    def etat_effectif(self, nom: str) -> Optional[str]:
+        """État effectif d'un ouvrage (ETAT_IMPACTE s'il fonctionne mais que l'amont le dégrade)."""
+        i = self.indices.get(nom)
+        if i is None:
+            return None
+        etat = self.etats[i]
+        if self._compte(etat) and self.effectives[i] < self._propres[i]:
+            return ETAT_IMPACTE
+        return etat
+
+    def etats_effectifs(self) -> Dict[str, str]:
+        """{ouvrage: état effectif} des ouvrages présents dans la dernière mise à jour."""
+        return {nom: self.etat_effectif(nom) for nom, i in self.indices.items() if self.etats[i] is not None}
+
+    def ouvrages_impactes(self) -> List[str]:
+        """Ouvrages dégradés par l'amont, dans l'ordre du procédé."""
+        return [nom for nom in self.noeuds if self.etat_effectif(nom) == ETAT_IMPACTE]
+
+    def vers_dict(self) -> Dict[str, Any]:
+        """Forme sérialisable en JSON."""
+        return {
+            'station_id': self.station_id,
+            'date_maj': self.date_maj,
+            'score': self.score,
+            'ouvrages': {
+                nom: {'etat': self.etats[i], 'etat_effectif': self.etat_effectif(nom),
+                      'capacite_effective': self.effectives[i]}
+                for nom, i in self.indices.items() if self.etats[i] is not None
+            },
+        }
+
+    def __repr__(self):
+        return f"ImpactStation({self.station_id!r}, score={self.score})"
+
+
+class MoteurImpact:
+    """
+    États effectifs et scores de santé de toute la flotte.
+
+    Attributes:
+        stations: {station_id: ImpactStation}
+        signature_catalogue: Version du catalogue dont les graphes sont issus
+    """
+
+    def __init__(self):
+        self.stations: Dict[str, ImpactStation] = {}
+        self.signature_catalogue = get_catalogue().signature
+        self._verrou = threading.RLock()
+
+    @classmethod
+    def depuis_historique(cls) -> 'MoteurImpact':
+        """Initialise le moteur avec la dernière mise à jour de chaque station."""
+        from requete_temporelle import get_index_temporel
+
+        moteur = cls()
+        for station_id, mise_a_jour in get_index_temporel().dernieres_mises_a_jour().items():
+            moteur.appliquer_mise_a_jour(station_id, mise_a_jour)
+        return moteur
+
+    def _station(self, station_id: str) -> ImpactStation:
+        station_id = str(station_id)
+        impact = self.stations.get(station_id)
+        if impact is None:
+            station = get_station_by_id(station_id) or {}
+            procede = get_catalogue().trouver(station.get('type_procede'))
+            impact = self.stations[station_id] = ImpactStation(
+                station_id, procede.graphe if procede is not None else _GRAPHE_VIDE)
+        return impact
+
+    def appliquer_mise_a_jour(self, station_id: str, mise_a_jour: Dict[str, Any]) -> Set[str]:
+        """
+        Applique une mise à jour d'une station, si elle n'est pas antérieure à la dernière appliquée.
+
+        Returns:
+            Les ouvrages dont l'état ou la capacité effective a changé
+        """
+        etat_ouvrages = mise_a_jour.get('etat_ouvrages')
+        if not isinstance(etat_ouvrages, dict):
+            return set()
+        date_maj = mise_a_jour.get('date_maj', mise_a_jour.get('date', ''))
+        with self._verrou:
+            impact = self._station(station_id)
+            if impact.date_maj is not None and date_maj < impact.date_maj:
+                return set()
+            return impact.appliquer(etat_ouvrages, date_maj)
+
+    def appliquer_mises_a_jour(self, mises_a_jour_par_station: Dict[str, List[Dict[str, Any]]],
+                               historique_complet: bool = False) -> Dict[str, Set[str]]:
+        """
+        Applique des mises à jour de plusieurs stations (signature des abonnés de utils).
+
+        Args:
+            mises_a_jour_par_station: {station_id: [mises à jour]}
+            historique_complet: True si les mises à jour remplacent tout l'historique de la station
+
+        Returns:
+            {station_id: ouvrages dont l'état ou la capacité effective a changé}
+        """
+        modifies = {}
+        with self._verrou:
+            for station_id, mises_a_jour in mises_a_jour_par_station.items():
+                station_id = str(station_id)
+                if historique_complet:
+                    self.stations.pop(station_id, None)
+                valides = [maj for maj in mises_a_jour if isinstance(maj, dict)]
+                if not valides:
+                    continue
+                # Seule la plus récente compte (la dernière en cas d'égalité, comme selectionner_mise_a_jour)
+                recente = valides[0]
+                for maj in valides[1:]:
+                    if maj.get('date_maj', maj.get('date', '')) >= recente.get('date_maj', recente.get('date', '')):
+                        recente = maj
+                modifies[station_id] = self.appliquer_mise_a_jour(station_id, recente)
+        return modifies
+
+    def scores(self) -> Dict[str, Optional[float]]:
+        """{station_id: score de santé}"""
+        return {station_id: impact.score for station_id, impact in self.stations.items()}
+
+    def __repr__(self):
+        return f"MoteurImpact({len(self.stations)} stations)"
+
+
+_MOTEUR: Optional[MoteurImpact] = None
+_MOTEUR_VERROU = threading.Lock()
+
+
+def get_moteur_impact() -> MoteurImpact:
+    """
+    Retourne le moteur partagé, initialisé avec la dernière mise à jour de chaque station.
+
+    Il suit ensuite les mises à jour écrites par utils dans ce processus ; il
+    est reconstruit si le catalogue des procédés change.
+    """
+    global _MOTEUR
+
+    moteur = _MOTEUR
+    if moteur is not None and moteur.signature_catalogue == get_catalogue().signature:
+        return moteur
+    with _MOTEUR_VERROU:
+        if _MOTEUR is None or _MOTEUR.signature_catalogue != get_catalogue().signature:
+            if _MOTEUR is not None:
+                desabonner_mises_a_jour(_MOTEUR.appliquer_mises_a_jour)
+            _MOTEUR = MoteurImpact.depuis_historique()
+            abonner_mises_a_jour(_MOTEUR.appliquer_mises_a_jour)
+            log.info(f"Moteur d'impact initialisé: {_MOTEUR!r}")
+        return _MOTEUR
+
+
+def invalider_moteur_impact() -> None:
+    """Force la réinitialisation du moteur au prochain appel de get_moteur_impact()."""
+    global _MOTEUR
+    with _MOTEUR_VERROU:
+        if _MOTEUR is not None:
+            desabonner_mises_a_jour(_MOTEUR.appliquer_mises_a_jour)
+        _MOTEUR = None
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Import en masse des changements d'état des ouvrages (CSV, JSONL ou JSON).
+
+Chaque ligne décrit le changement d'état d'un ouvrage :
+station_id, timestamp, ouvrage, etat. Les lignes sont lues en flux,
+validées contre le catalogue compilé des procédés, regroupées par station
+et par horodatage (une mise à jour par station et par horodatage), puis
+enregistrées en une seule opération du moteur de stockage.
+
+Un enregistrement JSONL peut aussi porter un instantané partiel
+{"station": ..., "date_maj": ..., "etat_ouvrages": {...}} : il équivaut à une
+ligne par ouvrage. Un fichier JSON contient une liste de ces enregistrements,
+ou l'objet {station_id: [mises à jour]} de etat_station.json ; il est lu en
+entier, chaque enregistrement y tenant lieu de ligne.
+
+Exemple :
+    python main.py state import passerelle.csv
+    python main.py state import passerelle.jsonl --strict
+"""
+
+import os
+import csv
+import json
+import logging
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils import (
+    get_station_by_id,
+    get_station_by_nom,
+    charger_historique_station,
+    ajouter_mises_a_jour_stations,
+)
+from catalogue import get_catalogue, normaliser_cle
+from disposition_flux import ETATS_LEGENDE
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+ETATS_VALIDES = tuple(etat for etat, _ in ETATS_LEGENDE)
+FORMATS_IMPORT = ('csv', 'jsonl', 'json')
+FORMAT_DATE = '%Y-%m-%d %H:%M:%S'
+# Nombre maximal d'erreurs détaillées dans le résumé (les suivantes sont seulement comptées)
+NB_MAX_ERREURS = 100
+
+# Noms de colonnes acceptés pour chaque champ d'une ligne
+ALIAS_CHAMPS = {
+    'station_id': 'station_id',
+    'station': 'station_id',
+    'timestamp': 'timestamp',
+    'date_maj': 'timestamp',
+    'date': 'timestamp',
+    'ouvrage': 'ouvrage',
+    'etat': 'etat',
+}
+
+
+def format_fichier(chemin: str, format_import: Optional[str] = None) -> str:
+    """
+    Détermine le format d'un fichier d'import (imposé ou d'après son extension).
+
+    Raises:
+        ValueError: Format non supporté
+    """
+    if format_import is None:
+        extension = os.path.splitext(chemin)[1].lower().lstrip('.')
+        format_import = 'jsonl' if extension in ('jsonl', 'ndjson') else extension
+    if format_import not in FORMATS_IMPORT:
+        raise ValueError(f"Format d'import non supporté: {format_import} (formats: {', '.join(FORMATS_IMPORT)})")
+    return format_import
+
+
+def _renommer_champs(enregistrement: Dict[str, Any]) -> Dict[str, Any]:
+    """Ramène les noms de colonnes aux champs station_id, timestamp, ouvrage, etat."""
+    ligne = {}
+    for cle, valeur in enregistrement.items():
+        champ = ALIAS_CHAMPS.get(str(cle).strip().lower())
+        if champ is not None and champ not in ligne:
+            ligne[champ] = valeur
+    return ligne
+
+
+def _lignes_enregistrement(numero: int, enregistrement: Any) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """Lignes d'un enregistrement JSON (changement d'état ou instantané partiel)."""
+    if not isinstance(enregistrement, dict):
+        yield numero, None
+        return
+    ligne = _renommer_champs(enregistrement)
+    etat_ouvrages = enregistrement.get('etat_ouvrages')
+    if isinstance(etat_ouvrages, dict):
+        # Instantané partiel : une ligne par ouvrage
+        for ouvrage, etat in etat_ouvrages.items():
+            yield numero, dict(ligne, ouvrage=ouvrage, etat=etat)
+    else:
+        yield numero, ligne
+
+
+def _enregistrements_json(donnees: Any) -> Iterator[Any]:
+    """
+    Enregistrements d'un fichier JSON : liste d'enregistrements, ou objet
+    {station_id: [mises à jour]} (format de etat_station.json).
+
+    Raises:
+        ValueError: Ni une liste ni un objet
+    """
+    if isinstance(donnees, list):
+        yield from donnees
+    elif isinstance(donnees, dict):
+        for station_id, mises_a_jour in donnees.items():
+            for mise_a_jour in mises_a_jour if isinstance(mises_a_jour, list) else [mises_a_jour]:
+                if isinstance(mise_a_jour, dict) and 'station_id' not in mise_a_jour and 'station' not in mise_a_jour:
+                    mise_a_jour = dict(mise_a_jour, station_id=station_id)
+                yield mise_a_jour
+    else:
+        raise ValueError("Fichier JSON d'import invalide: liste d'enregistrements ou objet {station_id: [mises à jour]} attendu")
+
+
+def lire_lignes(chemin: str, format_import: Optional[str] = None) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Lit un fichier d'import en flux.
+
+    Args:
+        chemin: Fichier CSV (séparateur ',' ou ';', ligne d'en-tête), JSONL ou JSON
+        format_import: 'csv', 'jsonl' ou 'json' (d'après l'extension si None)
+
+    Yields:
+        (numéro de ligne, ligne {station_id, timestamp, ouvrage, etat}) ; la
+        ligne vaut None si elle est illisible. Pour un fichier JSON, le numéro
+        est le rang de l'enregistrement
+
+    Raises:
+        ValueError: Format non supporté, fichier JSON invalide
+    """
+    format_import = format_fichier(chemin, format_import)
+    with open(chemin, 'r', encoding='utf-8-sig', newline='') as f:
+        if format_import == 'json':
+            for numero, enregistrement in enumerate(_enregistrements_json(json.load(f)), 1):
+                yield from _lignes_enregistrement(numero, enregistrement)
+            return
+
+        if format_import == 'csv':
+            entete = f.readline()
+            separateur = ';' if entete.count(';') > entete.count(',') else ','
+            colonnes = next(csv.reader([entete], delimiter=separateur), [])
+            for numero, valeurs in enumerate(csv.reader(f, delimiter=separateur), 2):
+                if not valeurs:
+                    continue
+                yield numero, _renommer_champs(dict(zip(colonnes, valeurs)))
+            return
+
+        for numero, texte in enumerate(f, 1):
+            if not texte.strip():
+                continue
+            try:
+                enregistrement = json.loads(texte)
+            except json.JSONDecodeError:
+                yield numero, None
+                continue
+            yield from _lignes_enregistrement(numero, enregistrement)
+
+
+def normaliser_horodatage(valeur: Any) -> str:
+    """
+    Ramène un horodatage au format des mises à jour ('YYYY-MM-DD HH:MM:SS').
+
+    Accepte 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM:SS' et l'ISO 8601 ('T', fractions de
+    seconde, fuseau ou 'Z') ; un horodatage avec fuseau est converti en heure locale.
+
+    Raises:
+        ValueError: Horodatage invalide
+    """
+    texte = str(valeur).strip()
+    if len(texte) == 19 and texte[10] == ' ':
+        # Cas courant, déjà au bon format : il suffit de le valider
+        datetime.fromisoformat(texte)
+        return texte
+    if texte.endswith(('Z', 'z')):
+        texte = texte[:-1] + '+00:00'
+    horodatage = datetime.fromisoformat(texte)
+    if horodatage.tzinfo is not None:
+        horodatage = horodatage.astimezone().replace(tzinfo=None)
+    return horodatage.strftime(FORMAT_DATE)
+
+
+class IngestionEtats:
+    """
+    Validation et regroupement des lignes d'un import.
+
+    Les stations et les noms d'ouvrages de chaque procédé sont résolus une
+    seule fois puis mémorisés : valider une ligne se résume à quelques
+    lectures de dictionnaires.
+    """
+
+    def __init__(self, date_par_defaut: Optional[str] = None):
+        self.date_par_defaut = date_par_defaut or datetime.now().strftime(FORMAT_DATE)
+        self.catalogue = get_catalogue()
+        self._stations = {}
+        self._ouvrages_par_type = {}
+        self._etats = frozenset(ETATS_VALIDES)
+        # {station_id: {horodatage: {ouvrage: etat}}}
+        self.changements: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.stations: Dict[str, Dict[str, Any]] = {}
+        self.lignes = 0
+        self.acceptees = 0
+        self.rejetees = 0
+        self.erreurs: List[Dict[str, Any]] = []
+
+    def _station(self, reference: str) -> Optional[Dict[str, Any]]:
+        if reference not in self._stations:
+            self._stations[reference] = get_station_by_id(reference) or get_station_by_nom(reference)
+        return self._stations[reference]
+
+    def _ouvrages(self, type_procede: str) -> Optional[Dict[str, str]]:
+        """Noms des ouvrages d'un procédé, indexés par nom exact et normalisé (None si procédé inconnu)."""
+        if type_procede not in self._ouvrages_par_type:
+            procede = self.catalogue.trouver(type_procede)
+            self._ouvrages_par_type[type_procede] = (
+                {**{normaliser_cle(nom): nom for nom in procede.ouvrages},
+                 **{nom: nom for nom in procede.ouvrages}} if procede else None
+            )
+        return self._ouvrages_par_type[type_procede]
+
+    def _rejeter(self, numero: int, message: str) -> None:
+        self.rejetees += 1
+        if len(self.erreurs) < NB_MAX_ERREURS:
+            self.erreurs.append({'ligne': numero, 'erreur': message})
+
+    def ajouter(self, numero: int, ligne: Optional[Dict[str, Any]]) -> bool:
+        """
+        Valide une ligne et l'ajoute aux changements de sa station.
+
+        Returns:
+            True si la ligne est acceptée
+        """
+        self.lignes += 1
+        if ligne is None:
+            self._rejeter(numero, "ligne illisible")
+            return False
+
+        reference = str(ligne.get('station_id') or '').strip()
+        station = self._station(reference) if reference else None
+        if station is None:
+            self._rejeter(numero, f"station '{reference}' introuvable")
+            return False
+
+        ouvrages = self._ouvrages(station.get('type_procede'))
+        if ouvrages is None:
+            self._rejeter(numero, f"procédé '{station.get('type_procede')}' absent du catalogue")
+            return False
+        nom = str(ligne.get('ouvrage') or '')
+        ouvrage = ouvrages.get(nom) or ouvrages.get(normaliser_cle(nom))
+        if ouvrage is None:
+            self._rejeter(numero, f"ouvrage '{ligne.get('ouvrage')}' inconnu pour le procédé "
+                                  f"{station.get('type_procede')}")
+            return False
+
+        etat = str(ligne.get('etat') or '').strip()
+        if etat not in self._etats:
+            self._rejeter(numero, f"état '{etat}' invalide")
+            return False
+
+        try:
+            horodatage = normaliser_horodatage(ligne['timestamp']) if ligne.get('timestamp') else self.date_par_defaut
+        except ValueError:
+            self._rejeter(numero, f"horodatage '{ligne.get('timestamp')}' invalide")
+            return False
+
+        station_id = str(station['id'])
+        self.stations[station_id] = station
+        self.changements.setdefault(station_id, {}).setdefault(horodatage, {})[ouvrage] = etat
+        self.acceptees += 1
+        return True
+
+    def mises_a_jour(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Construit les mises à jour complètes à ajouter, par station.
+
+        Chaque mise à jour part de l'état de la station à son horodatage
+        (historique existant et mises à jour importées plus anciennes), puis
+        applique les changements de ce même horodatage.
+
+        Returns:
+            {station_id: [mises à jour triées par date]}
+        """
+        resultat = {}
+        for station_id, par_date in self.changements.items():
+            historique = sorted(charger_historique_station(station_id),
+                                key=lambda etat: etat.get('date_maj', ''))
+            dates = [etat.get('date_maj', '') for etat in historique]
+            precedente = None
+            nouvelles = []
+            for horodatage in sorted(par_date):
+                position = bisect_right(dates, horodatage) - 1
+                existante = historique[position] if position >= 0 else None
+                if precedente is not None and (existante is None or precedente['date_maj'] >= existante['date_maj']):
+                    base = precedente['etat_ouvrages']
+                elif existante is not None:
+                    base = existante.get('etat_ouvrages', {})
+                else:
+                    base = self.catalogue.etats_initiaux(self.stations[station_id].get('type_procede')) or {}
+                etat_ouvrages = dict(base)
+                etat_ouvrages.update(par_date[horodatage])
+                precedente = {'station_id': station_id, 'date_maj': horodatage, 'etat_ouvrages': etat_ouvrages}
+                nouvelles.append(precedente)
+            resultat[station_id] = nouvelles
+        return resultat
+
+
+def importer_etats(chemin: str, format_import: Optional[str] = None, strict: bool = False) -> Dict[str, Any]:
+    """
+    Importe un fichier de changements d'état et l'enregistre en une seule opération.
+
+    Args:
+        chemin: Fichier CSV, JSONL ou JSON
+        format_import: 'csv', 'jsonl' ou 'json' (d'après l'extension si None)
+        strict: N'enregistrer rien si une ligne est rejetée
+
+    Returns:
+        Résumé : lignes lues, acceptées et rejetées, erreurs (les NB_MAX_ERREURS
+        premières), stations et mises à jour enregistrées
+
+    Raises:
+        ValueError: Format non supporté, fichier JSON invalide
+        OSError: Fichier illisible
+    """
+    debut = datetime.now()
+    ingestion = IngestionEtats()
+    for numero, ligne in lire_lignes(chemin, format_import):
+        ingestion.ajouter(numero, ligne)
+
+    mises_a_jour = {}
+    enregistre = False
+    if ingestion.acceptees and not (strict and ingestion.rejetees):
+        mises_a_jour = ingestion.mises_a_jour()
+        enregistre = ajouter_mises_a_jour_stations(mises_a_jour)
+
+    resume = {
+        'fichier': chemin,
+        'duree_s': round((datetime.now() - debut).total_seconds(), 3),
+        'lignes': ingestion.lignes,
+        'acceptees': ingestion.acceptees,
+        'rejetees': ingestion.rejetees,
+        'erreurs': ingestion.erreurs,
+        'enregistre': enregistre,
+        'stations': len(mises_a_jour) if enregistre else 0,
+        'mises_a_jour': sum(len(etats) for etats in mises_a_jour.values()) if enregistre else 0,
+    }
+    log.info(f"Import de {chemin}: {resume['acceptees']} ligne(s) acceptée(s), {resume['rejetees']} rejetée(s), "
+             f"{resume['mises_a_jour']} mise(s) à jour enregistrée(s) ({resume['duree_s']} s)")
+    return resume
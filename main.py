@@ -7,8 +7,9 @@ import json
 from datetime import datetime
 import logging
 import time
-from collections import OrderedDict
-import unicodedata
+
+# Début du chargement des modules de l'application (mesuré par --startup-profile)
+_DEBUT_IMPORTS = time.perf_counter()
 
 # Import des fonctions utilitaires
 from common import clear_screen
@@ -22,7 +23,9 @@ from utils import (
 )
 
 # Importer les utilitaires
-from utils import get_stations_list, save_stations, update_stations_cache, get_station_by_id, charger_etats_station, sauvegarder_etats_station
+from utils import get_stations_list, save_stations, update_stations_cache, charger_historique_station, sauvegarder_etats_station, ajouter_mise_a_jour_station, invalider_cache_etats
+from stockage import get_stockage
+from commandes import ajouter_sous_commandes
 
 # Configuration du logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -33,14 +36,12 @@ def save_json(filename, data):
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
-try:
-    from gen_station import get_types, get_stations, get_etats
-    print("Import de gen_station réussi")
-except ImportError as e:
-    print("Erreur d'importation de gen_station:", e)
-    raise
+# Les modules de création de station et de dessin (matplotlib, numpy) ne sont
+# importés qu'au moment où l'utilisateur en a besoin
+_DUREE_IMPORTS = time.perf_counter() - _DEBUT_IMPORTS
 
-from create_station import create_station
+# Modules lourds qui ne doivent pas être chargés au démarrage
+MODULES_DIFFERES = ('matplotlib', 'numpy', 'tkinter', 'PIL', 'diagramme_flux', 'create_station', 'gen_station')
 
 def show_menu():
     """Affiche le menu principal avec des icônes et des couleurs"""
@@ -175,9 +176,8 @@ def update_ouvrage_state_new():
         input("\nAppuyez sur Entrée pour continuer...")
         return
     
-    # Charger les états existants
-    etats_actuels = charger_etats_station()
-    etats_station = etats_actuels.get(station_id, [])
+    # Charger les états existants de cette station uniquement
+    etats_station = charger_historique_station(station_id)
     
     # Récupérer le dernier état si disponible
     etat_precedent = {}
@@ -210,14 +210,8 @@ def update_ouvrage_state_new():
         'date_maj': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    # Ajouter à la liste des états
-    if not isinstance(etats_station, list):
-        etats_station = []
-    etats_station.append(nouvelle_entree)
-    etats_actuels[station_id] = etats_station
-    
-    # Sauvegarder les modifications
-    if sauvegarder_etats_station(etats_actuels, station_id):
+    # Ajouter la nouvelle entrée à l'historique (sans réécrire les précédentes)
+    if ajouter_mise_a_jour_station(nouvelle_entree, station_id):
         print("\n\033[1;32m✅ Mise à jour enregistrée avec succès !\033[0m")
     else:
         print("\n\033[1;31m❌ Erreur lors de l'enregistrement de la mise à jour.\033[0m")
@@ -241,9 +235,8 @@ def update_ouvrage_state_edit():
         input("\nAppuyez sur Entrée pour continuer...")
         return
 
-    # Charger les états existants
-    etats_actuels = charger_etats_station()
-    etats_station = etats_actuels.get(station_id, [])
+    # Charger les états existants de cette station uniquement
+    etats_station = charger_historique_station(station_id)
 
     # S'assurer que c'est toujours une liste
     if not isinstance(etats_station, list):
@@ -304,6 +297,9 @@ def update_ouvrage_state_edit():
         input("\nAppuyez sur Entrée pour continuer...")
         return
     
+    # Conserver la version d'origine pour la comparaison visuelle
+    mise_a_jour_originale = etats_station[choix_idx]
+    
     # Mettre à jour les états des ouvrages
     etat_actuel['etat_ouvrages'] = nouveaux_etats
     
@@ -319,11 +315,44 @@ def update_ouvrage_state_edit():
     # Sauvegarder les modifications
     if sauvegarder_etats_station(etats_station, station_id):
         print("\n\033[1;32m✅ Mise à jour modifiée avec succès !\033[0m")
+        choix = input("\nVoulez-vous comparer visuellement cette mise à jour ? (o/n) : ").strip().lower()
+        if choix == 'o':
+            comparer_mise_a_jour(station, etat_actuel, mise_a_jour_originale,
+                                 [maj for maj in etats_station if maj is not etat_actuel])
     else:
         print("\n\033[1;31m❌ Erreur lors de la sauvegarde des modifications.\033[0m")
     
     input("\nAppuyez sur Entrée pour continuer...")
 
+def comparer_mise_a_jour(station, mise_a_jour, mise_a_jour_originale, autres_mises_a_jour):
+    """Affiche les ouvrages modifiés entre une mise à jour et une autre choisie par l'utilisateur"""
+    print("\nComparer avec :")
+    print(f"0. La version avant modification ({mise_a_jour_originale.get('date_maj', 'Date inconnue')})")
+    for i, maj in enumerate(autres_mises_a_jour, 1):
+        print(f"{i}. {maj.get('date_maj', 'Date inconnue')}")
+    
+    while True:
+        choix = input("\nEntrez le numéro de la mise à jour de référence (ou 'q' pour annuler) : ").strip()
+        if choix.lower() == 'q':
+            return
+        try:
+            choix_idx = int(choix)
+            if 0 <= choix_idx <= len(autres_mises_a_jour):
+                break
+            print("\033[1;31mNuméro invalide. Veuillez réessayer.\033[0m")
+        except ValueError:
+            print("\033[1;31mVeuillez entrer un numéro valide.\033[0m")
+    
+    reference = mise_a_jour_originale if choix_idx == 0 else autres_mises_a_jour[choix_idx - 1]
+    
+    # Importer la fonction de comparaison (matplotlib n'est chargé qu'à ce moment)
+    from diagramme_flux import afficher_comparaison_station
+    
+    try:
+        afficher_comparaison_station(station, reference, mise_a_jour)
+    except Exception as e:
+        print(f"\n\033[1;31m❌ Erreur lors de la génération de la comparaison: {str(e)}\033[0m")
+
 def modifier_etats_ouvrages(etat_ouvrages, nom_station, type_procede=None):
     modifications = False
     
@@ -422,91 +451,6 @@ def select_etat_interactive():
         else:
             print("\033[1;31mChoix invalide. Veuillez réessayer.\033[0m")
 
-def get_ouvrages_procede(type_procede):
-    """
-    Récupère la liste des ouvrages pour un type de procédé donné en respectant l'ordre logique de traitement.
-    
-    L'ordre logique est le suivant :
-    1. Prétraitement (dégrillage, dessablage/dégraissage)
-    2. Traitement primaire (décanteur primaire)
-    3. Traitement secondaire (bassins d'aération, décanteur secondaire, etc.)
-    4. Traitement tertiaire (filtration, désinfection)
-    5. Traitement des boues (épaississement, déshydratation, séchage)
-    """
-    try:
-        print(f"\n[DEBUG] Recherche du type de procédé: {type_procede}")
-        
-        # Vérifier si le fichier existe
-        if not os.path.exists('data/types.json'):
-            print("[ERREUR] Le fichier data/types.json n'existe pas")
-            return None
-            
-        with open('data/types.json', 'r', encoding='utf-8') as f:
-            types_data = json.load(f)
-
-        print(f"[DEBUG] Types de procédés disponibles: {list(types_data.keys())}")
-
-        # Normaliser les clés pour être insensibles à la casse et aux accents
-        def normalize(s):
-            return ''.join(c for c in unicodedata.normalize('NFD', str(s).lower())
-                         if not unicodedata.combining(c))
-
-        # Trouver la clé correspondante en ignorant la casse et les accents
-        procede_key = None
-        for key in types_data.keys():
-            if normalize(key) == normalize(type_procede):
-                procede_key = key
-                break
-
-        if not procede_key:
-            print(f"\033[1;31m❌ Type de procédé '{type_procede}' non trouvé dans types.json.\033[0m")
-            return None
-
-        procede_info = types_data[procede_key]
-        print(f"[DEBUG] Procédé trouvé: {procede_info.keys()}")
-
-        # Créer un dictionnaire ordonné pour maintenir l'ordre des ouvrages
-        ouvrages_ordonnes = OrderedDict()
-        
-        # Fonction pour ajouter des ouvrages à partir d'une source
-        def ajouter_ouvrages(source, etat_par_defaut='en_service'):
-            if isinstance(source, list):
-                for ouvrage in source:
-                    if isinstance(ouvrage, str) and ouvrage.strip():
-                        ouvrages_ordonnes[ouvrage] = etat_par_defaut
-            elif isinstance(ouvrage, str) and ouvrage.strip():
-                ouvrages_ordonnes[source] = etat_par_defaut
-        
-        # 1. Ajouter les ouvrages de prétraitement
-        if 'filiere_eau' in procede_info and 'pretraitement' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['pretraitement'])
-        
-        # 2. Ajouter le traitement primaire
-        if 'filiere_eau' in procede_info and 'traitement_primaire' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['traitement_primaire'])
-        
-        # 3. Ajouter le traitement secondaire
-        if 'filiere_eau' in procede_info and 'traitement_secondaire' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['traitement_secondaire'])
-        
-        # 4. Ajouter le traitement tertiaire
-        if 'filiere_eau' in procede_info and 'traitement_tertiaire' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['traitement_tertiaire'])
-        
-        # 5. Ajouter la filière boue
-        if 'filiere_boue' in procede_info:
-            ajouter_ouvrages(procede_info['filiere_boue'])
-        
-        print(f"[DEBUG] Ouvrages ordonnés: {list(ouvrages_ordonnes.keys())}")
-        return ouvrages_ordonnes
-        
-    except Exception as e:
-        print(f"\n[ERREUR] Dans get_ouvrages_procede: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        time.sleep(2)
-        return None
-
 def afficher_et_modifier_etats(etat_ouvrages, nom_station, type_procede=None):
     """
     Affiche et permet de modifier les états des ouvrages avec une interface cohérente.
@@ -623,7 +567,7 @@ def delete_station():
     print("-" * 40 + "\n")
     
     # Afficher la liste des stations
-    stations = load_json("data/stations.json")
+    stations = get_stations_list()
     if not stations:
         print("\033[1;33mAucune station à supprimer.\033[0m")
         input("\nAppuyez sur Entrée pour continuer...")
@@ -658,15 +602,10 @@ def delete_station():
         return
     
     try:
-        # 1. Supprimer la station de la liste des stations
-        stations = [s for s in stations if s['id'] != station['id']]
-        save_json("data/stations.json", stations)
-        
-        # 2. Supprimer les états associés dans etat_station.json
-        etats_data = load_json("data/etat_station.json")
-        if isinstance(etats_data, dict) and station['id'] in etats_data:
-            del etats_data[station['id']]
-            save_json("data/etat_station.json", etats_data)
+        # Supprimer la station et ses états associés via le moteur de stockage
+        get_stockage().supprimer_station(station['id'])
+        update_stations_cache()
+        invalider_cache_etats()
         
         print(f"\n\033[1;32m✓ Station '{station['nom']}' et ses données associées ont été supprimées avec succès.\033[0m")
     except Exception as e:
@@ -674,8 +613,8 @@ def delete_station():
     
     input("\nAppuyez sur Entrée pour continuer...")
 
-def main():
-    """Fonction principale"""
+def initialiser_donnees():
+    """Crée le répertoire et les fichiers de données manquants"""
     # Vérifier si le répertoire data existe, sinon le créer
     os.makedirs('data', exist_ok=True)
     
@@ -686,12 +625,63 @@ def main():
     if not os.path.exists('data/etat_station.json'):
         with open('data/etat_station.json', 'w', encoding='utf-8') as f:
             json.dump({}, f, ensure_ascii=False, indent=2)
+
+def profiler_demarrage():
+    """Affiche le temps de démarrage de l'application, étape par étape"""
+    etapes = [("Import des modules de l'application", _DUREE_IMPORTS)]
+    
+    debut = time.perf_counter()
+    initialiser_donnees()
+    etapes.append(("Initialisation des fichiers de données", time.perf_counter() - debut))
+    
+    debut = time.perf_counter()
+    stations = get_stations_list()
+    etapes.append((f"Chargement de la liste des stations ({len(stations)})", time.perf_counter() - debut))
+    
+    # Modules chargés avant toute demande de diagramme
+    charges = [module for module in MODULES_DIFFERES if module in sys.modules]
+    
+    # Coût payé au premier schéma demandé, hors démarrage
+    debut = time.perf_counter()
+    import diagramme_flux  # noqa: F401
+    duree_diagramme = time.perf_counter() - debut
+    
+    print("\033[1;34mPROFIL DE DÉMARRAGE\033[0m")
+    print("-" * 60)
+    for libelle, duree in etapes:
+        print(f"{libelle:<48} {duree * 1000:8.1f} ms")
+    print("-" * 60)
+    print(f"{'Total du démarrage':<48} {sum(duree for _, duree in etapes) * 1000:8.1f} ms")
+    print(f"{'Premier schéma (import de diagramme_flux)':<48} {duree_diagramme * 1000:8.1f} ms")
+    print(f"\nModules différés chargés au démarrage : {', '.join(charges) if charges else 'aucun'}")
+    return 1 if charges else 0
+
+def main(argv=None):
+    """Fonction principale"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Gestionnaire des stations d'épuration")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="Mesurer le temps de démarrage de l'application et quitter")
+    # Sous-commandes non interactives ; sans sous-commande, le menu interactif est lancé
+    ajouter_sous_commandes(parser)
+    args = parser.parse_args(argv)
+    
+    if args.startup_profile:
+        return profiler_demarrage()
+    
+    if args.commande:
+        initialiser_donnees()
+        return args.fonction(args)
+    
+    initialiser_donnees()
     
     while True:
         clear_screen()
         choix = show_menu()
         
         if choix == '1':
+            from create_station import create_station
             create_station()
             # Mettre à jour le cache après la création d'une nouvelle station
             update_stations_cache()
@@ -717,13 +707,9 @@ if __name__ == "__main__":
     if not os.path.exists('data'):
         os.makedirs('data')
     
-    # Désactiver les logs de débogage de matplotlib
-    import matplotlib as mpl
-    mpl.rcParams['figure.max_open_warning'] = 0
-    
     # Lancer l'application
     try:
-        main()
+        raise SystemExit(main())
     except KeyboardInterrupt:
         print("\n\n\033[1;33m🛑 Arrêt du programme par l'utilisateur\033[0m")
         sys.exit(0)
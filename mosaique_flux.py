@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mosaïque des diagrammes de flux de toute la flotte, pour un affichage mural.
+
+Toutes les stations sont dessinées dans une seule figure : une tuile (axes)
+par station, créées en une fois sur une grille, une légende commune pour toute
+la figure et un seul savefig. Les tuiles sont dessinées par
+DiagrammeFlux.dessiner_diagramme sans légende ni ajustement de mise en page,
+ce qui garde un coût par tuile constant même avec plusieurs centaines de
+stations.
+
+Exemple :
+    python mosaique_flux.py --sortie mur.png
+    python mosaique_flux.py --sortie mur_mbr.pdf --type MBR --date 2024-06-30 --colonnes 4
+"""
+
+import os
+
+# Aucun affichage : le backend doit être choisi avant l'import de diagramme_flux
+os.environ['MPLBACKEND'] = 'Agg'
+
+import math
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from diagramme_flux import DiagrammeFlux, preparer_ouvrages_station
+from rendu_lot import selectionner_stations, preparer_tache
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+FORMATS_MOSAIQUE = ('png', 'svg', 'pdf')
+# Taille d'une tuile en pouces : celle d'un diagramme seul, pour garder les mêmes proportions de texte
+TAILLE_TUILE = (14, 8)
+# Hauteur réservée en haut de la figure à la légende commune et aux titres de la première ligne (pouces)
+HAUTEUR_LEGENDE = 2.4
+# Place à gauche de chaque tuile pour les titres des filières, qui débordent des axes (unités du diagramme)
+MARGE_TITRES_FILIERES = 4.5
+DPI_MOSAIQUE = 40
+
+
+def disposer_grille(nombre: int, colonnes: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Calcule la grille (lignes, colonnes) d'une mosaïque.
+
+    Args:
+        nombre: Nombre de tuiles
+        colonnes: Nombre de colonnes imposé ; par défaut, une grille proche d'un écran 16:9
+
+    Returns:
+        (lignes, colonnes)
+    """
+    if nombre <= 0:
+        return 0, 0
+    if not colonnes:
+        largeur, hauteur = TAILLE_TUILE
+        colonnes = round(math.sqrt(nombre * (16 / 9) * hauteur / largeur))
+    colonnes = max(1, min(colonnes, nombre))
+    return math.ceil(nombre / colonnes), colonnes
+
+
+def rendre_mosaique(chemin: str, stations: Optional[Iterable[str]] = None,
+                    types: Optional[Iterable[str]] = None, date: Optional[str] = None,
+                    colonnes: Optional[int] = None, dpi: int = DPI_MOSAIQUE) -> Dict[str, Any]:
+    """
+    Dessine les diagrammes des stations dans une seule figure et l'enregistre.
+
+    Args:
+        chemin: Fichier de sortie (.png, .svg ou .pdf)
+        stations: IDs ou noms des stations (toutes si None)
+        types: Types de procédé à retenir (tous si None)
+        date: Date de l'état à représenter ; dernière mise à jour si None
+        colonnes: Nombre de tuiles par ligne (calculé si None)
+        dpi: Résolution de l'image
+
+    Returns:
+        Résumé : fichier, grille, stations dessinées, ignorées et en erreur
+
+    Raises:
+        ValueError: Format non supporté ou aucune station à représenter
+    """
+    extension = os.path.splitext(chemin)[1].lower().lstrip('.')
+    if extension not in FORMATS_MOSAIQUE:
+        raise ValueError(f"Format non supporté: .{extension} (formats: {', '.join(FORMATS_MOSAIQUE)})")
+
+    debut = datetime.now()
+    taches = [preparer_tache(station, date) for station in selectionner_stations(stations, types)]
+    a_dessiner = [tache for tache in taches if not tache['erreur']]
+    ignorees = [{'station_id': t['station_id'], 'nom': t['nom'], 'erreur': t['erreur']}
+                for t in taches if t['erreur']]
+    if not a_dessiner:
+        raise ValueError("Aucune station à représenter")
+
+    lignes, colonnes = disposer_grille(len(a_dessiner), colonnes)
+    largeur_tuile, hauteur_tuile = TAILLE_TUILE
+    hauteur = lignes * hauteur_tuile + HAUTEUR_LEGENDE
+
+    # Une seule figure et toutes ses tuiles, créées en une fois. La grille est
+    # fixée : pas de moteur de mise en page (figure.autolayout) qui mesurerait
+    # chaque tuile à l'enregistrement
+    plt.switch_backend('Agg')
+    fig = plt.figure(figsize=(colonnes * largeur_tuile, hauteur), dpi=dpi, facecolor='white', layout='none')
+    axes = fig.subplots(lignes, colonnes, squeeze=False, gridspec_kw={
+        'left': 0.01, 'right': 0.99, 'bottom': 0.01, 'top': 1 - HAUTEUR_LEGENDE / hauteur,
+        'wspace': 0.05, 'hspace': 0.3,
+    })
+
+    diagrammes = {}
+    erreurs = []
+    try:
+        for ax, tache in zip(axes.flat, a_dessiner):
+            type_procede = tache['type_procede']
+            try:
+                diagramme = diagrammes.get(type_procede)
+                if diagramme is None:
+                    diagramme = diagrammes[type_procede] = DiagrammeFlux(type_station=type_procede)
+                ouvrages = preparer_ouvrages_station(type_procede, tache['etat_ouvrages'])
+                ouvrages_positionnes, disposition = diagramme.calculer_disposition(ouvrages)
+                diagramme.dessiner_diagramme(ax, ouvrages_positionnes, tache['destination'],
+                                             disposition, autonome=False)
+                x_min, x_max = ax.get_xlim()
+                ax.set_xlim(x_min - MARGE_TITRES_FILIERES, x_max)
+                # Titre posé au-dessus de l'étiquette 'Eaux usées' (qui déborde des axes) ;
+                # set_title repositionnerait chaque titre à l'enregistrement
+                ax.text((x_min + x_max) / 2, ax.get_ylim()[1] + 1.5, tache['titre'], ha='center', va='bottom',
+                        fontsize=13, fontweight='bold', linespacing=1.3)
+            except Exception as e:
+                log.error(f"Erreur lors du dessin de la station {tache['nom']}: {e}", exc_info=True)
+                erreurs.append({'station_id': tache['station_id'], 'nom': tache['nom'], 'erreur': str(e)})
+                ax.clear()
+                ax.axis('off')
+                ax.text(0.5, 0.5, f"{tache['nom']}\n❌ {e}", ha='center', va='center',
+                        fontsize=12, color='#F44336', transform=ax.transAxes)
+
+        # Tuiles restantes de la dernière ligne
+        for ax in axes.flat[len(a_dessiner):]:
+            ax.set_visible(False)
+
+        # Légende commune à toutes les tuiles
+        fig.legend(
+            handles=DiagrammeFlux().elements_legende(),
+            loc='upper center',
+            bbox_to_anchor=(0.5, 1 - 0.1 / hauteur),
+            ncol=11,
+            fontsize=14,
+            title="Légende",
+            title_fontsize=15,
+            frameon=True,
+            edgecolor='#dddddd',
+            facecolor='white'
+        )
+
+        fig.savefig(chemin, format=extension, dpi=dpi, facecolor='white')
+    finally:
+        plt.close(fig)
+
+    resume = {
+        'fichier': chemin,
+        'duree_s': round((datetime.now() - debut).total_seconds(), 3),
+        'grille': [lignes, colonnes],
+        'stations': len(a_dessiner) - len(erreurs),
+        'ignorees': ignorees,
+        'erreurs': erreurs,
+    }
+    log.info(f"Mosaïque de {resume['stations']} station(s) enregistrée: {chemin} ({resume['duree_s']} s)")
+    return resume
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande de la mosaïque."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mosaïque des diagrammes de flux de plusieurs stations")
+    parser.add_argument('--sortie', default='mosaique.png', help="Fichier de sortie (.png, .svg ou .pdf)")
+    parser.add_argument('--station', action='append', dest='stations',
+                        help="ID ou nom de station (option répétable, toutes par défaut)")
+    parser.add_argument('--type', action='append', dest='types',
+                        help="Type de procédé (option répétable, tous par défaut)")
+    parser.add_argument('--date', default=None,
+                        help="Date de l'état à représenter (YYYY-MM-DD[ HH:MM:SS]), dernière mise à jour par défaut")
+    parser.add_argument('--colonnes', type=int, default=None, help="Nombre de tuiles par ligne")
+    parser.add_argument('--dpi', type=int, default=DPI_MOSAIQUE, help="Résolution de l'image")
+    args = parser.parse_args(argv)
+
+    try:
+        resume = rendre_mosaique(args.sortie, args.stations, args.types, args.date, args.colonnes, args.dpi)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    lignes, colonnes = resume['grille']
+    print(f"✅ Mosaïque {lignes}x{colonnes} de {resume['stations']} station(s) enregistrée: {resume['fichier']} "
+          f"({len(resume['ignorees'])} station(s) ignorée(s), {len(resume['erreurs'])} erreur(s))")
+    return 1 if resume['erreurs'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rendu non interactif des diagrammes de flux pour toute la flotte de stations.
+
+Utilise le backend 'Agg' (aucun affichage, aucune saisie) et
+DiagrammeFlux.generer_diagramme pour produire des fichiers PNG et/ou SVG
+dans un dossier de sortie, accompagnés d'un manifeste manifest.json.
+
+Le rendu peut être réparti sur plusieurs processus (--processus) : chaque
+processus charge matplotlib et le catalogue des procédés une seule fois, et
+les résultats sont remontés au fur et à mesure qu'ils se terminent.
+
+Exemple :
+    python rendu_lot.py --sortie diagrammes --format png svg --type MBR --date 2024-06-30
+    python rendu_lot.py --sortie diagrammes --processus 0   # un processus par cœur
+"""
+
+import io
+import os
+import re
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Le backend doit être choisi avant l'import de matplotlib.pyplot (via diagramme_flux)
+os.environ['MPLBACKEND'] = 'Agg'
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from utils import (
+    get_stations_list,
+    get_station_by_id,
+    get_station_by_nom,
+    charger_historique_station,
+    selectionner_mise_a_jour,
+)
+from catalogue import get_catalogue
+from cache_rendu import get_cache_rendu, cle_rendu
+from diagramme_flux import DiagrammeFlux, GabaritDiagramme, preparer_ouvrages_station, formater_titre_diagramme
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+FORMATS_SUPPORTES = ('png', 'svg')
+NOM_MANIFESTE = 'manifest.json'
+DPI_RENDU = 100
+
+# Gabarits de figures du processus courant, du moins au plus récemment utilisé :
+# seules les couleurs des blocs et le titre changent d'une station à l'autre
+_GABARITS: 'OrderedDict[tuple, GabaritDiagramme]' = OrderedDict()
+NB_MAX_GABARITS = 16
+
+
+def selectionner_stations(stations: Optional[Iterable[str]] = None,
+                          types: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Sélectionne les stations à rendre.
+
+    Args:
+        stations: IDs ou noms de stations (toutes les stations si vide)
+        types: Types de procédé à conserver (tous si vide)
+
+    Returns:
+        Liste des stations retenues, dans l'ordre de stations.json
+    """
+    toutes = get_stations_list()
+    if stations:
+        retenues = []
+        for reference in stations:
+            station = get_station_by_id(reference) or get_station_by_nom(reference)
+            if station is None:
+                log.warning(f"Station '{reference}' introuvable, ignorée")
+            elif station not in retenues:
+                retenues.append(station)
+    else:
+        retenues = list(toutes)
+
+    if types:
+        types = set(types)
+        retenues = [station for station in retenues if station.get('type_procede') in types]
+    return retenues
+
+
+def nom_fichier_diagramme(station: Dict[str, Any], extension: str) -> str:
+    """Nom de fichier stable pour le diagramme d'une station."""
+    nom = re.sub(r'[^\w-]+', '_', str(station.get('nom', 'station')).lower()).strip('_')
+    return f"diagramme_{nom or 'station'}_{station.get('id', 'inconnu')}.{extension}"
+
+
+def preparer_tache(station: Dict[str, Any], date: Optional[str] = None,
+                   mise_a_jour: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Rassemble tout ce qu'il faut pour dessiner le diagramme d'une station.
+
+    Args:
+        station: Station à rendre
+        date: Date de l'état à représenter (dernière mise à jour si None)
+        mise_a_jour: Mise à jour à représenter, déjà choisie (prioritaire sur date)
+
+    Returns:
+        Dictionnaire de tâche (sérialisable) ; la clé 'erreur' est renseignée si la
+        station ne peut pas être rendue
+    """
+    station_id = str(station.get('id', ''))
+    nom_station = station.get('nom', 'Station inconnue')
+    type_procede = station.get('type_procede')
+    tache = {
+        'station_id': station_id,
+        'nom': nom_station,
+        'type_procede': type_procede,
+        'destination': station.get('destination', 'Rejet'),
+        'date_maj': None,
+        'etat_ouvrages': {},
+        'titre': None,
+        'fichier_base': nom_fichier_diagramme(station, '{ext}'),
+        'erreur': None,
+    }
+
+    if not type_procede:
+        tache['erreur'] = "Le type de procédé n'est pas défini pour cette station"
+        return tache
+
+    if mise_a_jour is None:
+        mise_a_jour = selectionner_mise_a_jour(charger_historique_station(station_id), date)
+    if mise_a_jour is None:
+        tache['erreur'] = "Aucune mise à jour disponible à cette date"
+        return tache
+
+    tache['date_maj'] = mise_a_jour.get('date_maj', mise_a_jour.get('date'))
+    tache['etat_ouvrages'] = dict(mise_a_jour.get('etat_ouvrages', {}))
+    tache['titre'] = formater_titre_diagramme(nom_station, type_procede, tache['date_maj'])
+    return tache
+
+
+def rendre_tache(tache: Dict[str, Any], dossier_sortie: str,
+                 formats: Iterable[str] = ('png',), utiliser_cache: bool = True) -> Dict[str, Any]:
+    """
+    Dessine le diagramme d'une tâche et l'enregistre dans chaque format demandé.
+    
+    Le cache de rendu est consulté d'abord : matplotlib n'est sollicité que pour
+    les formats absents du cache, en recolorant un gabarit de figure déjà construit
+    pour ce type de procédé.
+
+    Returns:
+        Résultat pour le manifeste : statut 'ok', 'ignore' ou 'erreur', fichiers
+        produits et fichiers repris du cache
+    """
+    resultat = {
+        'station_id': tache['station_id'],
+        'nom': tache['nom'],
+        'type_procede': tache['type_procede'],
+        'date_maj': tache['date_maj'],
+        'statut': 'ok',
+        'fichiers': [],
+        'depuis_cache': [],
+        'erreur': None,
+    }
+    if tache.get('erreur'):
+        resultat.update(statut='ignore', erreur=tache['erreur'])
+        return resultat
+
+    cache = get_cache_rendu() if utiliser_cache else None
+    fig = None
+    try:
+        diagramme = DiagrammeFlux(type_station=tache['type_procede'])
+        style = diagramme.empreinte_style()
+        a_dessiner = []
+        for extension in formats:
+            nom_fichier = tache['fichier_base'].format(ext=extension)
+            cle = None
+            donnees = None
+            if cache is not None:
+                cle = cle_rendu(tache['type_procede'], tache['etat_ouvrages'], tache['destination'],
+                                tache['titre'], extension, style)
+                donnees = cache.lire(cle, extension)
+            if donnees is not None:
+                _ecrire_fichier(os.path.join(dossier_sortie, nom_fichier), donnees)
+                resultat['depuis_cache'].append(nom_fichier)
+            else:
+                a_dessiner.append((extension, nom_fichier, cle))
+            resultat['fichiers'].append(nom_fichier)
+
+        if a_dessiner:
+            ouvrages = preparer_ouvrages_station(tache['type_procede'], tache['etat_ouvrages'])
+            gabarit = _gabarit(tache['type_procede'], tache['destination'], ouvrages)
+            fig = gabarit.appliquer(ouvrages, tache['titre'])
+            for extension, nom_fichier, cle in a_dessiner:
+                tampon = io.BytesIO()
+                fig.savefig(tampon, format=extension, bbox_inches='tight', dpi=DPI_RENDU)
+                donnees = tampon.getvalue()
+                _ecrire_fichier(os.path.join(dossier_sortie, nom_fichier), donnees)
+                if cache is not None:
+                    cache.ecrire(cle, extension, donnees)
+    except Exception as e:
+        log.error(f"Erreur lors du rendu de la station {tache['nom']}: {e}", exc_info=True)
+        resultat.update(statut='erreur', erreur=str(e))
+        if fig is not None:
+            # Ne pas réutiliser une figure dans un état incertain
+            _oublier_gabarit(fig)
+    return resultat
+
+
+def _gabarit(type_procede: str, destination: Optional[str], ouvrages: List[Dict[str, Any]]) -> GabaritDiagramme:
+    """Retourne le gabarit de figure du processus courant pour ce procédé, en le créant au besoin."""
+    cle = (type_procede, destination, get_catalogue().signature, tuple(o['nom'] for o in ouvrages))
+    gabarit = _GABARITS.get(cle)
+    if gabarit is None:
+        gabarit = DiagrammeFlux(type_station=type_procede).creer_gabarit(ouvrages, destination)
+        _GABARITS[cle] = gabarit
+        if len(_GABARITS) > NB_MAX_GABARITS:
+            _GABARITS.popitem(last=False)[1].fermer()
+    else:
+        _GABARITS.move_to_end(cle)
+    return gabarit
+
+
+def _oublier_gabarit(fig) -> None:
+    for cle, gabarit in list(_GABARITS.items()):
+        if gabarit.fig is fig:
+            del _GABARITS[cle]
+            gabarit.fermer()
+
+
+def fermer_gabarits() -> None:
+    """Ferme les gabarits du processus courant (après un rendu depuis une session interactive)."""
+    while _GABARITS:
+        _GABARITS.popitem()[1].fermer()
+
+
+def _ecrire_fichier(chemin: str, donnees: bytes) -> None:
+    with open(chemin, 'wb') as f:
+        f.write(donnees)
+
+
+def _initialiser_processus() -> None:
+    """
+    Initialisation d'un processus de rendu : backend Agg, catalogue compilé et
+    cache des polices de matplotlib sont chargés une fois pour toutes.
+    """
+    plt.switch_backend('Agg')
+    get_catalogue()
+    fig = plt.figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, 'STEP')
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _resultat_erreur(tache: Dict[str, Any], erreur: Exception) -> Dict[str, Any]:
+    """Résultat de manifeste pour une tâche dont le processus a échoué."""
+    return {
+        'station_id': tache['station_id'],
+        'nom': tache['nom'],
+        'type_procede': tache['type_procede'],
+        'date_maj': tache['date_maj'],
+        'statut': 'erreur',
+        'fichiers': [],
+        'depuis_cache': [],
+        'erreur': str(erreur) or erreur.__class__.__name__,
+    }
+
+
+def nombre_processus(processus: Optional[int]) -> int:
+    """Nombre de processus effectif : 0 ou None signifie un par cœur."""
+    if not processus:
+        return os.cpu_count() or 1
+    return max(1, processus)
+
+
+def iterer_rendus(taches: List[Dict[str, Any]], dossier_sortie: str,
+                  formats: Iterable[str] = ('png',), processus: int = 1,
+                  utiliser_cache: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Rend les tâches et produit chaque résultat dès qu'il est disponible.
+
+    Args:
+        taches: Tâches préparées par preparer_tache
+        dossier_sortie: Dossier où écrire les diagrammes
+        formats: Formats de sortie
+        processus: Nombre de processus de rendu (1 : rendu dans le processus courant)
+        utiliser_cache: Consulter et alimenter le cache de rendu
+
+    Yields:
+        Les résultats, dans l'ordre où les rendus se terminent
+    """
+    formats = list(formats)
+    a_rendre = [tache for tache in taches if not tache.get('erreur')]
+    # Les stations ignorées ne coûtent rien : inutile de les envoyer aux processus
+    for tache in taches:
+        if tache.get('erreur'):
+            yield rendre_tache(tache, dossier_sortie, formats, utiliser_cache)
+
+    processus = min(nombre_processus(processus), len(a_rendre))
+    if processus <= 1:
+        for tache in a_rendre:
+            yield rendre_tache(tache, dossier_sortie, formats, utiliser_cache)
+        return
+
+    with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus) as executeur:
+        futures = {
+            executeur.submit(rendre_tache, tache, dossier_sortie, formats, utiliser_cache): tache
+            for tache in a_rendre
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                tache = futures[future]
+                log.error(f"Échec du processus de rendu pour la station {tache['nom']}: {e}")
+                yield _resultat_erreur(tache, e)
+
+
+def ecrire_manifeste(dossier_sortie: str, manifeste: Dict[str, Any]) -> str:
+    """Écrit le manifeste de façon atomique et retourne son chemin."""
+    chemin = os.path.join(dossier_sortie, NOM_MANIFESTE)
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        json.dump(manifeste, f, ensure_ascii=False, indent=2)
+    os.replace(temporaire, chemin)
+    return chemin
+
+
+def rendre_flotte(dossier_sortie: str, formats: Iterable[str] = ('png',),
+                  stations: Optional[Iterable[str]] = None,
+                  types: Optional[Iterable[str]] = None,
+                  date: Optional[str] = None,
+                  processus: int = 1,
+                  utiliser_cache: bool = True) -> Dict[str, Any]:
+    """
+    Rend les diagrammes de toutes les stations sélectionnées, sans interaction.
+
+    Args:
+        dossier_sortie: Dossier où écrire les diagrammes et le manifeste
+        formats: Formats de sortie ('png' et/ou 'svg')
+        stations: IDs ou noms de stations à rendre (toutes si vide)
+        types: Types de procédé à rendre (tous si vide)
+        date: Date de l'état à représenter (dernière mise à jour si None)
+        processus: Nombre de processus de rendu (0 : un par cœur)
+        utiliser_cache: Consulter et alimenter le cache de rendu
+
+    Returns:
+        Le manifeste écrit dans dossier_sortie/manifest.json
+    """
+    formats = [f.lower() for f in formats]
+    inconnus = [f for f in formats if f not in FORMATS_SUPPORTES]
+    if inconnus:
+        raise ValueError(f"Format(s) non supporté(s): {', '.join(inconnus)}")
+
+    # Si pyplot a déjà été chargé avec un backend interactif, basculer sur Agg
+    plt.switch_backend('Agg')
+    os.makedirs(dossier_sortie, exist_ok=True)
+
+    debut = datetime.now()
+    taches = [preparer_tache(station, date) for station in selectionner_stations(stations, types)]
+    resultats = []
+    for resultat in iterer_rendus(taches, dossier_sortie, formats, processus, utiliser_cache):
+        resultats.append(resultat)
+        log.info(f"{resultat['statut']}: {resultat['nom']} {resultat['fichiers']}")
+
+    # Manifeste dans l'ordre des stations, quel que soit l'ordre de fin des rendus
+    ordre = {tache['station_id']: i for i, tache in enumerate(taches)}
+    resultats.sort(key=lambda r: ordre.get(r['station_id'], len(ordre)))
+
+    manifeste = {
+        'genere_le': debut.strftime('%Y-%m-%d %H:%M:%S'),
+        'duree_s': round((datetime.now() - debut).total_seconds(), 3),
+        'date_demandee': date,
+        'formats': formats,
+        'processus': min(nombre_processus(processus), max(1, len(taches))),
+        'totaux': {
+            statut: sum(1 for r in resultats if r['statut'] == statut)
+            for statut in ('ok', 'ignore', 'erreur')
+        },
+        'fichiers_depuis_cache': sum(len(r['depuis_cache']) for r in resultats),
+        'resultats': resultats,
+    }
+    ecrire_manifeste(dossier_sortie, manifeste)
+    return manifeste
+
+
+def rendre_station(station: Dict[str, Any], chemin: str, date: Optional[str] = None,
+                   utiliser_cache: bool = True) -> Dict[str, Any]:
+    """
+    Rend le diagramme d'une seule station dans un fichier donné.
+
+    Args:
+        station: Station à rendre
+        chemin: Fichier de sortie (.png ou .svg)
+        date: Date de l'état à représenter (dernière mise à jour si None)
+        utiliser_cache: Consulter et alimenter le cache de rendu
+
+    Returns:
+        Résultat de rendre_tache (statut 'ok', 'ignore' ou 'erreur')
+
+    Raises:
+        ValueError: Format non supporté
+    """
+    extension_fichier(chemin)
+    plt.switch_backend('Agg')
+    return rendre_fichier(preparer_tache(station, date), chemin, utiliser_cache)
+
+
+def extension_fichier(chemin: str) -> str:
+    """
+    Format de sortie d'après l'extension d'un fichier.
+
+    Raises:
+        ValueError: Format non supporté
+    """
+    extension = os.path.splitext(chemin)[1].lower().lstrip('.')
+    if extension not in FORMATS_SUPPORTES:
+        raise ValueError(f"Format non supporté: .{extension} (formats: {', '.join(FORMATS_SUPPORTES)})")
+    return extension
+
+
+def rendre_fichier(tache: Dict[str, Any], chemin: str, utiliser_cache: bool = True) -> Dict[str, Any]:
+    """
+    Rend une tâche dans un fichier donné, sans changer de backend.
+
+    Le rendu est celui du lot (figure de taille fixe, même clé de cache),
+    quelle que soit la fenêtre depuis laquelle il est demandé.
+
+    Raises:
+        ValueError: Format non supporté
+    """
+    extension = extension_fichier(chemin)
+    dossier_sortie, nom_fichier = os.path.split(chemin)
+    if dossier_sortie:
+        os.makedirs(dossier_sortie, exist_ok=True)
+    base = os.path.splitext(nom_fichier)[0]
+    tache = dict(tache, fichier_base=base.replace('{', '{{').replace('}', '}}') + '.{ext}')
+    return rendre_tache(tache, dossier_sortie, (extension,), utiliser_cache)
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande du rendu par lot."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rendu non interactif des diagrammes de flux")
+    parser.add_argument('--sortie', default='diagrammes', help="Dossier de sortie")
+    parser.add_argument('--format', nargs='+', default=['png'], choices=FORMATS_SUPPORTES,
+                        dest='formats', help="Format(s) de sortie")
+    parser.add_argument('--station', action='append', dest='stations',
+                        help="ID ou nom de station (option répétable, toutes par défaut)")
+    parser.add_argument('--type', action='append', dest='types',
+                        help="Type de procédé (option répétable, tous par défaut)")
+    parser.add_argument('--date', default=None,
+                        help="Date de l'état à représenter (YYYY-MM-DD[ HH:MM:SS]), dernière mise à jour par défaut")
+    parser.add_argument('--processus', type=int, default=1,
+                        help="Nombre de processus de rendu (0 : un par cœur, 1 par défaut)")
+    parser.add_argument('--sans-cache', action='store_true',
+                        help="Ignorer le cache de rendu (tout redessiner)")
+    args = parser.parse_args(argv)
+
+    manifeste = rendre_flotte(args.sortie, args.formats, args.stations, args.types, args.date,
+                              args.processus, not args.sans_cache)
+    totaux = manifeste['totaux']
+    print(f"✅ {totaux['ok']} diagramme(s) généré(s) ({manifeste['fichiers_depuis_cache']} fichier(s) repris du cache), "
+          f"{totaux['ignore']} station(s) ignorée(s), {totaux['erreur']} erreur(s) — manifeste: {os.path.join(args.sortie, NOM_MANIFESTE)}")
+    return 1 if totaux['erreur'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
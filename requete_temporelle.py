@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Requêtes « à date » sur l'historique : état de toute la flotte à un instant donné.
+
+Pour chaque station, les horodatages de l'historique compact sont triés une
+fois ; une requête se résume ensuite à une recherche dichotomique par station
+(O(stations · log mises à jour)), sans relire ni trier l'historique.
+
+La mise à jour retenue est la même que selectionner_mise_a_jour() : la
+dernière dont la date est antérieure ou égale à l'instant demandé, la plus
+tardive dans l'historique en cas d'égalité ; une date sans heure couvre
+toute la journée.
+
+Exemple :
+    from requete_temporelle import etat_flotte_a_date
+
+    etats = etat_flotte_a_date('2025-09-05 08:00')
+    etats[station_id]['etat_ouvrages']
+
+    python main.py state as-of "2025-09-05 08:00" --json
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from historique_compact import EtatsCompacts, get_etats_compacts
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+
+def horodatage_requete(date: str) -> int:
+    """
+    Convertit une date de requête en secondes depuis 1970.
+
+    Args:
+        date: 'YYYY-MM-DD' (fin de journée), 'YYYY-MM-DD HH:MM' ou 'YYYY-MM-DD HH:MM:SS'
+
+    Raises:
+        ValueError: Date invalide
+    """
+    texte = str(date).strip()
+    if len(texte) == 10:
+        texte = f"{texte} 23:59:59"
+    return int(np.datetime64(texte.replace(' ', 'T'), 's').astype(np.int64))
+
+
+class IndexTemporel:
+    """
+    Horodatages triés de chaque station de l'historique compact.
+
+    Attributes:
+        flotte: Historique compact indexé
+        ordres: {station_id: indices des mises à jour triées par horodatage}
+        horodatages: {station_id: horodatages triés}
+    """
+
+    def __init__(self, flotte: EtatsCompacts):
+        self.flotte = flotte
+        self.ordres: Dict[str, np.ndarray] = {}
+        self.horodatages: Dict[str, np.ndarray] = {}
+        for station_id, compact in flotte.stations.items():
+            # Tri stable : à horodatage égal, la mise à jour la plus tardive dans l'historique reste la dernière
+            ordre = np.argsort(compact.horodatages, kind='stable')
+            self.ordres[station_id] = ordre
+            self.horodatages[station_id] = compact.horodatages[ordre]
+
+    def indice_a_date(self, station_id: str, horodatage: int) -> Optional[int]:
+        """Indice (dans l'historique) de la mise à jour en vigueur à un instant, None s'il n'y en a pas."""
+        horodatages = self.horodatages.get(str(station_id))
+        if horodatages is None:
+            return None
+        position = int(np.searchsorted(horodatages, horodatage, side='right')) - 1
+        if position < 0:
+            return None
+        return int(self.ordres[str(station_id)][position])
+
+    def etat_station(self, station_id: str, date: str) -> Optional[Dict[str, Any]]:
+        """
+        Mise à jour en vigueur pour une station à une date.
+
+        Returns:
+            La mise à jour (station_id, date_maj, etat_ouvrages) ou None
+        """
+        indice = self.indice_a_date(station_id, horodatage_requete(date))
+        return None if indice is None else self.flotte.mise_a_jour(station_id, indice)
+
+    def etat_flotte(self, date: str, station_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Mise à jour en vigueur pour chaque station à une date.
+
+        Args:
+            date: Instant de la requête
+            station_ids: Stations à interroger (toutes si None)
+
+        Returns:
+            {station_id: mise à jour}, sans les stations qui n'ont aucune mise à jour à cette date
+        """
+        horodatage = horodatage_requete(date)
+        station_ids = self.horodatages if station_ids is None else [str(s) for s in station_ids]
+        resultat = {}
+        for station_id in station_ids:
+            indice = self.indice_a_date(station_id, horodatage)
+            if indice is not None:
+                resultat[station_id] = self.flotte.mise_a_jour(station_id, indice)
+        return resultat
+
+    def dernieres_mises_a_jour(self, station_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Dernière mise à jour (la plus récente) de chaque station qui a un historique."""
+        station_ids = self.ordres if station_ids is None else [str(s) for s in station_ids]
+        return {station_id: self.flotte.mise_a_jour(station_id, int(self.ordres[station_id][-1]))
+                for station_id in station_ids
+                if station_id in self.ordres and len(self.ordres[station_id])}
+
+
+_INDEX: Optional[IndexTemporel] = None
+_INDEX_VERROU = threading.Lock()
+
+
+def get_index_temporel() -> IndexTemporel:
+    """Retourne l'index temporel de l'historique, reconstruit uniquement si l'historique compact a changé."""
+    global _INDEX
+
+    flotte = get_etats_compacts()
+    index = _INDEX
+    if index is not None and index.flotte is flotte:
+        return index
+    with _INDEX_VERROU:
+        if _INDEX is None or _INDEX.flotte is not flotte:
+            _INDEX = IndexTemporel(flotte)
+        return _INDEX
+
+
+def etat_flotte_a_date(date: str, station_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Raccourci de IndexTemporel.etat_flotte sur l'historique courant."""
+    return get_index_temporel().etat_flotte(date, station_ids)
+
+
+def etat_station_a_date(station_id: str, date: str) -> Optional[Dict[str, Any]]:
+    """Raccourci de IndexTemporel.etat_station sur l'historique courant."""
+    return get_index_temporel().etat_station(station_id, date)
@@ -0,0 +1,1194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Moteurs de stockage des stations et de l'historique des états des ouvrages.
+
+Moteurs disponibles :
+- StockageJSON : format historique (data/stations.json et data/etat_station.json)
+- StockageJournal : format JSON avec journal des mises à jour en ajout seul
+- StockageFragmente : un fichier d'historique par station (data/etats/<station_id>.json)
+- StockageSQLite : base SQLite indexée, adaptée aux flottes importantes
+
+Le moteur actif est choisi via la variable d'environnement STEP_STOCKAGE
+('json' par défaut, 'journal', 'fragmente' ou 'sqlite') ou par un appel à definir_stockage().
+Les fichiers JSON restent le format d'import/export entre moteurs.
+"""
+
+import os
+import re
+import json
+import shutil
+import sqlite3
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from collections.abc import MutableMapping
+from urllib.parse import quote, unquote
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+DOSSIER_DONNEES = 'data'
+
+
+def normaliser_etats(etats_data: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Normalise le contenu brut de etat_station.json.
+    Gère plusieurs formats de données pour assurer la rétrocompatibilité.
+
+    Args:
+        etats_data: Contenu JSON décodé du fichier des états
+
+    Returns:
+        Dictionnaire {station_id: [états]} avec des états complets
+    """
+    # Si le fichier est vide ou pas un dictionnaire
+    if not isinstance(etats_data, dict):
+        log.warning("Le fichier etat_station.json ne contient pas un objet JSON valide")
+        return {}
+
+    result = {}
+
+    for station_id, data in etats_data.items():
+        etats_list = normaliser_historique(station_id, data)
+        if etats_list:
+            result[station_id] = etats_list
+
+    return result
+
+
+def normaliser_historique(station_id: str, data: Any) -> List[Dict[str, Any]]:
+    """
+    Normalise l'historique brut d'une seule station.
+
+    Args:
+        station_id: ID de la station
+        data: Données brutes de la station (liste d'états ou état unique)
+
+    Returns:
+        Liste des états nettoyés (vide si aucune donnée exploitable)
+    """
+    if not data:
+        return []
+
+    etats_list = []
+
+    # Cas 1: Données dans une liste (format attendu)
+    if isinstance(data, list):
+        for item in data:
+            # Si l'item est un dictionnaire avec une liste d'états
+            if isinstance(item, dict) and station_id in item and isinstance(item[station_id], list):
+                etats_list.extend(item[station_id])
+            # Si l'item est directement un état
+            elif isinstance(item, dict):
+                etats_list.append(item)
+    # Cas 2: Données directes (ancien format)
+    elif isinstance(data, dict):
+        # Si c'est un état direct
+        if 'etat_ouvrages' in data or 'date' in data or 'date_maj' in data:
+            etats_list = [data]
+
+    # Nettoyer les données chargées
+    for etat in etats_list:
+        if not isinstance(etat, dict):
+            continue
+
+        # S'assurer que chaque état a un champ etat_ouvrages
+        if 'etat_ouvrages' not in etat:
+            etat['etat_ouvrages'] = {}
+        # S'assurer que etat_ouvrages est un dictionnaire
+        elif not isinstance(etat['etat_ouvrages'], dict):
+            try:
+                etat['etat_ouvrages'] = dict(etat['etat_ouvrages'])
+            except (TypeError, ValueError):
+                etat['etat_ouvrages'] = {}
+
+        # S'assurer que l'ID de station est présent
+        if 'station_id' not in etat:
+            etat['station_id'] = station_id
+
+        # S'assurer que la date de mise à jour existe
+        if 'date_maj' not in etat:
+            etat['date_maj'] = etat.get('date', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    return etats_list
+
+
+def signature_fichier(chemin: str) -> tuple:
+    """Signature (mtime en ns, taille) d'un fichier, (0, 0) s'il n'existe pas."""
+    try:
+        stat = os.stat(chemin)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return (0, 0)
+
+
+def bornes_dates(debut: Optional[str] = None, fin: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Bornes inclusives d'un filtre sur date_maj, comparables aux dates 'YYYY-MM-DD HH:MM:SS'.
+
+    Une date de fin sans heure couvre toute la journée.
+    """
+    if fin and len(fin) == 10:
+        fin = f"{fin} 23:59:59"
+    return debut or None, fin or None
+
+
+def _filtrer_historique(historique: List[Dict[str, Any]], debut: Optional[str],
+                        fin: Optional[str]) -> Iterator[Tuple[str, str, str]]:
+    """Aplatit un historique en (date_maj, ouvrage, etat) entre deux bornes inclusives."""
+    for etat in historique:
+        date_maj = str(etat.get('date_maj', ''))
+        if (debut and date_maj < debut) or (fin and date_maj > fin):
+            continue
+        etat_ouvrages = etat.get('etat_ouvrages')
+        if isinstance(etat_ouvrages, dict):
+            for ouvrage, valeur in etat_ouvrages.items():
+                yield date_maj, ouvrage, valeur
+
+
+_ESPACES = re.compile(r'\s*')
+
+
+def iterer_objet_json(texte: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Décode un objet JSON de premier niveau clé par clé.
+
+    Seule la valeur en cours est construite en mémoire : sur etat_station.json,
+    on obtient l'historique d'une station à la fois au lieu de toute la flotte.
+
+    Raises:
+        ValueError: Le texte n'est pas un objet JSON valide
+    """
+    decodeur = json.JSONDecoder()
+    position = _ESPACES.match(texte, 0).end()
+    if position == len(texte):
+        return
+    if texte[position] != '{':
+        raise ValueError("Objet JSON attendu")
+    position = _ESPACES.match(texte, position + 1).end()
+    if texte.startswith('}', position):
+        return
+    while True:
+        cle, position = decodeur.raw_decode(texte, position)
+        position = _ESPACES.match(texte, position).end()
+        if not texte.startswith(':', position):
+            raise ValueError(f"':' attendu à la position {position}")
+        position = _ESPACES.match(texte, position + 1).end()
+        valeur, position = decodeur.raw_decode(texte, position)
+        yield cle, valeur
+        position = _ESPACES.match(texte, position).end()
+        if texte.startswith('}', position):
+            return
+        if not texte.startswith(',', position):
+            raise ValueError(f"',' ou '}}' attendu à la position {position}")
+        position = _ESPACES.match(texte, position + 1).end()
+
+
+class MoteurStockage:
+    """
+    Interface commune des moteurs de stockage.
+
+    Les états sont toujours échangés sous la forme renvoyée par
+    charger_etats_station() : {station_id: [{'station_id', 'date_maj', 'etat_ouvrages'}]}.
+    """
+
+    nom = 'abstrait'
+
+    # True si charger_historique() ne lit que les données de la station demandée
+    lecture_par_station = False
+
+    # --- Stations ---
+    def lister_stations(self) -> List[Dict[str, Any]]:
+        """Retourne la liste ordonnée des stations."""
+        raise NotImplementedError
+
+    def enregistrer_stations(self, stations: List[Dict[str, Any]]) -> None:
+        """Remplace la liste complète des stations."""
+        raise NotImplementedError
+
+    def signature_stations(self) -> Any:
+        """
+        Retourne une valeur qui change à chaque modification des stations.
+        Utilisée pour valider les caches en mémoire.
+        """
+        raise NotImplementedError
+
+    # --- États des ouvrages ---
+    def signature_etats(self) -> Any:
+        """
+        Retourne une valeur qui change à chaque modification de l'historique,
+        ou None si le moteur ne permet pas de valider un cache.
+        """
+        return None
+
+    def charger_etats(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Retourne l'historique complet de toutes les stations."""
+        raise NotImplementedError
+
+    def charger_historique(self, station_id: str) -> List[Dict[str, Any]]:
+        """Retourne l'historique d'une seule station."""
+        return self.charger_etats().get(str(station_id), [])
+
+    def iterer_historiques(self, station_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Itère sur l'historique des stations, une station à la fois.
+
+        Args:
+            station_ids: Stations à lire (toutes si None)
+        """
+        if station_ids is not None:
+            for station_id in station_ids:
+                yield str(station_id), self.charger_historique(station_id)
+            return
+        for station_id, historique in self.charger_etats().items():
+            yield str(station_id), historique
+
+    def iterer_lignes_etats(self, station_ids: Optional[Iterable[str]] = None, debut: Optional[str] = None,
+                            fin: Optional[str] = None) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        Itère sur l'historique aplati en lignes (station_id, date_maj, ouvrage, etat).
+
+        Les filtres sont appliqués par le moteur, sans charger tout l'historique.
+
+        Args:
+            station_ids: Stations à exporter (toutes si None)
+            debut: Date de début incluse ('YYYY-MM-DD[ HH:MM:SS]')
+            fin: Date de fin incluse ('YYYY-MM-DD[ HH:MM:SS]')
+        """
+        debut, fin = bornes_dates(debut, fin)
+        for station_id, historique in self.iterer_historiques(station_ids):
+            for date_maj, ouvrage, etat in _filtrer_historique(historique, debut, fin):
+                yield station_id, date_maj, ouvrage, etat
+
+    def sauvegarder_etats(self, station_id: str, etats: List[Dict[str, Any]]) -> None:
+        """Remplace l'historique complet d'une station."""
+        raise NotImplementedError
+
+    def sauvegarder_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Remplace l'historique de plusieurs stations en une seule opération."""
+        for station_id, etats in etats_par_station.items():
+            self.sauvegarder_etats(station_id, etats)
+
+    def remplacer_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Remplace tout l'historique du moteur : les stations absentes de etats_par_station perdent le leur."""
+        absentes = {station_id for station_id, _ in self.iterer_historiques()}
+        absentes.difference_update(str(station_id) for station_id in etats_par_station)
+        self.sauvegarder_tous_etats(dict({station_id: [] for station_id in absentes}, **{
+            str(station_id): etats for station_id, etats in etats_par_station.items()
+        }))
+
+    def ajouter_mise_a_jour(self, station_id: str, etat: Dict[str, Any]) -> None:
+        """Ajoute une mise à jour à la fin de l'historique d'une station."""
+        historique = list(self.charger_historique(station_id))
+        historique.append(etat)
+        self.sauvegarder_etats(station_id, historique)
+
+    def ajouter_mises_a_jour(self, mises_a_jour_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Ajoute des mises à jour à la fin de l'historique de plusieurs stations en une seule opération."""
+        self.sauvegarder_tous_etats({
+            str(station_id): list(self.charger_historique(station_id)) + list(etats)
+            for station_id, etats in mises_a_jour_par_station.items()
+        })
+
+    def supprimer_station(self, station_id: str) -> None:
+        """Supprime une station et tout son historique."""
+        raise NotImplementedError
+
+    def fermer(self) -> None:
+        """Libère les ressources éventuelles du moteur."""
+        pass
+
+
+class StockageJSON(MoteurStockage):
+    """Moteur historique : un fichier stations.json et un fichier etat_station.json."""
+
+    nom = 'json'
+
+    def __init__(self, dossier: str = DOSSIER_DONNEES):
+        self.dossier = dossier
+        self.fichier_stations = os.path.join(dossier, 'stations.json')
+        self.fichier_etats = os.path.join(dossier, 'etat_station.json')
+
+    def _ecrire_atomique(self, chemin: str, donnees: Any, indent: int = 2) -> None:
+        """Écrit un fichier JSON via un fichier temporaire puis le remplace."""
+        os.makedirs(os.path.dirname(chemin) or '.', exist_ok=True)
+
+        # Créer un fichier temporaire avec un nom unique
+        base = os.path.splitext(os.path.basename(chemin))[0]
+        temp_file = os.path.join(os.path.dirname(chemin), f'{base}_{os.getpid()}_{int(time.time())}.tmp')
+
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(donnees, f, ensure_ascii=False, indent=indent, default=str)
+
+            # Vérifier que le fichier temporaire a été correctement écrit
+            if not os.path.exists(temp_file) or os.path.getsize(temp_file) == 0:
+                raise IOError("Le fichier temporaire n'a pas été correctement écrit")
+
+            # Remplacer l'ancien fichier par le nouveau
+            shutil.move(temp_file, chemin)
+        except Exception:
+            # Essayer de supprimer le fichier temporaire en cas d'erreur
+            try:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+            except OSError as e2:
+                log.error(f"Impossible de supprimer le fichier temporaire {temp_file}: {e2}")
+            raise
+
+    # --- Stations ---
+    def lister_stations(self) -> List[Dict[str, Any]]:
+        # Si le fichier n'existe pas, le créer avec une liste vide
+        if not os.path.exists(self.fichier_stations):
+            os.makedirs(self.dossier, exist_ok=True)
+            with open(self.fichier_stations, 'w', encoding='utf-8') as f:
+                json.dump([], f, ensure_ascii=False, indent=2)
+            return []
+
+        with open(self.fichier_stations, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def enregistrer_stations(self, stations: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.dossier, exist_ok=True)
+        with open(self.fichier_stations, 'w', encoding='utf-8') as f:
+            json.dump(stations, f, ensure_ascii=False, indent=2)
+
+    def signature_stations(self) -> Any:
+        try:
+            return os.path.getmtime(self.fichier_stations)
+        except OSError:
+            return 0
+
+    # --- États des ouvrages ---
+    def signature_etats(self) -> Any:
+        return signature_fichier(self.fichier_etats)
+
+    def _lire_etats_bruts(self) -> Any:
+        """Lit le contenu brut de etat_station.json."""
+        if not os.path.exists(self.fichier_etats):
+            return {}
+        with open(self.fichier_etats, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def charger_etats(self) -> Dict[str, List[Dict[str, Any]]]:
+        return normaliser_etats(self._lire_etats_bruts())
+
+    def _lire_texte_etats(self) -> str:
+        """Lit le texte de etat_station.json (chaîne vide s'il n'existe pas)."""
+        if not os.path.exists(self.fichier_etats):
+            return ''
+        with open(self.fichier_etats, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def _iterer_etats_bruts(self) -> Iterator[Tuple[str, Any]]:
+        """Décode etat_station.json station par station (voir iterer_objet_json)."""
+        yield from iterer_objet_json(self._lire_texte_etats())
+
+    def iterer_historiques(self, station_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        retenues = None if station_ids is None else {str(station_id) for station_id in station_ids}
+        for station_id, donnees in self._iterer_etats_bruts():
+            if retenues is None or station_id in retenues:
+                historique = normaliser_historique(station_id, donnees)
+                if historique:
+                    yield station_id, historique
+
+    def sauvegarder_etats(self, station_id: str, etats: List[Dict[str, Any]]) -> None:
+        self.sauvegarder_tous_etats({str(station_id): etats})
+
+    def sauvegarder_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        etats_data = self.charger_etats()
+        for station_id, etats in etats_par_station.items():
+            etats_data[str(station_id)] = etats
+        self._ecrire_atomique(self.fichier_etats, etats_data)
+        log.info(f"Fichier {self.fichier_etats} mis à jour avec succès")
+
+    def remplacer_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Le fichier est réécrit en entier, sans relire l'historique existant
+        self._ecrire_atomique(self.fichier_etats, {
+            str(station_id): etats for station_id, etats in etats_par_station.items()
+        })
+        log.info(f"Fichier {self.fichier_etats} remplacé")
+
+    def ajouter_mises_a_jour(self, mises_a_jour_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Historique lu une seule fois pour toutes les stations
+        etats_data = self.charger_etats()
+        for station_id, etats in mises_a_jour_par_station.items():
+            etats_data.setdefault(str(station_id), []).extend(etats)
+        self._ecrire_atomique(self.fichier_etats, etats_data)
+        log.info(f"Fichier {self.fichier_etats} mis à jour avec succès")
+
+    def supprimer_station(self, station_id: str) -> None:
+        stations = [s for s in self.lister_stations() if s.get('id') != station_id]
+        self.enregistrer_stations(stations)
+
+        etats_data = self._lire_etats_bruts()
+        if isinstance(etats_data, dict) and station_id in etats_data:
+            del etats_data[station_id]
+            self._ecrire_atomique(self.fichier_etats, etats_data)
+
+
+class StockageJournal(StockageJSON):
+    """
+    Moteur JSON avec journal en ajout seul.
+
+    Chaque écriture d'état ajoute une ligne JSON à etat_station.journal.jsonl
+    au lieu de réécrire tout etat_station.json. Les lecteurs rejouent le journal
+    par-dessus l'instantané, et une compaction (déclenchée en arrière-plan quand
+    le journal grossit) réécrit l'instantané puis vide le journal.
+
+    Chaque entrée porte un numéro de séquence croissant ('seq') et l'instantané
+    mémorise (clé CLE_SEQUENCE) le plus grand numéro qu'il intègre : une entrée
+    déjà intégrée n'est jamais rejouée, même si la compaction a été interrompue
+    avant de supprimer le journal figé.
+    """
+
+    nom = 'journal'
+
+    # Taille du journal (en octets) au-delà de laquelle une compaction est lancée
+    SEUIL_COMPACTION = 4 * 1024 * 1024
+    # Clé de l'instantané portant le dernier numéro de séquence intégré
+    # (ignorée par normaliser_etats, qui n'y trouve aucun état)
+    CLE_SEQUENCE = '_journal_sequence'
+
+    def __init__(self, dossier: str = DOSSIER_DONNEES, durable: bool = True,
+                 seuil_compaction: Optional[int] = None):
+        super().__init__(dossier)
+        self.fichier_journal = os.path.join(dossier, 'etat_station.journal.jsonl')
+        # Journal figé pendant une compaction (les nouveaux ajouts vont dans fichier_journal)
+        self.fichier_journal_compaction = self.fichier_journal + '.compaction'
+        self.durable = durable
+        self.seuil_compaction = self.SEUIL_COMPACTION if seuil_compaction is None else seuil_compaction
+        self._verrou = threading.Lock()
+        # Tenu par les lecteurs pendant la lecture de l'instantané et des journaux,
+        # et par la compaction quand elle fige le journal ou remplace l'instantané
+        self._verrou_lecture = threading.Lock()
+        self._verrou_compaction = threading.Lock()
+        self._thread_compaction = None
+        self._sequence = 0
+
+    # --- Journal ---
+    def _ajouter_entree(self, entree: Dict[str, Any]) -> None:
+        """Ajoute une entrée au journal (une ligne JSON), avec fsync si durable."""
+        self._ajouter_entrees([entree])
+
+    def _ajouter_entrees(self, entrees: List[Dict[str, Any]]) -> None:
+        """Ajoute plusieurs entrées au journal en une seule écriture (un seul fsync)."""
+        with self._verrou:
+            # Numéros croissants, calés sur l'horloge pour rester ordonnés entre processus
+            for entree in entrees:
+                self._sequence = max(time.time_ns(), self._sequence + 1)
+                entree['seq'] = self._sequence
+            lignes = ''.join(json.dumps(entree, ensure_ascii=False, default=str) + '\n' for entree in entrees)
+            os.makedirs(self.dossier, exist_ok=True)
+            with open(self.fichier_journal, 'a', encoding='utf-8') as f:
+                f.write(lignes)
+                if self.durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            taille = os.path.getsize(self.fichier_journal)
+
+        if self.seuil_compaction and taille >= self.seuil_compaction:
+            self.compacter_en_arriere_plan()
+
+    def _lire_journal(self, chemin: str):
+        """Itère sur les entrées valides d'un fichier journal."""
+        if not os.path.exists(chemin):
+            return
+        with open(chemin, 'r', encoding='utf-8') as f:
+            for numero, ligne in enumerate(f, 1):
+                ligne = ligne.strip()
+                if not ligne:
+                    continue
+                try:
+                    yield json.loads(ligne)
+                except json.JSONDecodeError:
+                    # Ligne tronquée (arrêt brutal pendant une écriture) : on l'ignore
+                    log.warning(f"Entrée de journal illisible ignorée ({chemin}, ligne {numero})")
+
+    def _entrees_journal(self):
+        """Itère sur toutes les entrées des journaux, dans l'ordre d'écriture."""
+        yield from self._lire_journal(self.fichier_journal_compaction)
+        yield from self._lire_journal(self.fichier_journal)
+
+    @classmethod
+    def _extraire_sequence(cls, etats_bruts: Any) -> int:
+        """Retire de l'instantané brut son numéro de séquence (0 s'il n'en a pas)."""
+        if not isinstance(etats_bruts, dict):
+            return 0
+        sequence = etats_bruts.pop(cls.CLE_SEQUENCE, 0)
+        return sequence if isinstance(sequence, int) else 0
+
+    @staticmethod
+    def _a_rejouer(entree: Dict[str, Any], sequence: int) -> bool:
+        """Indique si une entrée n'est pas déjà intégrée à l'instantané (entrées sans numéro : toujours)."""
+        numero = entree.get('seq')
+        return not isinstance(numero, int) or numero > sequence
+
+    def _lire_etat_courant(self) -> Tuple[Any, List[Dict[str, Any]]]:
+        """Lit ensemble l'instantané brut et les entrées du journal, sans compaction intercalée."""
+        with self._verrou_lecture:
+            return self._lire_etats_bruts(), list(self._entrees_journal())
+
+    @staticmethod
+    def _appliquer(etats: Dict[str, List[Dict[str, Any]]], entree: Dict[str, Any]) -> None:
+        """Applique une entrée du journal à un historique déjà chargé."""
+        operation = entree.get('op')
+        station_id = str(entree.get('station_id', ''))
+        if not station_id:
+            return
+
+        if operation == 'ajout':
+            etat = normaliser_historique(station_id, [entree.get('etat') or {}])
+            if not etat:
+                return
+            etats.setdefault(station_id, []).append(etat[0])
+        elif operation == 'remplacement':
+            historique = normaliser_historique(station_id, entree.get('etats') or [])
+            if historique:
+                etats[station_id] = historique
+            else:
+                etats.pop(station_id, None)
+        elif operation == 'suppression':
+            etats.pop(station_id, None)
+        else:
+            log.warning(f"Opération de journal inconnue ignorée: {operation}")
+
+    # --- États des ouvrages ---
+    def signature_etats(self) -> Any:
+        return (
+            signature_fichier(self.fichier_etats),
+            signature_fichier(self.fichier_journal_compaction),
+            signature_fichier(self.fichier_journal),
+        )
+
+    def charger_etats(self) -> Dict[str, List[Dict[str, Any]]]:
+        etats_data, entrees = self._lire_etat_courant()
+        sequence = self._extraire_sequence(etats_data)
+        etats = normaliser_etats(etats_data)
+        for entree in entrees:
+            if self._a_rejouer(entree, sequence):
+                self._appliquer(etats, entree)
+        return etats
+
+    def charger_historique(self, station_id: str) -> List[Dict[str, Any]]:
+        station_id = str(station_id)
+        etats_data, entrees = self._lire_etat_courant()
+        sequence = self._extraire_sequence(etats_data)
+        donnees = etats_data.get(station_id) if isinstance(etats_data, dict) else None
+        etats = {station_id: normaliser_historique(station_id, donnees)}
+        for entree in entrees:
+            if str(entree.get('station_id', '')) == station_id and self._a_rejouer(entree, sequence):
+                self._appliquer(etats, entree)
+        return etats.get(station_id, [])
+
+    def iterer_historiques(self, station_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        retenues = None if station_ids is None else {str(station_id) for station_id in station_ids}
+        with self._verrou_lecture:
+            texte = self._lire_texte_etats()
+            entrees = list(self._entrees_journal())
+
+        # Le journal (borné par la compaction) est regroupé par station, puis rejoué
+        # sur l'instantané au fil de sa lecture
+        entrees_par_station = {}
+        for entree in entrees:
+            station_id = str(entree.get('station_id', ''))
+            if station_id and (retenues is None or station_id in retenues):
+                entrees_par_station.setdefault(station_id, []).append(entree)
+        # Le numéro de séquence est la première clé de l'instantané (voir compacter)
+        sequence = 0
+
+        def _rejouer(station_id, donnees):
+            etats = {station_id: normaliser_historique(station_id, donnees)}
+            for entree in entrees_par_station.pop(station_id, []):
+                if self._a_rejouer(entree, sequence):
+                    self._appliquer(etats, entree)
+            return etats.get(station_id)
+
+        for station_id, donnees in iterer_objet_json(texte):
+            if station_id == self.CLE_SEQUENCE:
+                sequence = self._extraire_sequence({station_id: donnees})
+            elif retenues is None or station_id in retenues:
+                historique = _rejouer(station_id, donnees)
+                if historique:
+                    yield station_id, historique
+        # Stations présentes uniquement dans le journal
+        for station_id in list(entrees_par_station):
+            historique = _rejouer(station_id, None)
+            if historique:
+                yield station_id, historique
+
+    def ajouter_mise_a_jour(self, station_id: str, etat: Dict[str, Any]) -> None:
+        self._ajouter_entree({'op': 'ajout', 'station_id': str(station_id), 'etat': etat})
+
+    def ajouter_mises_a_jour(self, mises_a_jour_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        self._ajouter_entrees([
+            {'op': 'ajout', 'station_id': str(station_id), 'etat': etat}
+            for station_id, etats in mises_a_jour_par_station.items()
+            for etat in etats
+        ])
+
+    def sauvegarder_etats(self, station_id: str, etats: List[Dict[str, Any]]) -> None:
+        self._ajouter_entree({'op': 'remplacement', 'station_id': str(station_id), 'etats': etats})
+
+    def sauvegarder_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        for station_id, etats in etats_par_station.items():
+            self.sauvegarder_etats(station_id, etats)
+
+    def remplacer_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Nouvel instantané complet ; les journaux, qu'il remplace, sont supprimés
+        with self._verrou_compaction, self._verrou, self._verrou_lecture:
+            self._sequence = max(time.time_ns(), self._sequence + 1)
+            instantane = {self.CLE_SEQUENCE: self._sequence}
+            instantane.update((str(station_id), etats) for station_id, etats in etats_par_station.items())
+            self._ecrire_atomique(self.fichier_etats, instantane)
+            for chemin in (self.fichier_journal_compaction, self.fichier_journal):
+                if os.path.exists(chemin):
+                    os.remove(chemin)
+
+    def supprimer_station(self, station_id: str) -> None:
+        stations = [s for s in self.lister_stations() if s.get('id') != station_id]
+        self.enregistrer_stations(stations)
+        self._ajouter_entree({'op': 'suppression', 'station_id': str(station_id)})
+
+    # --- Compaction ---
+    def compacter(self) -> int:
+        """
+        Réécrit l'instantané etat_station.json à partir du journal puis le vide.
+
+        L'instantané écrit porte le numéro de séquence de la dernière entrée
+        intégrée : si le processus s'arrête avant la suppression du journal
+        figé, la compaction suivante (comme les lecteurs) ignore ces entrées.
+
+        Returns:
+            int: Nombre d'entrées de journal intégrées à l'instantané
+        """
+        with self._verrou_compaction:
+            nb_entrees = 0
+            # Deux passes au plus : un journal figé laissé par une compaction
+            # interrompue, puis le journal courant
+            for _ in range(2):
+                # Figer le journal courant : les nouveaux ajouts repartent dans un journal vide
+                with self._verrou, self._verrou_lecture:
+                    reprise = os.path.exists(self.fichier_journal_compaction)
+                    if not reprise:
+                        if not os.path.exists(self.fichier_journal):
+                            break
+                        os.replace(self.fichier_journal, self.fichier_journal_compaction)
+
+                # Seule la compaction réécrit l'instantané : le lire ici sans verrou est sûr
+                etats_data = self._lire_etats_bruts()
+                sequence = self._extraire_sequence(etats_data)
+                etats = normaliser_etats(etats_data)
+                for entree in self._lire_journal(self.fichier_journal_compaction):
+                    if self._a_rejouer(entree, sequence):
+                        self._appliquer(etats, entree)
+                        nb_entrees += 1
+                        if isinstance(entree.get('seq'), int):
+                            sequence = max(sequence, entree['seq'])
+
+                # Numéro de séquence en première clé, pour les lectures station par station
+                instantane = {self.CLE_SEQUENCE: sequence}
+                instantane.update(etats)
+                with self._verrou_lecture:
+                    self._ecrire_atomique(self.fichier_etats, instantane)
+                    os.remove(self.fichier_journal_compaction)
+                with self._verrou:
+                    self._sequence = max(self._sequence, sequence)
+
+                if not reprise:
+                    break
+
+            log.info(f"Compaction du journal terminée ({nb_entrees} entrée(s) intégrée(s))")
+            return nb_entrees
+
+    def compacter_en_arriere_plan(self) -> None:
+        """Lance la compaction dans un thread si aucune n'est déjà en cours."""
+        if self._thread_compaction is not None and self._thread_compaction.is_alive():
+            return
+
+        def _executer():
+            try:
+                self.compacter()
+            except Exception as e:
+                log.error(f"Erreur lors de la compaction du journal: {e}")
+
+        self._thread_compaction = threading.Thread(target=_executer, name='compaction-journal', daemon=True)
+        self._thread_compaction.start()
+
+    def fermer(self) -> None:
+        if self._thread_compaction is not None:
+            self._thread_compaction.join()
+
+
+class EtatsFragmentes(MutableMapping):
+    """
+    Vue paresseuse {station_id: [états]} sur les fichiers data/etats/<station_id>.json.
+
+    L'historique d'une station n'est lu et normalisé qu'au premier accès.
+    Les modifications faites sur la vue restent en mémoire.
+    """
+
+    def __init__(self, moteur: 'StockageFragmente', station_ids: List[str]):
+        self._moteur = moteur
+        self._station_ids = list(station_ids)
+        self._charges = {}
+
+    def __getitem__(self, station_id):
+        if station_id not in self._charges:
+            if station_id not in self._station_ids:
+                raise KeyError(station_id)
+            self._charges[station_id] = self._moteur.charger_historique(station_id)
+        return self._charges[station_id]
+
+    def __setitem__(self, station_id, etats):
+        if station_id not in self._station_ids:
+            self._station_ids.append(station_id)
+        self._charges[station_id] = etats
+
+    def __delitem__(self, station_id):
+        if station_id not in self._station_ids:
+            raise KeyError(station_id)
+        self._station_ids.remove(station_id)
+        self._charges.pop(station_id, None)
+
+    def __iter__(self):
+        return iter(list(self._station_ids))
+
+    def __len__(self):
+        return len(self._station_ids)
+
+    def __repr__(self):
+        return f"EtatsFragmentes({len(self._station_ids)} station(s), {len(self._charges)} chargée(s))"
+
+
+class StockageFragmente(StockageJSON):
+    """
+    Moteur JSON fragmenté : un fichier d'historique par station (data/etats/<station_id>.json).
+
+    Lire ou écrire l'historique d'une station ne touche que son propre fichier,
+    quelle que soit la taille de la flotte. La liste des stations reste dans stations.json.
+    """
+
+    nom = 'fragmente'
+    lecture_par_station = True
+
+    def __init__(self, dossier: str = DOSSIER_DONNEES):
+        super().__init__(dossier)
+        self.dossier_etats = os.path.join(dossier, 'etats')
+
+    def chemin_station(self, station_id: str) -> str:
+        """Chemin du fichier d'historique d'une station."""
+        return os.path.join(self.dossier_etats, quote(str(station_id), safe='-_.') + '.json')
+
+    def lister_ids_etats(self) -> List[str]:
+        """IDs des stations possédant un fichier d'historique."""
+        if not os.path.isdir(self.dossier_etats):
+            return []
+        return sorted(
+            unquote(entree.name[:-len('.json')])
+            for entree in os.scandir(self.dossier_etats)
+            if entree.is_file() and entree.name.endswith('.json')
+        )
+
+    # --- États des ouvrages ---
+    def signature_etats(self) -> Any:
+        # Chaque écriture remplace un fichier par renommage, ce qui modifie le dossier
+        return signature_fichier(self.dossier_etats)
+
+    def charger_etats(self) -> MutableMapping:
+        return EtatsFragmentes(self, self.lister_ids_etats())
+
+    def iterer_historiques(self, station_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        # Un fichier lu à la fois
+        return MoteurStockage.iterer_historiques(self, station_ids)
+
+    def charger_historique(self, station_id: str) -> List[Dict[str, Any]]:
+        chemin = self.chemin_station(station_id)
+        if not os.path.exists(chemin):
+            return []
+        with open(chemin, 'r', encoding='utf-8') as f:
+            return normaliser_historique(str(station_id), json.load(f))
+
+    def sauvegarder_etats(self, station_id: str, etats: List[Dict[str, Any]]) -> None:
+        self._ecrire_atomique(self.chemin_station(station_id), etats)
+
+    def sauvegarder_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        for station_id, etats in etats_par_station.items():
+            self.sauvegarder_etats(station_id, etats)
+
+    def remplacer_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        station_ids = {str(station_id) for station_id in etats_par_station}
+        for station_id in self.lister_ids_etats():
+            if station_id not in station_ids:
+                os.remove(self.chemin_station(station_id))
+        self.sauvegarder_tous_etats(etats_par_station)
+
+    def ajouter_mises_a_jour(self, mises_a_jour_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Seuls les fichiers des stations concernées sont lus et réécrits
+        MoteurStockage.ajouter_mises_a_jour(self, mises_a_jour_par_station)
+
+    def supprimer_station(self, station_id: str) -> None:
+        stations = [s for s in self.lister_stations() if s.get('id') != station_id]
+        self.enregistrer_stations(stations)
+        chemin = self.chemin_station(station_id)
+        if os.path.exists(chemin):
+            os.remove(chemin)
+
+
+def fragmenter_etats(dossier: str = DOSSIER_DONNEES) -> Dict[str, int]:
+    """
+    Convertit etat_station.json (fichier unique) en fichiers par station data/etats/<station_id>.json.
+    Le fichier d'origine est conservé.
+
+    Returns:
+        dict: Nombre de stations et de mises à jour converties
+    """
+    source = StockageJSON(dossier)
+    cible = StockageFragmente(dossier)
+    etats = source.charger_etats()
+    cible.sauvegarder_tous_etats(etats)
+    return {
+        'stations': len(etats),
+        'mises_a_jour': sum(len(v) for v in etats.values())
+    }
+
+
+class StockageSQLite(MoteurStockage):
+    """
+    Moteur SQLite : tables stations, mises_a_jour et etats_ouvrages.
+
+    L'index (station_id, date_maj) rend la lecture et l'écriture de
+    l'historique d'une station indépendantes de la taille de la flotte.
+    """
+
+    nom = 'sqlite'
+    lecture_par_station = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            cle TEXT PRIMARY KEY,
+            valeur INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS stations (
+            id TEXT PRIMARY KEY,
+            rang INTEGER NOT NULL,
+            nom TEXT,
+            type_procede TEXT,
+            donnees TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS mises_a_jour (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            station_id TEXT NOT NULL,
+            rang INTEGER NOT NULL,
+            date_maj TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS etats_ouvrages (
+            maj_id INTEGER NOT NULL REFERENCES mises_a_jour(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            ouvrage TEXT NOT NULL,
+            etat TEXT NOT NULL,
+            PRIMARY KEY (maj_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_stations_rang ON stations(rang);
+        CREATE INDEX IF NOT EXISTS idx_maj_station_date ON mises_a_jour(station_id, date_maj);
+        CREATE INDEX IF NOT EXISTS idx_maj_station_rang ON mises_a_jour(station_id, rang);
+    """
+
+    def __init__(self, chemin: Optional[str] = None):
+        self.chemin = chemin or os.path.join(DOSSIER_DONNEES, 'stations.db')
+        self._connexion = None
+        self._pid = None
+
+    @property
+    def connexion(self) -> sqlite3.Connection:
+        """Connexion ouverte à la demande (et rouverte après un fork)."""
+        if self._connexion is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.chemin) or '.', exist_ok=True)
+            self._connexion = sqlite3.connect(self.chemin)
+            self._connexion.execute('PRAGMA foreign_keys = ON')
+            self._connexion.execute('PRAGMA journal_mode = WAL')
+            self._connexion.executescript(self.SCHEMA)
+            self._pid = os.getpid()
+        return self._connexion
+
+    def _incrementer_version(self, cle: str) -> None:
+        self.connexion.execute(
+            "INSERT INTO meta (cle, valeur) VALUES (?, 1) "
+            "ON CONFLICT(cle) DO UPDATE SET valeur = valeur + 1",
+            (cle,)
+        )
+
+    def _lire_version(self, cle: str) -> int:
+        ligne = self.connexion.execute("SELECT valeur FROM meta WHERE cle = ?", (cle,)).fetchone()
+        return ligne[0] if ligne else 0
+
+    # --- Stations ---
+    def lister_stations(self) -> List[Dict[str, Any]]:
+        lignes = self.connexion.execute("SELECT donnees FROM stations ORDER BY rang").fetchall()
+        return [json.loads(donnees) for (donnees,) in lignes]
+
+    def enregistrer_stations(self, stations: List[Dict[str, Any]]) -> None:
+        with self.connexion as cnx:
+            cnx.execute("DELETE FROM stations")
+            cnx.executemany(
+                "INSERT OR REPLACE INTO stations (id, rang, nom, type_procede, donnees) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (str(s.get('id', i)), i, s.get('nom'), s.get('type_procede'),
+                     json.dumps(s, ensure_ascii=False, default=str))
+                    for i, s in enumerate(stations)
+                ]
+            )
+            self._incrementer_version('version_stations')
+
+    def signature_stations(self) -> Any:
+        return self._lire_version('version_stations')
+
+    # --- États des ouvrages ---
+    def signature_etats(self) -> Any:
+        return self._lire_version('version_etats')
+
+    def _construire_etats(self, lignes) -> Dict[str, List[Dict[str, Any]]]:
+        """Regroupe les lignes (station_id, maj_id, date_maj, ouvrage, etat) en historiques."""
+        result = {}
+        courant_id = None
+        for station_id, maj_id, date_maj, ouvrage, etat in lignes:
+            if maj_id != courant_id:
+                courant = {'station_id': station_id, 'date_maj': date_maj, 'etat_ouvrages': {}}
+                result.setdefault(station_id, []).append(courant)
+                courant_id = maj_id
+            if ouvrage is not None:
+                courant['etat_ouvrages'][ouvrage] = etat
+        return result
+
+    def charger_etats(self) -> Dict[str, List[Dict[str, Any]]]:
+        lignes = self.connexion.execute(
+            "SELECT m.station_id, m.id, m.date_maj, e.ouvrage, e.etat "
+            "FROM mises_a_jour m LEFT JOIN etats_ouvrages e ON e.maj_id = m.id "
+            "ORDER BY m.station_id, m.rang, e.position"
+        )
+        return self._construire_etats(lignes)
+
+    def charger_historique(self, station_id: str) -> List[Dict[str, Any]]:
+        lignes = self.connexion.execute(
+            "SELECT m.station_id, m.id, m.date_maj, e.ouvrage, e.etat "
+            "FROM mises_a_jour m LEFT JOIN etats_ouvrages e ON e.maj_id = m.id "
+            "WHERE m.station_id = ? ORDER BY m.rang, e.position",
+            (str(station_id),)
+        )
+        return self._construire_etats(lignes).get(str(station_id), [])
+
+    def iterer_lignes_etats(self, station_ids: Optional[Iterable[str]] = None, debut: Optional[str] = None,
+                            fin: Optional[str] = None) -> Iterator[Tuple[str, str, str, str]]:
+        # Filtres traduits en SQL (index station_id, date_maj), lignes lues au fil du curseur
+        debut, fin = bornes_dates(debut, fin)
+        conditions = []
+        parametres = []
+        if station_ids is not None:
+            station_ids = [str(station_id) for station_id in station_ids]
+            if not station_ids:
+                return
+            conditions.append(f"m.station_id IN ({', '.join('?' * len(station_ids))})")
+            parametres.extend(station_ids)
+        if debut:
+            conditions.append("m.date_maj >= ?")
+            parametres.append(debut)
+        if fin:
+            conditions.append("m.date_maj <= ?")
+            parametres.append(fin)
+        requete = (
+            "SELECT m.station_id, m.date_maj, e.ouvrage, e.etat "
+            "FROM mises_a_jour m JOIN etats_ouvrages e ON e.maj_id = m.id "
+            + (f"WHERE {' AND '.join(conditions)} " if conditions else "")
+            + "ORDER BY m.station_id, m.rang, e.position"
+        )
+        curseur = self.connexion.execute(requete, parametres)
+        try:
+            while True:
+                lignes = curseur.fetchmany(10000)
+                if not lignes:
+                    break
+                yield from lignes
+        finally:
+            curseur.close()
+
+    def _inserer_etat(self, cnx: sqlite3.Connection, station_id: str, rang: int, etat: Dict[str, Any]) -> None:
+        """Insère une mise à jour et ses états d'ouvrages (sans commit)."""
+        date_maj = etat.get('date_maj') or etat.get('date') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        curseur = cnx.execute(
+            "INSERT INTO mises_a_jour (station_id, rang, date_maj) VALUES (?, ?, ?)",
+            (station_id, rang, str(date_maj))
+        )
+        maj_id = curseur.lastrowid
+        etat_ouvrages = etat.get('etat_ouvrages') or {}
+        if isinstance(etat_ouvrages, dict):
+            cnx.executemany(
+                "INSERT INTO etats_ouvrages (maj_id, position, ouvrage, etat) VALUES (?, ?, ?, ?)",
+                [(maj_id, i, str(k), str(v)) for i, (k, v) in enumerate(etat_ouvrages.items())]
+            )
+
+    def sauvegarder_etats(self, station_id: str, etats: List[Dict[str, Any]]) -> None:
+        self.sauvegarder_tous_etats({str(station_id): etats})
+
+    def sauvegarder_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        with self.connexion as cnx:
+            for station_id, etats in etats_par_station.items():
+                station_id = str(station_id)
+                cnx.execute("DELETE FROM mises_a_jour WHERE station_id = ?", (station_id,))
+                for rang, etat in enumerate(etats):
+                    if isinstance(etat, dict):
+                        self._inserer_etat(cnx, station_id, rang, etat)
+            self._incrementer_version('version_etats')
+
+    def remplacer_tous_etats(self, etats_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        with self.connexion as cnx:
+            cnx.execute("DELETE FROM mises_a_jour")
+            for station_id, etats in etats_par_station.items():
+                for rang, etat in enumerate(etats):
+                    if isinstance(etat, dict):
+                        self._inserer_etat(cnx, str(station_id), rang, etat)
+            self._incrementer_version('version_etats')
+
+    def ajouter_mise_a_jour(self, station_id: str, etat: Dict[str, Any]) -> None:
+        station_id = str(station_id)
+        with self.connexion as cnx:
+            rang = cnx.execute(
+                "SELECT COALESCE(MAX(rang) + 1, 0) FROM mises_a_jour WHERE station_id = ?",
+                (station_id,)
+            ).fetchone()[0]
+            self._inserer_etat(cnx, station_id, rang, etat)
+            self._incrementer_version('version_etats')
+
+    def ajouter_mises_a_jour(self, mises_a_jour_par_station: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Une seule transaction pour toutes les stations
+        with self.connexion as cnx:
+            for station_id, etats in mises_a_jour_par_station.items():
+                station_id = str(station_id)
+                rang = cnx.execute(
+                    "SELECT COALESCE(MAX(rang) + 1, 0) FROM mises_a_jour WHERE station_id = ?",
+                    (station_id,)
+                ).fetchone()[0]
+                for decalage, etat in enumerate(etats):
+                    self._inserer_etat(cnx, station_id, rang + decalage, etat)
+            self._incrementer_version('version_etats')
+
+    def supprimer_station(self, station_id: str) -> None:
+        with self.connexion as cnx:
+            cnx.execute("DELETE FROM stations WHERE id = ?", (str(station_id),))
+            cnx.execute("DELETE FROM mises_a_jour WHERE station_id = ?", (str(station_id),))
+            self._incrementer_version('version_stations')
+            self._incrementer_version('version_etats')
+
+    def fermer(self) -> None:
+        if self._connexion is not None and self._pid == os.getpid():
+            self._connexion.close()
+        self._connexion = None
+
+
+# --- Sélection du moteur actif ---
+MOTEURS = {
+    'json': StockageJSON,
+    'journal': StockageJournal,
+    'fragmente': StockageFragmente,
+    'sqlite': StockageSQLite,
+}
+
+_STOCKAGE = None
+
+
+def creer_stockage(nom: str, **options) -> MoteurStockage:
+    """
+    Instancie un moteur de stockage à partir de son nom.
+
+    Args:
+        nom: Nom du moteur ('json', 'sqlite')
+        **options: Paramètres transmis au constructeur du moteur
+
+    Returns:
+        Le moteur instancié
+    """
+    if nom not in MOTEURS:
+        raise ValueError(f"Moteur de stockage inconnu: {nom} (disponibles: {', '.join(MOTEURS)})")
+    return MOTEURS[nom](**options)
+
+
+def get_stockage() -> MoteurStockage:
+    """Retourne le moteur de stockage actif (créé au premier appel)."""
+    global _STOCKAGE
+    if _STOCKAGE is None:
+        nom = os.environ.get('STEP_STOCKAGE', 'json').strip().lower()
+        options = {}
+        if nom == 'sqlite' and os.environ.get('STEP_BASE_SQLITE'):
+            options['chemin'] = os.environ['STEP_BASE_SQLITE']
+        _STOCKAGE = creer_stockage(nom, **options)
+    return _STOCKAGE
+
+
+def definir_stockage(moteur: MoteurStockage) -> None:
+    """Remplace le moteur de stockage actif."""
+    global _STOCKAGE
+    if _STOCKAGE is not None and _STOCKAGE is not moteur:
+        _STOCKAGE.fermer()
+    _STOCKAGE = moteur
+
+
+def copier_stockage(source: MoteurStockage, cible: MoteurStockage) -> Dict[str, int]:
+    """
+    Copie les stations et l'historique complet d'un moteur vers un autre.
+    Sert à l'import et à l'export au format JSON.
+
+    Returns:
+        dict: Nombre de stations et de mises à jour copiées
+    """
+    stations = source.lister_stations()
+    etats = source.charger_etats()
+    cible.enregistrer_stations(stations)
+    # Copie fidèle : l'historique des stations absentes de la source ne subsiste pas dans la cible
+    cible.remplacer_tous_etats(etats)
+    return {
+        'stations': len(stations),
+        'mises_a_jour': sum(len(v) for v in etats.values())
+    }
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande pour l'import/export JSON, la compaction et la fragmentation."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import/export des données STEP entre moteurs de stockage")
+    parser.add_argument('action', choices=['importer', 'exporter', 'compacter', 'fragmenter'],
+                        help="importer: JSON -> SQLite ; exporter: SQLite -> JSON ; "
+                             "compacter: intègre le journal dans etat_station.json ; "
+                             "fragmenter: etat_station.json -> data/etats/<station_id>.json")
+    parser.add_argument('--dossier', default=DOSSIER_DONNEES, help="Dossier des fichiers JSON")
+    parser.add_argument('--base', default=None, help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    if args.action == 'compacter':
+        nb_entrees = StockageJournal(args.dossier).compacter()
+        print(f"✅ {nb_entrees} entrée(s) de journal intégrée(s)")
+        return 0
+
+    if args.action == 'fragmenter':
+        resultat = fragmenter_etats(args.dossier)
+        print(f"✅ {resultat['stations']} station(s) et {resultat['mises_a_jour']} mise(s) à jour fragmentée(s)")
+        return 0
+
+    json_moteur = StockageJSON(args.dossier)
+    sqlite_moteur = StockageSQLite(args.base)
+    try:
+        if args.action == 'importer':
+            resultat = copier_stockage(json_moteur, sqlite_moteur)
+        else:
+            resultat = copier_stockage(sqlite_moteur, json_moteur)
+    finally:
+        sqlite_moteur.fermer()
+
+    print(f"✅ {resultat['stations']} station(s) et {resultat['mises_a_jour']} mise(s) à jour copiée(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
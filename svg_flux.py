@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Écriture directe des diagrammes de flux au format SVG, sans matplotlib.
+
+DiagrammeSVG reprend la disposition de DiagrammeFlux (positions des ouvrages,
+flèches, titres des filières, repères d'entrée et de sortie, légende) et
+produit le document SVG par simple assemblage de chaînes. Le module ne dépend
+ni de matplotlib ni de numpy : il peut servir des diagrammes depuis un serveur
+web où ces bibliothèques ne sont pas installées.
+
+Exemple :
+    python svg_flux.py "Station Nord" --date 2024-06-30 --sortie station_nord.svg
+"""
+
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from disposition_flux import (
+    ETATS_LEGENDE,
+    STYLES_DESTINATION,
+    ModeleDiagramme,
+    preparer_ouvrages_station,
+    formater_titre_diagramme,
+)
+from utils import (
+    get_station_by_id,
+    get_station_by_nom,
+    charger_historique_station,
+    selectionner_mise_a_jour,
+)
+
+# Configuration du logging
+log = logging.getLogger(__name__)
+
+POLICE_SVG = "'DejaVu Sans', 'Segoe UI Emoji', Arial, sans-serif"
+
+
+def _nombre(valeur: float) -> str:
+    """Formate une coordonnée SVG de façon compacte."""
+    return f"{valeur:.1f}".rstrip('0').rstrip('.')
+
+
+def _rayon_arc(connectionstyle: str) -> float:
+    """Extrait la courbure d'un style matplotlib 'arc3,rad=0.15' (0 si absente)."""
+    correspondance = re.search(r'rad\s*=\s*(-?[\d.]+)', connectionstyle or '')
+    return float(correspondance.group(1)) if correspondance else 0.0
+
+
+class DiagrammeSVG(ModeleDiagramme):
+    """Génère le diagramme de flux d'une station directement en SVG."""
+
+    # Échelle : pixels par unité de la disposition
+    ECHELLE = 50
+    MARGE = 20
+    HAUTEUR_LIGNE_TITRE = 22
+    LARGEUR_LEGENDE = 230
+
+    def empreinte_style(self) -> dict:
+        """Paramètres de style qui influent sur le SVG produit."""
+        return {**super().empreinte_style(), 'moteur': 'svg', 'echelle': self.ECHELLE}
+
+    def generer_svg(self, liste_ouvrages: list, titre: str, destination: str = None) -> str:
+        """
+        Génère le document SVG du diagramme.
+
+        Args:
+            liste_ouvrages: Liste des ouvrages à afficher (voir parser_ouvrages)
+            titre: Titre du diagramme (déjà formaté avec la date)
+            destination: Destination finale des eaux épurées (optionnel)
+
+        Returns:
+            Le document SVG complet
+        """
+        ouvrages_positionnes, disposition = self.calculer_disposition(liste_ouvrages)
+        x_min, x_max, y_min, y_max = disposition.limites
+
+        lignes_titre = titre.split('\n') if titre else []
+        self._origine_x = self.MARGE
+        self._origine_y = self.MARGE + len(lignes_titre) * self.HAUTEUR_LIGNE_TITRE + 10
+        self._x_min = x_min
+        self._y_max = y_max
+
+        largeur_dessin = (x_max - x_min) * self.ECHELLE
+        hauteur_dessin = (y_max - y_min) * self.ECHELLE
+        largeur = self._origine_x + largeur_dessin + self.LARGEUR_LEGENDE + self.MARGE
+        hauteur = self._origine_y + max(hauteur_dessin, self._hauteur_legende()) + self.MARGE
+        self._marqueurs = {}
+
+        corps = []
+        corps.extend(self._svg_titre(lignes_titre, largeur))
+        corps.extend(self._svg_fleches(disposition.fleches))
+        corps.extend(self._svg_reperes(disposition, destination))
+        corps.extend(self._svg_ouvrages(ouvrages_positionnes))
+        corps.extend(self._svg_titres_filieres(disposition.titres_filieres))
+        corps.extend(self._svg_etiquettes_boues(disposition.etiquettes_boues))
+        corps.extend(self._svg_legende(self._origine_x + largeur_dessin + 10, self._origine_y))
+
+        entete = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{_nombre(largeur)}" height="{_nombre(hauteur)}" '
+            f'viewBox="0 0 {_nombre(largeur)} {_nombre(hauteur)}" font-family="{POLICE_SVG}">',
+            f'<title>{escape(" ".join(lignes_titre))}</title>',
+            '<defs>',
+            *self._marqueurs.values(),
+            '</defs>',
+            f'<rect width="{_nombre(largeur)}" height="{_nombre(hauteur)}" fill="white"/>',
+        ]
+        return '\n'.join(entete + corps + ['</svg>']) + '\n'
+
+    def _point(self, x: float, y: float) -> Tuple[float, float]:
+        """Convertit des coordonnées de la disposition (y vers le haut) en pixels SVG."""
+        return (self._origine_x + (x - self._x_min) * self.ECHELLE,
+                self._origine_y + (self._y_max - y) * self.ECHELLE)
+
+    def _texte(self, x: float, y: float, contenu: str, taille: int = 12, ancre: str = 'middle',
+               couleur: str = '#333333', gras: bool = False, italique: bool = False,
+               base: str = 'central', opacite: float = 1.0) -> str:
+        """Élément <text> positionné en pixels."""
+        attributs = [
+            f'x="{_nombre(x)}"', f'y="{_nombre(y)}"', f'font-size="{taille}"',
+            f'text-anchor="{ancre}"', f'dominant-baseline="{base}"', f'fill="{couleur}"',
+        ]
+        if gras:
+            attributs.append('font-weight="bold"')
+        if italique:
+            attributs.append('font-style="italic"')
+        if opacite < 1:
+            attributs.append(f'opacity="{opacite}"')
+        return f'<text {" ".join(attributs)}>{escape(contenu)}</text>'
+
+    @staticmethod
+    def _largeur_texte(contenu: str, taille: int) -> float:
+        """Largeur approximative d'un texte (aucune mesure de police sans moteur de rendu)."""
+        return len(contenu) * taille * 0.6
+
+    def _marqueur(self, couleur: str, plein: bool) -> str:
+        """Retourne l'identifiant d'une pointe de flèche, déclarée dans <defs> au premier usage."""
+        identifiant = f"pointe-{'pleine' if plein else 'ouverte'}-{couleur.lstrip('#')}"
+        if identifiant not in self._marqueurs:
+            if plein:
+                forme = f'<path d="M0,0 L10,5 L0,10 z" fill="{couleur}"/>'
+            else:
+                forme = f'<path d="M0,0 L10,5 L0,10" fill="none" stroke="{couleur}" stroke-width="1.5"/>'
+            self._marqueurs[identifiant] = (
+                f'<marker id="{identifiant}" viewBox="0 0 10 10" refX="10" refY="5" '
+                f'markerWidth="8" markerHeight="8" markerUnits="userSpaceOnUse" orient="auto">{forme}</marker>'
+            )
+        return identifiant
+
+    def _fleche(self, depart: Tuple[float, float], arrivee: Tuple[float, float],
+                style: Dict[str, Any]) -> str:
+        """
+        Flèche entre deux points de la disposition, au style des arrowprops matplotlib.
+
+        La courbure 'arc3,rad=f' est reproduite par une courbe de Bézier quadratique
+        dont le point de contrôle est, comme dans matplotlib, décalé de f fois le
+        vecteur départ → arrivée tourné d'un quart de tour.
+        """
+        couleur = style.get('color', '#000000')
+        (x1, y1), (x2, y2) = depart, arrivee
+        rayon = _rayon_arc(style.get('connectionstyle', ''))
+        px1, py1 = self._point(x1, y1)
+        px2, py2 = self._point(x2, y2)
+        if rayon:
+            cx, cy = self._point((x1 + x2) / 2 + rayon * (y2 - y1), (y1 + y2) / 2 - rayon * (x2 - x1))
+            chemin = f"M{_nombre(px1)},{_nombre(py1)} Q{_nombre(cx)},{_nombre(cy)} {_nombre(px2)},{_nombre(py2)}"
+        else:
+            chemin = f"M{_nombre(px1)},{_nombre(py1)} L{_nombre(px2)},{_nombre(py2)}"
+
+        attributs = [
+            f'd="{chemin}"', 'fill="none"', f'stroke="{couleur}"',
+            f'stroke-width="{style.get("linewidth", style.get("lw", 1.5))}"',
+        ]
+        if style.get('alpha', 1) < 1:
+            attributs.append(f'stroke-opacity="{style["alpha"]}"')
+        if style.get('linestyle') == '--':
+            attributs.append('stroke-dasharray="6,4"')
+        plein = '|>' in style.get('arrowstyle', '->')
+        attributs.append(f'marker-end="url(#{self._marqueur(couleur, plein)})"')
+        return f'<path {" ".join(attributs)}/>'
+
+    def _svg_titre(self, lignes_titre: List[str], largeur: float) -> List[str]:
+        if not lignes_titre:
+            return []
+        lignes = [f'<text x="{_nombre(largeur / 2)}" y="{self.MARGE}" font-size="17" font-weight="bold" '
+                  f'text-anchor="middle" dominant-baseline="hanging" fill="#000000">']
+        for i, ligne in enumerate(lignes_titre):
+            decalage = '0' if i == 0 else str(self.HAUTEUR_LIGNE_TITRE)
+            lignes.append(f'<tspan x="{_nombre(largeur / 2)}" dy="{decalage}">{escape(ligne)}</tspan>')
+        lignes.append('</text>')
+        return lignes
+
+    def _svg_ouvrages(self, ouvrages_positionnes: list) -> List[str]:
+        elements = []
+        marge = 0.1 * self.ECHELLE  # Équivalent du pad=0.1 de FancyBboxPatch
+        for ouvrage in ouvrages_positionnes:
+            couleur = self.couleurs_etats.get(ouvrage['etat'], '#FFFFFF')
+            x, y = self._point(ouvrage['x'], ouvrage['y'] + ouvrage['hauteur'])
+            largeur = ouvrage['largeur'] * self.ECHELLE
+            hauteur = ouvrage['hauteur'] * self.ECHELLE
+            elements.append(
+                f'<rect x="{_nombre(x - marge)}" y="{_nombre(y - marge)}" '
+                f'width="{_nombre(largeur + 2 * marge)}" height="{_nombre(hauteur + 2 * marge)}" '
+                f'rx="{_nombre(0.2 * self.ECHELLE)}" fill="{couleur}" fill-opacity="0.95" '
+                f'stroke="#333333" stroke-width="1.5"><title>{escape(ouvrage["nom"])} : '
+                f'{escape(str(ouvrage.get("etat_affiche", ouvrage["etat"])))}</title></rect>'
+            )
+
+            nom_formate = self._formater_nom_ouvrage(ouvrage['nom'])
+            cx, cy = x + largeur / 2, y + hauteur / 2
+            largeur_fond = self._largeur_texte(nom_formate, 12) + 12
+            elements.append(
+                f'<rect x="{_nombre(cx - largeur_fond / 2)}" y="{_nombre(cy - 11)}" '
+                f'width="{_nombre(largeur_fond)}" height="22" rx="6" fill="white" fill-opacity="0.7"/>'
+            )
+            elements.append(self._texte(cx, cy, nom_formate, taille=12))
+        return elements
+
+    def _svg_titres_filieres(self, titres_filieres: list) -> List[str]:
+        elements = []
+        for titre_x, titre_y, libelle in titres_filieres:
+            x, y = self._point(titre_x, titre_y)
+            largeur = self._largeur_texte(libelle, 13) + 10
+            elements.append(
+                f'<rect x="{_nombre(x - largeur)}" y="{_nombre(y - 11)}" width="{_nombre(largeur)}" height="22" '
+                f'rx="5" fill="white" fill-opacity="0.8" stroke="gray"/>'
+            )
+            elements.append(self._texte(x - 5, y, libelle, taille=13, ancre='end', gras=True))
+        return elements
+
+    def _svg_fleches(self, fleches: list) -> List[str]:
+        return [self._fleche(fleche['xytext'], fleche['xy'], fleche['arrowprops']) for fleche in fleches]
+
+    def _svg_etiquettes_boues(self, etiquettes: list) -> List[str]:
+        elements = []
+        for etiquette in etiquettes:
+            x, y = self._point(etiquette['x'], etiquette['y'])
+            largeur = self._largeur_texte(etiquette['texte'], 12) + 8
+            elements.append(
+                f'<rect x="{_nombre(x - largeur / 2)}" y="{_nombre(y)}" width="{_nombre(largeur)}" height="20" '
+                f'rx="5" fill="#8B4513" fill-opacity="0.8"/>'
+            )
+            elements.append(self._texte(x, y + 10, etiquette['texte'], taille=12, couleur='white'))
+        return elements
+
+    def _svg_reperes(self, disposition, destination: Optional[str]) -> List[str]:
+        elements = []
+        entree = disposition.entree
+        if entree:
+            elements.append(self._fleche(entree['fleche_xytext'], entree['fleche_xy'],
+                                         {'color': '#000000', 'linewidth': 1.5, 'arrowstyle': '->'}))
+            x, y = self._point(entree['x'], entree['y'])
+            elements.append(self._texte(x, y, 'Eaux usées', taille=13, couleur='black', gras=True,
+                                        base='text-after-edge'))
+
+        sortie = disposition.sortie
+        if not sortie:
+            return elements
+        elements.append(self._fleche(sortie['fleche_xytext'], sortie['fleche_xy'],
+                                     {'color': '#0000FF', 'linewidth': 1.5, 'arrowstyle': '->'}))
+        x, y = self._point(sortie['x'] - 1, sortie['y'])
+        elements.append(self._texte(x, y, 'Eaux épurées', taille=13, ancre='start', couleur='#0000FF', gras=True))
+
+        if destination:
+            dest_speciale = destination in ['Rejet', 'Milieu naturel']
+            style = STYLES_DESTINATION.get(destination, {'color': '#666666', 'icon': '➡️', 'style': 'normal'})
+            x_position = sortie['x'] + 2.5
+            y_position = sortie['y'] + (0.2 if dest_speciale else 0)
+            x, y = self._point(x_position, y_position + 0.3)
+            elements.append(self._texte(x, y, style['icon'], taille=round(style.get('icon_size', 24) * 1.3),
+                                        couleur=style.get('icon_color', style['color'])))
+            x, y = self._point(x_position, y_position - 0.5)
+            elements.append(self._texte(x, y, destination, taille=12, couleur=style['color'],
+                                        italique=style['style'] == 'italic', base='hanging', opacite=0.9))
+        return elements
+
+    def _hauteur_legende(self) -> float:
+        return 40 + (len(ETATS_LEGENDE) + 2) * 22 + 10
+
+    def _svg_legende(self, x: float, y: float) -> List[str]:
+        """Légende des états et des filières, comme DiagrammeFlux.ajouter_legende."""
+        largeur = self.LARGEUR_LEGENDE - 20
+        elements = [
+            f'<rect x="{_nombre(x + 3)}" y="{_nombre(y + 3)}" width="{largeur}" '
+            f'height="{_nombre(self._hauteur_legende())}" rx="8" fill="black" fill-opacity="0.1"/>',
+            f'<rect x="{_nombre(x)}" y="{_nombre(y)}" width="{largeur}" '
+            f'height="{_nombre(self._hauteur_legende())}" rx="8" fill="white" fill-opacity="0.9" '
+            f'stroke="#dddddd" stroke-width="1.2"/>',
+            self._texte(x + largeur / 2, y + 20, 'Légende', taille=13, couleur='#000000', gras=True),
+        ]
+        ligne_y = y + 48
+        for etat, libelle in ETATS_LEGENDE:
+            bordure = '#000000' if etat == 'inexistant' else '#333333'
+            elements.append(
+                f'<rect x="{_nombre(x + 14)}" y="{_nombre(ligne_y - 8)}" width="16" height="16" '
+                f'fill="{self.couleurs_etats[etat]}" stroke="{bordure}"/>'
+            )
+            elements.append(self._texte(x + 42, ligne_y, libelle, taille=12, ancre='start', couleur='#000000'))
+            ligne_y += 22
+        for libelle, couleur, pointille in (('Filière Eau', '#3498db', False), ('Filière Boues', '#8B4513', True)):
+            elements.append(
+                f'<line x1="{_nombre(x + 8)}" y1="{_nombre(ligne_y)}" x2="{_nombre(x + 36)}" y2="{_nombre(ligne_y)}" '
+                f'stroke="{couleur}" stroke-width="2"{" stroke-dasharray=" + quoteattr("6,4") if pointille else ""}/>'
+            )
+            elements.append(self._texte(x + 42, ligne_y, libelle, taille=12, ancre='start', couleur='#000000'))
+            ligne_y += 22
+        return elements
+
+
+def generer_svg_station(station: Dict[str, Any], date: Optional[str] = None) -> str:
+    """
+    Génère le SVG du diagramme d'une station à une date donnée.
+
+    Args:
+        station: Station (dictionnaire de stations.json)
+        date: Date de l'état à représenter ('YYYY-MM-DD[ HH:MM:SS]'), dernière mise à jour si None
+
+    Returns:
+        Le document SVG
+
+    Raises:
+        ValueError: Si la station n'a pas de type de procédé ou aucune mise à jour à cette date
+    """
+    type_procede = station.get('type_procede')
+    if not type_procede:
+        raise ValueError("Le type de procédé n'est pas défini pour cette station")
+    mise_a_jour = selectionner_mise_a_jour(charger_historique_station(str(station.get('id', ''))), date)
+    if mise_a_jour is None:
+        raise ValueError("Aucune mise à jour disponible à cette date")
+
+    date_maj = mise_a_jour.get('date_maj', mise_a_jour.get('date'))
+    ouvrages = preparer_ouvrages_station(type_procede, mise_a_jour.get('etat_ouvrages', {}))
+    titre = formater_titre_diagramme(station.get('nom', 'Station inconnue'), type_procede, date_maj)
+    return DiagrammeSVG(type_station=type_procede).generer_svg(ouvrages, titre, station.get('destination', 'Rejet'))
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande : écrit le SVG d'une station."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Diagramme de flux d'une station au format SVG (sans matplotlib)")
+    parser.add_argument('station', help="ID ou nom de la station")
+    parser.add_argument('--date', default=None,
+                        help="Date de l'état à représenter (YYYY-MM-DD[ HH:MM:SS]), dernière mise à jour par défaut")
+    parser.add_argument('--sortie', default=None, help="Fichier SVG à écrire (sortie standard par défaut)")
+    args = parser.parse_args(argv)
+
+    station = get_station_by_id(args.station) or get_station_by_nom(args.station)
+    if station is None:
+        print(f"❌ Station introuvable: {args.station}")
+        return 1
+    try:
+        svg = generer_svg_station(station, args.date)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            f.write(svg)
+        print(f"✅ Diagramme enregistré: {args.sortie}")
+    else:
+        print(svg, end='')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -4,9 +4,10 @@ from datetime import datetime
 import json
 from typing import List, Dict, Any, Optional
 from collections import OrderedDict
-import shutil
-import time
-import unicodedata
+from collections.abc import MutableMapping
+
+from stockage import get_stockage
+from catalogue import get_catalogue
 
 def configurer_journal():
     """Configure le système de journalisation"""
@@ -57,12 +58,40 @@ log = logging.getLogger(__name__)
 _STATIONS_CACHE = None
 _STATIONS_LAST_MODIFIED = 0
 
+# Index secondaires des stations, reconstruits avec le cache
+_STATIONS_INDEX_ID = {}
+_STATIONS_INDEX_NOM = {}
+_STATIONS_INDEX_TYPE = {}
+
+def _indexer_stations(stations: List[Dict[str, Any]]) -> None:
+    """
+    Reconstruit les index par ID, par nom (en minuscules) et par type de procédé.
+    En cas de doublon, la première station de la liste est conservée.
+    """
+    global _STATIONS_INDEX_ID, _STATIONS_INDEX_NOM, _STATIONS_INDEX_TYPE
+    
+    par_id = {}
+    par_nom = {}
+    par_type = {}
+    for station in stations if isinstance(stations, list) else []:
+        if not isinstance(station, dict):
+            continue
+        if station.get('id') is not None:
+            par_id.setdefault(station['id'], station)
+        if isinstance(station.get('nom'), str):
+            par_nom.setdefault(station['nom'].lower(), station)
+        par_type.setdefault(station.get('type_procede'), []).append(station)
+    
+    _STATIONS_INDEX_ID = par_id
+    _STATIONS_INDEX_NOM = par_nom
+    _STATIONS_INDEX_TYPE = par_type
+
 def get_stations_list(force_reload: bool = False) -> List[Dict[str, Any]]:
     """
     Récupère la liste des stations disponibles avec mise en cache.
     
     Args:
-        force_reload: Si True, force le rechargement du fichier
+        force_reload: Si True, force le rechargement depuis le stockage
         
     Returns:
         Liste des stations avec leurs informations
@@ -70,31 +99,24 @@ def get_stations_list(force_reload: bool = False) -> List[Dict[str, Any]]:
     global _STATIONS_CACHE, _STATIONS_LAST_MODIFIED
     
     try:
-        file_path = 'data/stations.json'
-        
-        # Si le fichier n'existe pas, retourner une liste vide
-        if not os.path.exists(file_path):
-            os.makedirs('data', exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-            return []
-            
-        current_mtime = os.path.getmtime(file_path)
+        stockage = get_stockage()
+        signature = stockage.signature_stations()
         
-        # Si le fichier n'a pas été modifié et qu'on a un cache valide
-        if not force_reload and _STATIONS_CACHE is not None and current_mtime <= _STATIONS_LAST_MODIFIED:
+        # Si les stations n'ont pas été modifiées et qu'on a un cache valide
+        if not force_reload and _STATIONS_CACHE is not None and signature == _STATIONS_LAST_MODIFIED:
             return _STATIONS_CACHE
             
-        # Sinon, on charge le fichier
-        with open(file_path, 'r', encoding='utf-8') as f:
-            _STATIONS_CACHE = json.load(f)
-            _STATIONS_LAST_MODIFIED = current_mtime
+        # Sinon, on recharge depuis le moteur de stockage
+        _STATIONS_CACHE = stockage.lister_stations()
+        _STATIONS_LAST_MODIFIED = signature
             
         # S'assurer que le cache est une liste
         if not isinstance(_STATIONS_CACHE, list):
             log.warning("Le fichier stations.json ne contient pas une liste. Réinitialisation.")
             _STATIONS_CACHE = []
             save_stations(_STATIONS_CACHE)
+        else:
+            _indexer_stations(_STATIONS_CACHE)
             
         return _STATIONS_CACHE
         
@@ -102,7 +124,7 @@ def get_stations_list(force_reload: bool = False) -> List[Dict[str, Any]]:
         log.error(f"Erreur de décodage JSON dans stations.json: {e}")
         return []
     except Exception as e:
-        log.error(f"Erreur lors de la lecture du fichier stations.json: {e}")
+        log.error(f"Erreur lors de la lecture des stations: {e}")
         return []
 
 def save_stations(stations: List[Dict[str, Any]]) -> bool:
@@ -118,13 +140,13 @@ def save_stations(stations: List[Dict[str, Any]]) -> bool:
     global _STATIONS_CACHE, _STATIONS_LAST_MODIFIED
     
     try:
-        os.makedirs('data', exist_ok=True)
-        with open('data/stations.json', 'w', encoding='utf-8') as f:
-            json.dump(stations, f, ensure_ascii=False, indent=2)
+        stockage = get_stockage()
+        stockage.enregistrer_stations(stations)
         
-        # Mettre à jour le cache
+        # Mettre à jour le cache et les index
         _STATIONS_CACHE = stations
-        _STATIONS_LAST_MODIFIED = os.path.getmtime('data/stations.json')
+        _STATIONS_LAST_MODIFIED = stockage.signature_stations()
+        _indexer_stations(stations)
         
         return True
     except Exception as e:
@@ -142,7 +164,7 @@ def update_stations_cache() -> None:
 
 def get_station_by_id(station_id: str) -> Optional[Dict[str, Any]]:
     """
-    Récupère une station par son ID en utilisant le cache.
+    Récupère une station par son ID en utilisant l'index du cache.
     
     Args:
         station_id: ID de la station à récupérer
@@ -150,79 +172,169 @@ def get_station_by_id(station_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         La station correspondante ou None si non trouvée
     """
-    stations = get_stations_list()
-    for station in stations:
-        if station.get('id') == station_id:
-            return station
-    return None
+    # Valide le cache (et reconstruit les index si le stockage a changé)
+    get_stations_list()
+    return _STATIONS_INDEX_ID.get(station_id)
+
+def get_station_by_nom(nom: str) -> Optional[Dict[str, Any]]:
+    """
+    Récupère une station par son nom (insensible à la casse) en utilisant l'index du cache.
+    
+    Args:
+        nom: Nom de la station à récupérer
+        
+    Returns:
+        La station correspondante ou None si non trouvée
+    """
+    if not isinstance(nom, str):
+        return None
+    get_stations_list()
+    return _STATIONS_INDEX_NOM.get(nom.lower())
+
+def get_stations_by_type(type_procede: str) -> List[Dict[str, Any]]:
+    """
+    Récupère les stations d'un type de procédé donné en utilisant l'index du cache.
+    
+    Args:
+        type_procede: Type de procédé (ex: 'boues_activées')
+        
+    Returns:
+        Liste des stations de ce type (vide si aucune)
+    """
+    get_stations_list()
+    return list(_STATIONS_INDEX_TYPE.get(type_procede, []))
+
+# Cache de l'historique des états, validé par la signature du moteur de stockage
+# (mtime + taille de etat_station.json pour le moteur JSON)
+_ETATS_CACHE = None
+_ETATS_SIGNATURE = None
+
+def _copier_etat(etat: Any) -> Any:
+    """Copie un état en dupliquant aussi son dictionnaire etat_ouvrages."""
+    if not isinstance(etat, dict):
+        return etat
+    copie = dict(etat)
+    if isinstance(copie.get('etat_ouvrages'), dict):
+        copie['etat_ouvrages'] = dict(copie['etat_ouvrages'])
+    return copie
+
+def _copier_historique(historique: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [_copier_etat(etat) for etat in historique]
+
+class _VueEtats(MutableMapping):
+    """
+    Vue sur l'historique en cache : l'historique d'une station n'est copié
+    qu'au premier accès, les modifications restent locales à la vue.
+    """
+
+    def __init__(self, source):
+        self._source = source
+        self._copies = {}
+        self._supprimees = set()
+
+    def __getitem__(self, station_id):
+        if station_id in self._copies:
+            return self._copies[station_id]
+        if station_id in self._supprimees:
+            raise KeyError(station_id)
+        historique = self._source[station_id]
+        copie = _copier_historique(historique) if isinstance(historique, list) else historique
+        self._copies[station_id] = copie
+        return copie
+
+    def __setitem__(self, station_id, etats):
+        self._copies[station_id] = etats
+        self._supprimees.discard(station_id)
+
+    def __delitem__(self, station_id):
+        if station_id not in self:
+            raise KeyError(station_id)
+        self._copies.pop(station_id, None)
+        self._supprimees.add(station_id)
+
+    def __contains__(self, station_id):
+        if station_id in self._copies:
+            return True
+        return station_id not in self._supprimees and station_id in self._source
+
+    def __iter__(self):
+        for station_id in self._source:
+            if station_id not in self._supprimees:
+                yield station_id
+        for station_id in self._copies:
+            if station_id not in self._source:
+                yield station_id
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"_VueEtats({len(self)} stations)"
+
+def _etats_en_cache(stockage) -> Any:
+    """
+    Retourne l'historique complet mis en cache, rechargé uniquement si la
+    signature du moteur a changé depuis la dernière lecture.
+    """
+    global _ETATS_CACHE, _ETATS_SIGNATURE
+    
+    signature = stockage.signature_etats()
+    if signature is not None and _ETATS_CACHE is not None and signature == _ETATS_SIGNATURE:
+        return _ETATS_CACHE
+    
+    _ETATS_CACHE = stockage.charger_etats()
+    _ETATS_SIGNATURE = signature
+    if signature is None:
+        # Le moteur ne sait pas valider un cache : ne rien conserver
+        etats, _ETATS_CACHE = _ETATS_CACHE, None
+        return etats
+    return _ETATS_CACHE
+
+# Fonctions appelées après chaque écriture de mises à jour (voir abonner_mises_a_jour)
+_ABONNES_MISES_A_JOUR = []
+
+def abonner_mises_a_jour(rappel) -> None:
+    """
+    Enregistre une fonction appelée après chaque écriture réussie de mises à jour
+    par ce module, avec ({station_id: [mises à jour écrites]}, historique_complet).
+    historique_complet vaut True quand l'historique de la station a été remplacé.
+    """
+    if rappel not in _ABONNES_MISES_A_JOUR:
+        _ABONNES_MISES_A_JOUR.append(rappel)
+
+def desabonner_mises_a_jour(rappel) -> None:
+    """Retire une fonction enregistrée par abonner_mises_a_jour."""
+    if rappel in _ABONNES_MISES_A_JOUR:
+        _ABONNES_MISES_A_JOUR.remove(rappel)
+
+def _notifier_mises_a_jour(mises_a_jour_par_station, historique_complet=False) -> None:
+    """Transmet des mises à jour écrites aux abonnés ; l'erreur d'un abonné n'annule pas l'écriture."""
+    for rappel in list(_ABONNES_MISES_A_JOUR):
+        try:
+            rappel(mises_a_jour_par_station, historique_complet)
+        except Exception as e:
+            log_erreur(f"Erreur d'un abonné aux mises à jour: {e}", exc_info=True)
+
+def invalider_cache_etats() -> None:
+    """
+    Vide le cache de l'historique des états (à appeler après une écriture
+    faite directement via le moteur de stockage).
+    """
+    global _ETATS_CACHE, _ETATS_SIGNATURE
+    _ETATS_CACHE = None
+    _ETATS_SIGNATURE = None
 
 def charger_etats_station() -> Dict[str, Any]:
     """
-    Charge l'état des stations depuis le fichier JSON.
+    Charge l'état des stations depuis le moteur de stockage actif.
     Gère plusieurs formats de données pour assurer la rétrocompatibilité.
+    
+    Le fichier n'est relu que s'il a changé ; la valeur retournée est une vue
+    qui copie l'historique d'une station à la demande, l'appelant peut donc
+    la modifier sans altérer le cache.
     """
     try:
-        if not os.path.exists('data/etat_station.json'):
-            return {}
-            
-        with open('data/etat_station.json', 'r', encoding='utf-8') as f:
-            etats_data = json.load(f)
-            
-        # Si le fichier est vide ou pas un dictionnaire
-        if not isinstance(etats_data, dict):
-            log.warning("Le fichier etat_station.json ne contient pas un objet JSON valide")
-            return {}
-            
-        result = {}
-        
-        for station_id, data in etats_data.items():
-            if not data:
-                continue
-                
-            # Cas 1: Données dans une liste (format attendu)
-            if isinstance(data, list):
-                etats_list = []
-                for item in data:
-                    # Si l'item est un dictionnaire avec une liste d'états
-                    if isinstance(item, dict) and station_id in item and isinstance(item[station_id], list):
-                        etats_list.extend(item[station_id])
-                    # Si l'item est directement un état
-                    elif isinstance(item, dict):
-                        etats_list.append(item)
-                
-                if etats_list:
-                    result[station_id] = etats_list
-            # Cas 2: Données directes (ancien format)
-            elif isinstance(data, dict):
-                # Si c'est un état direct
-                if 'etat_ouvrages' in data or 'date' in data or 'date_maj' in data:
-                    result[station_id] = [data]
-        
-        # Nettoyer les données chargées
-        for station_id, etats in result.items():
-            for i, etat in enumerate(etats):
-                if not isinstance(etat, dict):
-                    continue
-                    
-                # S'assurer que chaque état a un champ etat_ouvrages
-                if 'etat_ouvrages' not in etat:
-                    etat['etat_ouvrages'] = {}
-                # S'assurer que etat_ouvrages est un dictionnaire
-                elif not isinstance(etat['etat_ouvrages'], dict):
-                    try:
-                        etat['etat_ouvrages'] = dict(etat['etat_ouvrages'])
-                    except (TypeError, ValueError):
-                        etat['etat_ouvrages'] = {}
-                
-                # S'assurer que l'ID de station est présent
-                if 'station_id' not in etat:
-                    etat['station_id'] = station_id
-                
-                # S'assurer que la date de mise à jour existe
-                if 'date_maj' not in etat:
-                    etat['date_maj'] = etat.get('date', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        
-        return result
+        return _VueEtats(_etats_en_cache(get_stockage()))
         
     except json.JSONDecodeError as e:
         log_erreur(f"Erreur de décodage JSON dans etat_station.json: {e}")
@@ -231,6 +343,154 @@ def charger_etats_station() -> Dict[str, Any]:
         log_erreur(f"Erreur lors du chargement de etat_station.json: {e}")
         return {}
 
+def charger_historique_station(station_id: str) -> List[Dict[str, Any]]:
+    """
+    Charge l'historique des états d'une seule station.
+    
+    Args:
+        station_id: ID de la station
+        
+    Returns:
+        Copie de la liste des états de la station (vide en cas d'erreur)
+    """
+    try:
+        stockage = get_stockage()
+        if stockage.lecture_par_station:
+            return stockage.charger_historique(station_id)
+        historique = _etats_en_cache(stockage).get(str(station_id), [])
+        return _copier_historique(historique) if isinstance(historique, list) else []
+    except json.JSONDecodeError as e:
+        log_erreur(f"Erreur de décodage JSON dans etat_station.json: {e}")
+        return []
+    except Exception as e:
+        log_erreur(f"Erreur lors du chargement de l'historique de la station {station_id}: {e}")
+        return []
+
+
+def selectionner_mise_a_jour(historique: List[Dict[str, Any]],
+                             date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Retourne la dernière mise à jour antérieure ou égale à une date.
+
+    Args:
+        historique: Historique des états d'une station
+        date: Date limite ('YYYY-MM-DD' ou 'YYYY-MM-DD HH:MM:SS') ; la plus récente si None
+
+    Returns:
+        La mise à jour retenue, ou None si aucune ne convient
+    """
+    if date and len(date) == 10:
+        # Une date seule couvre toute la journée
+        date = f"{date} 23:59:59"
+    retenue = None
+    for etat in historique:
+        date_maj = etat.get('date_maj', etat.get('date', ''))
+        if date and date_maj > date:
+            continue
+        if retenue is None or date_maj >= retenue.get('date_maj', retenue.get('date', '')):
+            retenue = etat
+    return retenue
+
+def _preparer_etats(etats_station, station_id):
+    """
+    Nettoie et valide les états d'une station avant leur enregistrement.
+    
+    Args:
+        etats_station (list): Liste des états de la station (ou état unique)
+        station_id (str): ID de la station
+        
+    Returns:
+        list: États nettoyés prêts à être enregistrés
+    """
+    # Vérifier et corriger la structure des données
+    if not isinstance(etats_station, list):
+        log.warning("Les états de la station ne sont pas une liste, conversion en cours...")
+        etats_station = [etats_station] if etats_station else []
+    
+    # Nettoyer et valider chaque état
+    etats_a_sauvegarder = []
+    for etat in etats_station:
+        if not isinstance(etat, dict):
+            log.warning(f"État invalide ignoré: {etat}")
+            continue
+            
+        # Créer une copie pour éviter de modifier l'original
+        etat_propre = {}
+        
+        # Copier uniquement les champs nécessaires
+        for champ in ['station_id', 'date', 'date_maj', 'etat_ouvrages']:
+            if champ in etat:
+                etat_propre[champ] = etat[champ]
+        
+        # S'assurer que chaque état a un champ etat_ouvrages
+        if 'etat_ouvrages' not in etat_propre or not etat_propre['etat_ouvrages']:
+            # Si etat_ouvrages est vide ou n'existe pas, initialiser avec les ouvrages par défaut
+            station = get_station_by_id(station_id)
+            if station and 'type_procede' in station:
+                ouvrages_par_defaut = get_ouvrages_procede(station['type_procede'])
+                if ouvrages_par_defaut:
+                    # Créer une copie profonde des ouvrages par défaut
+                    nouveaux_ouvrages = ouvrages_par_defaut.copy()
+                    
+                    # Conserver les états existants pour les ouvrages déjà présents
+                    if 'etat_ouvrages' in etat and isinstance(etat['etat_ouvrages'], dict):
+                        for ouvrage, etat_ouvrage in etat['etat_ouvrages'].items():
+                            if ouvrage in nouveaux_ouvrages:
+                                nouveaux_ouvrages[ouvrage] = etat_ouvrage
+                    
+                    etat_propre['etat_ouvrages'] = nouveaux_ouvrages
+                else:
+                    etat_propre['etat_ouvrages'] = {}
+            else:
+                etat_propre['etat_ouvrages'] = {}
+        
+        # S'assurer que l'ID de station est présent
+        if 'station_id' not in etat_propre:
+            etat_propre['station_id'] = station_id
+        
+        # S'assurer que la date de mise à jour existe
+        if 'date_maj' not in etat_propre:
+            etat_propre['date_maj'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Supprimer la date simple si elle existe encore
+        if 'date' in etat_propre:
+            del etat_propre['date']
+        
+        etats_a_sauvegarder.append(etat_propre)
+    
+    # S'assurer que etats_a_sauvegarder est une liste
+    if not isinstance(etats_a_sauvegarder, list):
+        etats_a_sauvegarder = [etats_a_sauvegarder] if etats_a_sauvegarder else []
+    
+    # Vérifier et nettoyer chaque état avant de le sauvegarder
+    etats_propres = []
+    for etat in etats_a_sauvegarder:
+        if not isinstance(etat, dict):
+            continue
+            
+        # Créer une copie propre de l'état
+        etat_propre = {
+            'station_id': str(etat.get('station_id', station_id)),
+            'date_maj': etat.get('date_maj', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            'etat_ouvrages': {}
+        }
+        
+        # Copier les états des ouvrages existants
+        if 'etat_ouvrages' in etat and isinstance(etat['etat_ouvrages'], dict):
+            # Créer une copie profonde du dictionnaire des états
+            for k, v in etat['etat_ouvrages'].items():
+                if isinstance(k, str) and isinstance(v, str):
+                    etat_propre['etat_ouvrages'][k] = v
+        
+        # S'assurer que tous les champs sont des chaînes de caractères
+        for key, value in etat_propre.items():
+            if isinstance(value, (int, float, bool)):
+                etat_propre[key] = str(value)
+        
+        etats_propres.append(etat_propre)
+    
+    return etats_propres
+
 def sauvegarder_etats_station(etats_station, station_id):
     """
     Sauvegarde les états d'une station dans le fichier etat_station.json
@@ -248,139 +508,85 @@ def sauvegarder_etats_station(etats_station, station_id):
             log_erreur("ID de station manquant pour la sauvegarde")
             return False
             
-        # Vérifier et corriger la structure des données
-        if not isinstance(etats_station, list):
-            log.warning("Les états de la station ne sont pas une liste, conversion en cours...")
-            etats_station = [etats_station] if etats_station else []
-        
-        # Nettoyer et valider chaque état
-        etats_a_sauvegarder = []
-        for etat in etats_station:
-            if not isinstance(etat, dict):
-                log.warning(f"État invalide ignoré: {etat}")
-                continue
-                
-            # Créer une copie pour éviter de modifier l'original
-            etat_propre = {}
-            
-            # Copier uniquement les champs nécessaires
-            for champ in ['station_id', 'date', 'date_maj', 'etat_ouvrages']:
-                if champ in etat:
-                    etat_propre[champ] = etat[champ]
-            
-            # S'assurer que chaque état a un champ etat_ouvrages
-            if 'etat_ouvrages' not in etat_propre or not etat_propre['etat_ouvrages']:
-                # Si etat_ouvrages est vide ou n'existe pas, initialiser avec les ouvrages par défaut
-                station = get_station_by_id(station_id)
-                if station and 'type_procede' in station:
-                    ouvrages_par_defaut = get_ouvrages_procede(station['type_procede'])
-                    if ouvrages_par_defaut:
-                        # Créer une copie profonde des ouvrages par défaut
-                        nouveaux_ouvrages = ouvrages_par_defaut.copy()
-                        
-                        # Conserver les états existants pour les ouvrages déjà présents
-                        if 'etat_ouvrages' in etat and isinstance(etat['etat_ouvrages'], dict):
-                            for ouvrage, etat_ouvrage in etat['etat_ouvrages'].items():
-                                if ouvrage in nouveaux_ouvrages:
-                                    nouveaux_ouvrages[ouvrage] = etat_ouvrage
-                        
-                        etat_propre['etat_ouvrages'] = nouveaux_ouvrages
-                    else:
-                        etat_propre['etat_ouvrages'] = {}
-                else:
-                    etat_propre['etat_ouvrages'] = {}
-            
-            # S'assurer que l'ID de station est présent
-            if 'station_id' not in etat_propre:
-                etat_propre['station_id'] = station_id
-            
-            # S'assurer que la date de mise à jour existe
-            if 'date_maj' not in etat_propre:
-                etat_propre['date_maj'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Supprimer la date simple si elle existe encore
-            if 'date' in etat_propre:
-                del etat_propre['date']
-            
-            etats_a_sauvegarder.append(etat_propre)
-        
-        # Charger les états existants
-        etats_data = charger_etats_station()
-        if not isinstance(etats_data, dict):
-            etats_data = {}
-        
-        # S'assurer que etats_a_sauvegarder est une liste
-        if not isinstance(etats_a_sauvegarder, list):
-            etats_a_sauvegarder = [etats_a_sauvegarder] if etats_a_sauvegarder else []
-        
-        # Vérifier et nettoyer chaque état avant de le sauvegarder
-        etats_propres = []
-        for etat in etats_a_sauvegarder:
-            if not isinstance(etat, dict):
-                continue
-                
-            # Créer une copie propre de l'état
-            etat_propre = {
-                'station_id': str(etat.get('station_id', station_id)),
-                'date_maj': etat.get('date_maj', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                'etat_ouvrages': {}
-            }
-            
-            # Copier les états des ouvrages existants
-            if 'etat_ouvrages' in etat and isinstance(etat['etat_ouvrages'], dict):
-                # Créer une copie profonde du dictionnaire des états
-                for k, v in etat['etat_ouvrages'].items():
-                    if isinstance(k, str) and isinstance(v, str):
-                        etat_propre['etat_ouvrages'][k] = v
-            
-            # S'assurer que tous les champs sont des chaînes de caractères
-            for key, value in etat_propre.items():
-                if isinstance(value, (int, float, bool)):
-                    etat_propre[key] = str(value)
-            
-            etats_propres.append(etat_propre)
-        
-        # Mettre à jour les états pour cette station
-        etats_data[str(station_id)] = etats_propres
-        
-        # Créer le répertoire de données s'il n'existe pas
-        os.makedirs('data', exist_ok=True)
-        
-        # Créer un fichier temporaire avec un nom unique
-        temp_file = os.path.join('data', f'etat_station_{os.getpid()}_{int(time.time())}.tmp')
+        etats_propres = _preparer_etats(etats_station, station_id)
         
+        # Mettre à jour les états pour cette station via le moteur de stockage
         try:
-            # Écrire dans le fichier temporaire
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(etats_data, f, ensure_ascii=False, indent=2, default=str)
-            
-            # Vérifier que le fichier temporaire a été correctement écrit
-            if not os.path.exists(temp_file) or os.path.getsize(temp_file) == 0:
-                raise IOError("Le fichier temporaire n'a pas été correctement écrit")
-            
-            # Chemin du fichier de destination
-            etat_file = os.path.join('data', 'etat_station.json')
-            
-            # Remplacer l'ancien fichier par le nouveau
-            shutil.move(temp_file, etat_file)
-            log.info(f"Fichier {etat_file} mis à jour avec succès")
-            
+            get_stockage().sauvegarder_etats(str(station_id), etats_propres)
+            invalider_cache_etats()
+            _notifier_mises_a_jour({str(station_id): etats_propres}, historique_complet=True)
             return True
-            
         except Exception as e:
-            log_erreur(f"Erreur lors de l'écriture du fichier: {str(e)}")
-            # Essayer de supprimer le fichier temporaire en cas d'erreur
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except Exception as e2:
-                log_erreur(f"Impossible de supprimer le fichier temporaire {temp_file}: {str(e2)}")
+            log_erreur(f"Erreur lors de l'écriture des états: {str(e)}")
             return False
             
     except Exception as e:
         log_erreur(f"Erreur inattendue lors de la sauvegarde: {str(e)}")
         return False
 
+def ajouter_mise_a_jour_station(etat, station_id):
+    """
+    Ajoute une nouvelle mise à jour à l'historique d'une station sans réécrire
+    l'historique existant (une simple ligne de journal avec le moteur 'journal').
+    
+    Args:
+        etat (dict): Mise à jour à ajouter (etat_ouvrages, date_maj)
+        station_id (str): ID de la station
+        
+    Returns:
+        bool: True si l'ajout a réussi, False sinon
+    """
+    try:
+        if not station_id:
+            log_erreur("ID de station manquant pour la sauvegarde")
+            return False
+            
+        etats_propres = _preparer_etats([etat], station_id)
+        if not etats_propres:
+            log_erreur("Aucune mise à jour valide à enregistrer")
+            return False
+        
+        get_stockage().ajouter_mise_a_jour(str(station_id), etats_propres[0])
+        invalider_cache_etats()
+        _notifier_mises_a_jour({str(station_id): etats_propres})
+        return True
+        
+    except Exception as e:
+        log_erreur(f"Erreur lors de l'ajout de la mise à jour: {str(e)}")
+        return False
+
+def ajouter_mises_a_jour_stations(mises_a_jour_par_station):
+    """
+    Ajoute des mises à jour à l'historique de plusieurs stations en une seule
+    opération du moteur de stockage (une transaction avec SQLite, une écriture
+    avec les moteurs JSON).
+    
+    Args:
+        mises_a_jour_par_station (dict): {station_id: [mises à jour (etat_ouvrages, date_maj)]}
+        
+    Returns:
+        bool: True si l'ajout a réussi, False sinon
+    """
+    try:
+        etats_propres = {}
+        for station_id, etats in mises_a_jour_par_station.items():
+            if not station_id:
+                log_erreur("ID de station manquant pour la sauvegarde")
+                return False
+            etats = _preparer_etats(etats, station_id)
+            if etats:
+                etats_propres[str(station_id)] = etats
+        
+        if etats_propres:
+            get_stockage().ajouter_mises_a_jour(etats_propres)
+            invalider_cache_etats()
+            _notifier_mises_a_jour(etats_propres)
+        return True
+        
+    except Exception as e:
+        log_erreur(f"Erreur lors de l'ajout des mises à jour: {str(e)}")
+        return False
+
 def get_ouvrages_procede(type_procede):
     """
     Récupère la liste des ouvrages pour un type de procédé donné en respectant l'ordre logique de traitement.
@@ -391,79 +597,21 @@ def get_ouvrages_procede(type_procede):
     3. Traitement secondaire (bassins d'aération, décanteur secondaire, etc.)
     4. Traitement tertiaire (filtration, désinfection)
     5. Traitement des boues (épaississement, déshydratation, séchage)
+    
+    La recherche est insensible à la casse et aux accents et s'appuie sur le
+    catalogue compilé (types.json n'est relu que s'il a changé).
+    
+    Returns:
+        OrderedDict: {ouvrage: 'en_service'} (nouvel objet, modifiable), ou None si le type est inconnu
     """
     try:
-        print(f"\n[DEBUG] Recherche du type de procédé: {type_procede}")
-        
-        # Vérifier si le fichier existe
-        if not os.path.exists('data/types.json'):
-            print("[ERREUR] Le fichier data/types.json n'existe pas")
-            return None
-            
-        with open('data/types.json', 'r', encoding='utf-8') as f:
-            types_data = json.load(f)
-            
-        print(f"[DEBUG] Types de procédés disponibles: {list(types_data.keys())}")
-
-        # Normaliser les clés pour être insensibles à la casse et aux accents
-        def normalize(s):
-            return ''.join(c for c in unicodedata.normalize('NFD', str(s).lower())
-                         if not unicodedata.combining(c))
-
-        # Trouver la clé correspondante en ignorant la casse et les accents
-        procede_key = None
-        for key in types_data.keys():
-            if normalize(key) == normalize(type_procede):
-                procede_key = key
-                break
-
-        if not procede_key:
+        ouvrages_ordonnes = get_catalogue().etats_initiaux(type_procede)
+        if ouvrages_ordonnes is None:
             print(f"\033[1;31m❌ Type de procédé '{type_procede}' non trouvé dans types.json.\033[0m")
-            return None
-
-        procede_info = types_data[procede_key]
-        print(f"[DEBUG] Procédé trouvé: {procede_info.keys()}")
-
-        # Créer un dictionnaire ordonné pour maintenir l'ordre des ouvrages
-        ouvrages_ordonnes = OrderedDict()
-        
-        # Fonction pour ajouter des ouvrages à partir d'une source
-        def ajouter_ouvrages(source, etat_par_defaut='en_service'):
-            if isinstance(source, list):
-                for ouvrage in source:
-                    if isinstance(ouvrage, str) and ouvrage.strip():
-                        ouvrages_ordonnes[ouvrage] = etat_par_defaut
-            elif isinstance(ouvrage, str) and source.strip():
-                ouvrages_ordonnes[source] = etat_par_defaut
-        
-        # 1. Ajouter les ouvrages de prétraitement
-        if 'filiere_eau' in procede_info and 'pretraitement' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['pretraitement'])
-        
-        # 2. Ajouter le traitement primaire
-        if 'filiere_eau' in procede_info and 'traitement_primaire' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['traitement_primaire'])
-        
-        # 3. Ajouter le traitement secondaire
-        if 'filiere_eau' in procede_info and 'traitement_secondaire' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['traitement_secondaire'])
-        
-        # 4. Ajouter le traitement tertiaire
-        if 'filiere_eau' in procede_info and 'traitement_tertiaire' in procede_info['filiere_eau']:
-            ajouter_ouvrages(procede_info['filiere_eau']['traitement_tertiaire'])
-        
-        # 5. Ajouter la filière boue
-        if 'filiere_boue' in procede_info:
-            ajouter_ouvrages(procede_info['filiere_boue'])
-        
-        print(f"[DEBUG] Ouvrages ordonnés: {list(ouvrages_ordonnes.keys())}")
         return ouvrages_ordonnes
         
     except Exception as e:
-        print(f"\n[ERREUR] Dans get_ouvrages_procede: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        time.sleep(2)
+        log_erreur(f"Erreur dans get_ouvrages_procede: {str(e)}", exc_info=True)
         return None
 
 def load_json(file_path):